@@ -0,0 +1,265 @@
+"""
+Retrieval scaling benchmarks for the search path.
+
+Builds synthetic charts of accounts in a throw-away SQLite file and times:
+
+    load_all_account_embeddings, find_top_k_account_codes, the keyword (BM25) search,
+    retrieve_top_k_accounts, suggest_accounts, and a full agent graph invocation.
+
+Runs fully offline: accounts and queries are embedded with the local hashing
+provider (embeddings.HashingEmbeddingProvider), so the real embed_text -> search ->
+graph code runs end to end without OpenAI.
+Each chart size runs in its own subprocess so peak RSS is per size.
+
+Usage (from the repo root):
+    python benchmarks/bench_retrieval.py                       # compare to baseline.json
+    python benchmarks/bench_retrieval.py --sizes 60,1000       # subset
+    python benchmarks/bench_retrieval.py --update-baseline     # record a new baseline
+
+Exit code is 1 when any p50 is slower than baseline * --tolerance.
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src"))
+
+import numpy as np
+
+DEFAULT_SIZES = [60, 1_000, 10_000, 100_000]
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+
+# Small vocabulary so synthetic account texts and queries look like bookkeeping
+VOCAB = (
+    "office supplies software subscription rent payroll postage telephone internet "
+    "meals travel fuel insurance legal accounting bank fees interest gst hst "
+    "equipment repairs advertising utilities freight wages consulting licence"
+).split()
+
+
+# ===== SYNTHETIC DATA =====
+
+def build_chart(size: int, provider, seed: int = 1234):
+    """Fill the (already redirected) database with `size` accounts and their embeddings."""
+    import database
+    from models import Account
+    from query import get_account_text
+
+    database.init_db()
+    rng = np.random.default_rng(seed)
+    chunk = 5_000
+    for start in range(0, size, chunk):
+        n = min(chunk, size - start)
+        accounts = []
+        for i in range(start, start + n):
+            words = " ".join(rng.choice(VOCAB, size=4))
+            accounts.append({
+                "code": f"{100000 + i}",
+                "account_name": f"{words.title()} {i}",
+                "financial_stat": "Income Statement",
+                "group_name": "Expenses",
+                "normally": "Debit",
+                "description": f"Synthetic account for {words}.",
+            })
+        database.bulk_upsert_accounts(accounts)
+
+        vectors = provider.embed([get_account_text(Account(**acc)) for acc in accounts])
+        database.bulk_upsert_account_embeddings(
+            [(acc["code"], vec, None) for acc, vec in zip(accounts, vectors)],
+            model=provider.model,
+        )
+    database.reset_caches()
+
+
+def make_queries(count: int, seed: int = 99) -> list[str]:
+    rng = np.random.default_rng(seed)
+    return [f"Invoice for {' '.join(rng.choice(VOCAB, size=3))} #{i}" for i in range(count)]
+
+
+# ===== TIMING =====
+
+def time_calls(fn, args_list) -> dict:
+    latencies = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    p99_index = min(len(latencies) - 1, int(round(0.99 * (len(latencies) - 1))))
+    mean = statistics.fmean(latencies)
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[p99_index] * 1000,
+        "qps": 1.0 / mean if mean > 0 else float("inf"),
+        "n": len(latencies),
+    }
+
+
+def run_size(size: int, dim: int, n_queries: int, db_dir: str) -> dict:
+    """Benchmark one chart size in this process. Returns {bench_name: stats}."""
+    import database
+    import query
+    from agent_graph import get_graph, GraphState
+    from embeddings import HashingEmbeddingProvider, set_embedding_provider
+    from ann_index import recall_at_k
+    from config import settings
+
+    # 1. Point the app at a scratch DB (writer + read pool, like production)
+    database.configure_engines(f"sqlite:///{os.path.join(db_dir, f'bench_{size}.db')}")
+    settings.ANN_INDEX_PATH = os.path.join(db_dir, f"bench_{size}.ivf.npz")
+
+    # 2. Offline embeddings for both the chart and the queries
+    provider = HashingEmbeddingProvider(dim=dim)
+    set_embedding_provider(provider)
+
+    build_start = time.perf_counter()
+    build_chart(size, provider)
+    build_seconds = time.perf_counter() - build_start
+
+    queries = make_queries(n_queries)
+    query_vectors = provider.embed(queries)
+    # Loading the whole table is the expensive one - fewer repetitions on big charts
+    load_reps = max(3, min(30, 30_000 // max(size, 1)))
+    k = 5
+
+    results = {}
+    results["load_all_account_embeddings"] = time_calls(database.load_all_account_embeddings, [()] * load_reps)
+
+    # Warm the resident index once, like a running worker (builds the ANN index on big charts)
+    ann_start = time.perf_counter()
+    index = database.get_account_index()
+    index_seconds = time.perf_counter() - ann_start
+    database.get_account_catalog()
+    lexical_start = time.perf_counter()
+    lexical = database.get_lexical_index()
+    lexical_seconds = time.perf_counter() - lexical_start
+
+    results["find_top_k_account_codes"] = time_calls(query.find_top_k_account_codes, [(v, k) for v in query_vectors])
+    results["lexical_search"] = time_calls(lambda q: lexical.search(q, 20), [(q,) for q in queries])
+    extra = {"index_load_seconds": index_seconds, "lexical_load_seconds": lexical_seconds, "ann": index.ann is not None}
+    if index.ann is not None:
+        results["find_top_k_exact_scan"] = time_calls(
+            lambda v: index.top_k(v, k, exact=True), [(v,) for v in query_vectors]
+        )
+        truth = [[c for c, _ in index.top_k(v, k, exact=True)] for v in query_vectors]
+        approx = [[c for c, _ in index.top_k(v, k)] for v in query_vectors]
+        extra["ann_recall_at_k"] = recall_at_k(truth, approx)
+
+    results["retrieve_top_k_accounts"] = time_calls(query.retrieve_top_k_accounts, [(q, k) for q in queries])
+    results["suggest_accounts"] = time_calls(query.suggest_accounts, [(q, k) for q in queries])
+    # Share of queries answered by the keyword fast path (no embedding call)
+    sources = [s[0].source for s in (query.suggest_accounts(q, k) for q in queries) if s]
+    extra["lexical_fast_path_share"] = sources.count("lexical") / len(sources) if sources else 0.0
+
+    graph = get_graph()
+    results["graph_invoke"] = time_calls(lambda q: graph.invoke(GraphState(description=q)), [(q,) for q in queries])
+
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linux reports KB
+    return {"benchmarks": results, "peak_rss_mb": peak_rss_mb, "build_seconds": build_seconds, **extra}
+
+
+# ===== BASELINE =====
+
+def compare(results: dict, baseline: dict, tolerance: float, min_delta_ms: float) -> list[str]:
+    """Return a message per benchmark whose p50 regressed beyond tolerance."""
+    regressions = []
+    for size, size_result in results.items():
+        base_size = baseline.get(size, {})
+        if base_size.get("dim") != size_result.get("dim"):
+            continue  # different vector size - not comparable
+        for name, stats in size_result["benchmarks"].items():
+            base = base_size.get("benchmarks", {}).get(name)
+            if not base:
+                continue
+            limit = base["p50_ms"] * tolerance
+            if stats["p50_ms"] > limit and stats["p50_ms"] - base["p50_ms"] > min_delta_ms:
+                regressions.append(
+                    f"size={size} {name}: p50 {stats['p50_ms']:.3f} ms > {limit:.3f} ms "
+                    f"(baseline {base['p50_ms']:.3f} ms x {tolerance})"
+                )
+    return regressions
+
+
+def print_table(results: dict):
+    print(f"{'size':>8}  {'benchmark':<28} {'p50 ms':>10} {'p99 ms':>10} {'qps':>10}")
+    for size, size_result in results.items():
+        for name, s in size_result["benchmarks"].items():
+            print(f"{size:>8}  {name:<28} {s['p50_ms']:>10.3f} {s['p99_ms']:>10.3f} {s['qps']:>10.0f}")
+        print(f"{size:>8}  {'peak RSS':<28} {size_result['peak_rss_mb']:>10.0f} MB")
+        if "lexical_fast_path_share" in size_result:
+            print(f"{size:>8}  {'keyword fast path share':<28} {size_result['lexical_fast_path_share']:>10.2f}")
+        if "ann_recall_at_k" in size_result:
+            print(f"{size:>8}  {'ANN recall@k vs exact':<28} {size_result['ann_recall_at_k']:>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)))
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="fail if p50 > baseline p50 * tolerance")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05, help="ignore regressions smaller than this")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)  # internal: run one size, print JSON
+    args = parser.parse_args()
+
+    if args.child is not None:
+        with tempfile.TemporaryDirectory() as db_dir:
+            print(json.dumps(run_size(args.child, args.dim, args.queries, db_dir)))
+        return 0
+
+    # One subprocess per size: isolated caches and a meaningful peak RSS
+    results = {}
+    for size in [int(s) for s in args.sizes.split(",") if s]:
+        print(f"Benchmarking {size} accounts...", file=sys.stderr)
+        out = subprocess.run(
+            [sys.executable, __file__, "--child", str(size), "--dim", str(args.dim), "--queries", str(args.queries)],
+            check=True, capture_output=True, text=True,
+        )
+        results[str(size)] = json.loads(out.stdout.strip().splitlines()[-1])
+        results[str(size)]["dim"] = args.dim
+
+    print_table(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found - run with --update-baseline to record one.")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+    if regressions:
+        print("\n❌ PERFORMANCE REGRESSION")
+        for line in regressions:
+            print("   " + line)
+        return 1
+
+    print("\n✅ No regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
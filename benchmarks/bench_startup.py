@@ -0,0 +1,171 @@
+"""
+Cold-start benchmarks for the app's entry points.
+
+For every entry point (api, setup, main) a fresh interpreter imports the module and
+reports the wall time of the import, the peak RSS afterwards and whether the heavy
+optional stacks (langgraph, openai, requests) were pulled in. Each entry point is
+measured --repeat times in new processes and the median is kept.
+
+Usage (from the repo root):
+    python benchmarks/bench_startup.py                       # compare to startup_baseline.json
+    python benchmarks/bench_startup.py --top 15              # also list the slowest imports
+    python benchmarks/bench_startup.py --update-baseline     # record a new baseline
+
+Exit code is 1 when an entry point imports slower (or uses more memory) than
+baseline * --tolerance.
+"""
+import argparse
+import importlib
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.abspath(os.path.join(BENCH_DIR, "..", "src"))
+
+ENTRY_POINTS = ["api", "setup", "main"]
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "startup_baseline.json")
+
+# Top-level packages whose presence in sys.modules after import is worth reporting
+HEAVY_MODULES = ["langgraph", "langchain_core", "openai", "requests", "fastapi", "sqlalchemy", "numpy"]
+
+
+# ===== ONE MEASUREMENT (child process) =====
+
+def measure_import(module: str) -> dict:
+    """Import `module` in this (fresh) interpreter and report what it cost."""
+    sys.path.insert(0, SRC_DIR)
+    start = time.perf_counter()
+    importlib.import_module(module)
+    seconds = time.perf_counter() - start
+    return {
+        "import_ms": seconds * 1000,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,  # KiB on Linux
+        "modules": len(sys.modules),
+        "loaded": [name for name in HEAVY_MODULES if name in sys.modules],
+    }
+
+
+def run_child(module: str) -> dict:
+    out = subprocess.run(
+        [sys.executable, __file__, "--child", module],
+        check=True, capture_output=True, text=True, cwd=SRC_DIR,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(module: str, top: int) -> list[tuple[float, str]]:
+    """The `top` largest cumulative import times (ms) from python -X importtime."""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        check=True, capture_output=True, text=True, cwd=SRC_DIR,
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative) / 1000, name.rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+# ===== REPORTING =====
+
+def compare(results: dict, baseline: dict, tolerance: float, min_delta_ms: float) -> list[str]:
+    regressions = []
+    for entry, stats in results.items():
+        base = baseline.get(entry)
+        if base is None:
+            continue
+        limit = base["import_ms"] * tolerance
+        if stats["import_ms"] > limit and stats["import_ms"] - base["import_ms"] > min_delta_ms:
+            regressions.append(
+                f"{entry}: import {stats['import_ms']:.0f} ms > {limit:.0f} ms "
+                f"(baseline {base['import_ms']:.0f} ms x {tolerance})"
+            )
+        if stats["peak_rss_mb"] > base["peak_rss_mb"] * tolerance:
+            regressions.append(
+                f"{entry}: peak RSS {stats['peak_rss_mb']:.0f} MB > {base['peak_rss_mb'] * tolerance:.0f} MB "
+                f"(baseline {base['peak_rss_mb']:.0f} MB x {tolerance})"
+            )
+    return regressions
+
+
+def print_table(results: dict):
+    print(f"{'entry':<8} {'import ms':>10} {'RSS MB':>8} {'modules':>8}  heavy stacks loaded")
+    for entry, s in results.items():
+        print(f"{entry:<8} {s['import_ms']:>10.0f} {s['peak_rss_mb']:>8.0f} {s['modules']:>8}  {', '.join(s['loaded'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", default=",".join(ENTRY_POINTS))
+    parser.add_argument("--repeat", type=int, default=5, help="fresh processes per entry point (median is kept)")
+    parser.add_argument("--top", type=int, default=0, help="also print the N slowest imports of each entry point")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="fail if import time or RSS > baseline * tolerance")
+    parser.add_argument("--min-delta-ms", type=float, default=50, help="ignore import-time regressions smaller than this")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--child", help=argparse.SUPPRESS)  # internal: import one module, print JSON
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure_import(args.child)))
+        return 0
+
+    results = {}
+    for entry in [e for e in args.entries.split(",") if e]:
+        print(f"Importing {entry} x{args.repeat}...", file=sys.stderr)
+        runs = [run_child(entry) for _ in range(args.repeat)]
+        results[entry] = {
+            "import_ms": statistics.median(r["import_ms"] for r in runs),
+            "peak_rss_mb": statistics.median(r["peak_rss_mb"] for r in runs),
+            "modules": runs[-1]["modules"],
+            "loaded": runs[-1]["loaded"],
+        }
+
+    print_table(results)
+    for entry in results if args.top else []:
+        print(f"\nSlowest imports of {entry} (cumulative ms):")
+        for ms, name in slowest_imports(entry, args.top):
+            print(f"  {ms:>8.1f}  {name}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found - run with --update-baseline to record one.")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+    if regressions:
+        print("\n❌ STARTUP REGRESSION")
+        for line in regressions:
+            print("   " + line)
+        return 1
+
+    print("\n✅ No regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
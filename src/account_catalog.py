@@ -0,0 +1,113 @@
+import sys
+import threading
+from typing import Iterable, Optional
+
+from models import Account
+
+
+class CatalogEntry:
+    """
+    One account, held in memory.
+
+    Uses __slots__ instead of a pydantic model: no per-instance __dict__ and no
+    validation cost, which matters when the chart has tens of thousands of rows
+    and every search touches k of them.
+    """
+
+    __slots__ = ("code", "account_name", "financial_stat", "group_name", "normally", "description")
+
+    FIELDS = __slots__
+
+    def __init__(self, code, account_name, financial_stat, group_name, normally, description):
+        self.code = code
+        self.account_name = account_name
+        self.financial_stat = financial_stat
+        self.group_name = group_name
+        self.normally = normally
+        self.description = description
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def to_account(self) -> Account:
+        return Account(**self.to_dict())
+
+
+class AccountCatalog:
+    """
+    A read-mostly, in-memory copy of the accounts table, indexed by code.
+
+    Loaded once (see `load`), then patched by the write helpers in database.py,
+    so the search path can resolve its hits without opening a DB session.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_code: dict[str, CatalogEntry] = {}
+        self.is_loaded = False
+        self.nbytes = 0  # approximate memory held by the entries
+
+    def load(self, rows: Iterable[Iterable]):
+        """
+        Replace the catalog contents.
+
+        Args:
+            rows: Tuples in CatalogEntry.FIELDS order
+                (code, account_name, financial_stat, group_name, normally, description).
+        """
+        by_code = {}
+        nbytes = 0
+        for row in rows:
+            entry = CatalogEntry(*row)
+            by_code[entry.code] = entry
+            nbytes += _entry_size(entry)
+
+        with self._lock:
+            self._by_code = by_code
+            self.nbytes = nbytes
+            self.is_loaded = True
+
+    def upsert(self, entry: CatalogEntry):
+        """Add or replace one entry. No-op until the catalog has been loaded."""
+        with self._lock:
+            if self.is_loaded:
+                previous = self._by_code.get(entry.code)
+                if previous is not None:
+                    self.nbytes -= _entry_size(previous)
+                self._by_code[entry.code] = entry
+                self.nbytes += _entry_size(entry)
+
+    def invalidate(self):
+        """Forget everything; the next read reloads from the DB."""
+        with self._lock:
+            self._by_code = {}
+            self.nbytes = 0
+            self.is_loaded = False
+
+    def __len__(self) -> int:
+        return len(self._by_code)
+
+    def get(self, code: str) -> Optional[CatalogEntry]:
+        return self._by_code.get(code)
+
+    def entries(self) -> list[CatalogEntry]:
+        """Every entry (a snapshot list, safe to iterate while writes happen)."""
+        return list(self._by_code.values())
+
+    def get_many(self, codes: Iterable[str]) -> list[Optional[CatalogEntry]]:
+        """Resolve many codes in one pass (None for unknown codes)."""
+        by_code = self._by_code
+        return [by_code.get(code) for code in codes]
+
+
+# Rough cost of one dict slot (key pointer, value pointer, hash) in the code -> entry map
+_DICT_SLOT_BYTES = 24
+
+
+def _entry_size(entry: CatalogEntry) -> int:
+    """Approximate bytes held by one entry: the object, its strings and its dict slot."""
+    return (
+        sys.getsizeof(entry)
+        + sum(sys.getsizeof(getattr(entry, field)) for field in CatalogEntry.FIELDS)
+        + _DICT_SLOT_BYTES
+    )
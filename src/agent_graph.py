@@ -1,33 +1,83 @@
+import asyncio
+import threading
+import time
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Annotated, Dict, List, Optional
 from models import AccountSuggestion
 from query import suggest_accounts, grade_confidence, format_suggestions_for_user, format_needs_review
-from langgraph.graph import StateGraph, END
+from database import get_account_catalog
+from vendor_memo import vendor_memo
 from config import settings
+settings.export_env()  # LangChain / LangSmith read their keys (e.g. tracing) from os.environ
+from langchain_core.runnables import RunnableLambda
+from langgraph.graph import StateGraph, END
+from tenants import DEFAULT_TENANT
+from metrics import GRAPH_NODE_SECONDS
+
+
+def merge_timings(left: Optional[Dict[str, float]], right: Optional[Dict[str, float]]) -> Dict[str, float]:
+    """Reducer for GraphState.timings: every node adds its own entry."""
+    return {**(left or {}), **(right or {})}
 
 
 class GraphState(BaseModel):
     description : str
+    tenant_id : str = DEFAULT_TENANT # whose chart of accounts to search
+    vendor : Optional[str] = None # invoice vendor, checked against the vendor memo first
     suggestions : Optional[List[AccountSuggestion]] = None
     confidence : Optional[str] = None # 'low' | 'medium' | 'high'
     final_answer : Optional[str] = None
-    
+    timings : Annotated[Dict[str, float], merge_timings] = {} # node name -> wall-clock seconds
+
+
+def check_vendor_memo(state: GraphState) -> dict:
+    # A confirmed vendor -> account mapping answers without any embedding or search
+    if not settings.VENDOR_MEMO_ENABLED:
+        return {}
+    entry = vendor_memo.lookup(state.vendor, state.tenant_id)
+    if entry is None:
+        return {}
+    account = get_account_catalog(state.tenant_id).get(entry.code)
+    if account is None:
+        return {}  # the account was deleted since it was confirmed
+    suggestion = AccountSuggestion(
+        code=account.code,
+        account_name=account.account_name,
+        score=1.0,
+        normalized_similarity=1.0,
+        source="memo",
+    )
+    return {"suggestions": [suggestion], "confidence": "high"}
+
+async def acheck_vendor_memo(state: GraphState) -> dict:
+    # The memo may load or flush (SQLite, behind the single writer) and the catalog may load - off the event loop
+    return await asyncio.to_thread(check_vendor_memo, state)
+
+def route_after_vendor_memo(state: GraphState) -> str:
+    if state.suggestions:
+        return "finalize"
+    else:
+        return "retriever"
 
 def run_retriever(state: GraphState) -> dict:
-    suggestions = suggest_accounts(state.description, settings.SEARCH_LIMIT_K)
+    suggestions = suggest_accounts(state.description, settings.SEARCH_LIMIT_K, tenant_id=state.tenant_id)
     return {"suggestions": suggestions}
 
+async def arun_retriever(state: GraphState) -> dict:
+    # Embedding + search are blocking calls - keep them off the event loop
+    return await asyncio.to_thread(run_retriever, state)
+
 def run_confidence(state: GraphState) -> dict:
     confidence = grade_confidence(state.suggestions)
     return {"confidence": confidence}
 
-def route_based_on_confidence(state: GraphState) -> str: 
+def route_based_on_confidence(state: GraphState) -> str:
     if state.confidence == "high":
         return "finalize"
-    else: 
+    else:
         return "needs_review"
 
-def finalize(state: GraphState) -> dict: 
+def finalize(state: GraphState) -> dict:
     message = format_suggestions_for_user(state.suggestions, state.confidence)
     return {"final_answer" : message}
 
@@ -35,14 +85,53 @@ def needs_review(state: GraphState) -> dict:
     message = format_needs_review(state.suggestions, state.confidence)
     return {"final_answer" : message}
 
+
+# ===== TIMING =====
+
+def _timed_node(name: str, func, afunc=None) -> RunnableLambda:
+    """
+    Wrap a node so it also writes its wall-clock duration into state.timings[name]
+    (and into the bookkeeper_graph_node_seconds histogram).
+    The result works with both invoke() and ainvoke(); nodes without an async
+    version simply run their sync function.
+    """
+    def sync_node(state: GraphState) -> dict:
+        start = time.perf_counter()
+        update = func(state)
+        elapsed = time.perf_counter() - start
+        GRAPH_NODE_SECONDS.observe(elapsed, node=name)
+        return {**update, "timings": {name: elapsed}}
+
+    async def async_node(state: GraphState) -> dict:
+        start = time.perf_counter()
+        update = await afunc(state) if afunc else func(state)
+        elapsed = time.perf_counter() - start
+        GRAPH_NODE_SECONDS.observe(elapsed, node=name)
+        return {**update, "timings": {name: elapsed}}
+
+    return RunnableLambda(sync_node, afunc=async_node, name=name)
+
+
+# ===== GRAPH =====
+
 def create_graph():
+    """Build and compile a new graph. Prefer get_graph(), which reuses one compiled instance."""
 
     workflow = StateGraph(GraphState)
-    workflow.add_node("retriever", run_retriever)
-    workflow.add_node("confidence", run_confidence)
-    workflow.add_node("finalize", finalize)
-    workflow.add_node("needs_review", needs_review)
+    workflow.add_node("vendor_memo", _timed_node("vendor_memo", check_vendor_memo, acheck_vendor_memo))
+    workflow.add_node("retriever", _timed_node("retriever", run_retriever, arun_retriever))
+    workflow.add_node("confidence", _timed_node("confidence", run_confidence))
+    workflow.add_node("finalize", _timed_node("finalize", finalize))
+    workflow.add_node("needs_review", _timed_node("needs_review", needs_review))
 
+    workflow.add_conditional_edges(
+        "vendor_memo",
+        route_after_vendor_memo,
+        {
+            "finalize": "finalize",
+            "retriever": "retriever"
+        }
+    )
     workflow.add_edge("retriever", "confidence")
 
     workflow.add_conditional_edges(
@@ -53,14 +142,40 @@ def create_graph():
             "needs_review": "needs_review"
         }
     )
-    
-    workflow.set_entry_point("retriever")
+
+    workflow.set_entry_point("vendor_memo")
     workflow.add_edge("finalize", END)
     workflow.add_edge("needs_review", END)
 
     app = workflow.compile()
-    return app 
+    return app
+
+
+_graph = None
+_graph_lock = threading.Lock()
+
+def get_graph():
+    """Return the module-level compiled graph (compiled once, on first use)."""
+    global _graph
+    if _graph is None:
+        with _graph_lock:
+            if _graph is None:
+                _graph = create_graph()
+    return _graph
 
 
+def _as_states(inputs: List[GraphState | str]) -> List[GraphState]:
+    return [item if isinstance(item, GraphState) else GraphState(description=item) for item in inputs]
 
+def run_batch(inputs: List[GraphState | str], max_concurrency: Optional[int] = None) -> List[dict]:
+    """
+    Classify many descriptions (or GraphStates) concurrently, at most max_concurrency
+    at a time. Returns the final states in input order.
+    """
+    max_concurrency = max_concurrency or settings.GRAPH_MAX_CONCURRENCY
+    return get_graph().batch(_as_states(inputs), config={"max_concurrency": max_concurrency})
 
+async def arun_batch(inputs: List[GraphState | str], max_concurrency: Optional[int] = None) -> List[dict]:
+    """Async version of run_batch, using the async node variants."""
+    max_concurrency = max_concurrency or settings.GRAPH_MAX_CONCURRENCY
+    return await get_graph().abatch(_as_states(inputs), config={"max_concurrency": max_concurrency})
@@ -0,0 +1,249 @@
+import hashlib
+import os
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+class IVFIndex:
+    """
+    An inverted-file (IVF) approximate nearest-neighbour index over unit vectors.
+
+    Build: spherical k-means splits the accounts into `nlist` clusters; the rows are
+    then stored grouped by cluster in one contiguous matrix (offsets[i]:offsets[i+1]
+    is cluster i).
+
+    Search: score the query against the nlist centroids, then do the exact dot
+    product only inside the `nprobe` best clusters. Cost is roughly
+    nlist + n_rows * nprobe / nlist dot products instead of n_rows.
+
+    Knobs:
+        nlist  - more lists = smaller lists = faster, but more chance to miss a neighbour.
+        nprobe - more lists searched per query = better recall, slower.
+
+    Rows added after the build (see `add`) go to a small side buffer that is always
+    scanned exactly; an overwritten code is masked out of its old cluster.
+    """
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, nprobe: int = 16):
+        self.nprobe = nprobe
+        self.centroids: Optional[np.ndarray] = None   # (nlist, dim)
+        self.vectors: Optional[np.ndarray] = None     # (n_rows, dim), grouped by cluster
+        self.codes: np.ndarray = np.array([], dtype=object)
+        self.offsets: Optional[np.ndarray] = None     # (nlist + 1,)
+        self.alive: Optional[np.ndarray] = None       # (n_rows,) False = overwritten later
+        self.fingerprint: str = ""
+        self._row_by_code: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._extra_codes: List[str] = []
+        self._extra_vectors: List[np.ndarray] = []
+        self._extra_pos: dict[str, int] = {}
+
+    # ===== BUILD =====
+
+    @classmethod
+    def build(
+        cls,
+        codes: List[str],
+        vectors: np.ndarray,
+        nlist: int = 0,
+        nprobe: int = 16,
+        iterations: int = 10,
+        max_train_rows: int = 50_000,
+        seed: int = 0,
+        fingerprint: str = "",
+    ) -> "IVFIndex":
+        """
+        Train the clusters and lay the rows out by cluster.
+
+        Args:
+            codes: Account code for each row.
+            vectors: (n_rows, dim) float32 rows, already normalized to unit length.
+            nlist: Number of clusters; 0 picks ~4*sqrt(n_rows).
+            nprobe: Default number of clusters searched per query.
+            iterations: k-means iterations.
+            max_train_rows: k-means is trained on a random sample of at most this many rows.
+            seed: RNG seed (builds are deterministic).
+            fingerprint: Identifies the data the index was built from (see matrix_fingerprint).
+
+        Raises:
+            ValueError: If there are no rows to cluster (an empty chart keeps the exact scan).
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        n_rows = vectors.shape[0]
+        if n_rows == 0:
+            raise ValueError("Cannot build an IVF index from an empty matrix")
+        if nlist <= 0:
+            nlist = max(1, int(4 * np.sqrt(n_rows)))
+        nlist = min(nlist, n_rows)
+        rng = np.random.default_rng(seed)
+
+        # 1. Spherical k-means on a sample
+        sample = vectors[rng.choice(n_rows, size=min(n_rows, max_train_rows), replace=False)]
+        centroids = sample[rng.choice(sample.shape[0], size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = _nearest_centroid(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=nlist)
+            empty = counts == 0
+            # Re-seed empty clusters with random sample rows
+            sums[empty] = sample[rng.choice(sample.shape[0], size=int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+
+        # 2. Assign every row and group rows by cluster
+        assign = _nearest_centroid(vectors, centroids)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=nlist)
+
+        index = cls(nprobe=nprobe)
+        index.centroids = centroids
+        index.vectors = vectors[order]
+        index.codes = np.asarray(codes, dtype=object)[order]
+        index.offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        index.alive = np.ones(n_rows, dtype=bool)
+        index.fingerprint = fingerprint
+        index._row_by_code = {code: i for i, code in enumerate(index.codes)}
+        return index
+
+    # ===== INCREMENTAL UPDATES =====
+
+    def add(self, code: str, vector: np.ndarray):
+        """Insert or replace one (normalized) vector without rebuilding."""
+        with self._lock:
+            row = self._row_by_code.pop(code, None)
+            if row is not None:
+                self.alive[row] = False
+            vector = np.asarray(vector, dtype=np.float32)
+            i = self._extra_pos.get(code)
+            if i is not None:
+                self._extra_vectors[i] = vector
+            else:
+                self._extra_pos[code] = len(self._extra_codes)
+                self._extra_codes.append(code)
+                self._extra_vectors.append(vector)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the centroid and row matrices."""
+        return sum(a.nbytes for a in (self.centroids, self.vectors) if a is not None)
+
+    @property
+    def pending(self) -> int:
+        """Rows added since the build (scanned exactly on every query)."""
+        return len(self._extra_codes)
+
+    # ===== SEARCH =====
+
+    def search(self, query: np.ndarray, k: int = 5, nprobe: Optional[int] = None) -> List[Tuple[str, float]]:
+        """
+        Approximate top-k by cosine similarity.
+
+        Args:
+            query: The query vector (normalized or not).
+            k (int): Number of results.
+            nprobe (int): Clusters to search; defaults to self.nprobe.
+        """
+        if self.centroids is None or k <= 0:
+            return []
+        nprobe = min(nprobe or self.nprobe, self.centroids.shape[0])
+
+        query = np.asarray(query, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            # Like VectorIndex.top_k: a zero vector matches nothing, every row scores 0
+            with self._lock:
+                extra_codes = list(self._extra_codes)
+            codes = list(self.codes[self.alive]) + extra_codes
+            return [(code, 0.0) for code in codes[:k]]
+        query = query / norm
+
+        # 1. Pick the nprobe closest clusters
+        centroid_scores = self.centroids @ query
+        if nprobe < centroid_scores.shape[0]:
+            probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            probe = np.arange(centroid_scores.shape[0])
+
+        # 2. Exact scores inside those clusters
+        rows = np.concatenate([np.arange(self.offsets[c], self.offsets[c + 1]) for c in probe])
+        rows = rows[self.alive[rows]]
+        scores = self.vectors[rows] @ query
+        codes = self.codes[rows]
+
+        # 3. Plus the rows added since the build
+        with self._lock:
+            extra_codes = list(self._extra_codes)
+            extra_vectors = list(self._extra_vectors)
+        if extra_codes:
+            scores = np.concatenate([scores, np.vstack(extra_vectors) @ query])
+            codes = np.concatenate([codes, np.asarray(extra_codes, dtype=object)])
+
+        if scores.shape[0] == 0:
+            return []
+        k = min(k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k] if k < scores.shape[0] else np.arange(scores.shape[0])
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(codes[i], float(scores[i])) for i in top]
+
+    # ===== PERSISTENCE =====
+
+    def save(self, path: str):
+        """Write the index to an .npz file (atomically)."""
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            format_version=np.array(self.FORMAT_VERSION),
+            centroids=self.centroids,
+            vectors=self.vectors,
+            codes=self.codes.astype(str),
+            offsets=self.offsets,
+            fingerprint=np.array(self.fingerprint),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, nprobe: int = 16) -> Optional["IVFIndex"]:
+        """Read an index written by save(); None if missing or from another format version."""
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["format_version"]) != cls.FORMAT_VERSION:
+                return None
+            index = cls(nprobe=nprobe)
+            index.centroids = data["centroids"]
+            index.vectors = data["vectors"]
+            index.codes = data["codes"].astype(object)
+            index.offsets = data["offsets"]
+            index.fingerprint = str(data["fingerprint"])
+        index.alive = np.ones(index.vectors.shape[0], dtype=bool)
+        index._row_by_code = {code: i for i, code in enumerate(index.codes)}
+        return index
+
+
+def matrix_fingerprint(codes: List[str], vectors: np.ndarray) -> str:
+    """Hash of the codes and vector bytes, to tell whether a saved index is still current."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update("\x00".join(codes).encode("utf-8"))
+    h.update(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+    return h.hexdigest()
+
+
+def recall_at_k(exact: List[List[str]], approx: List[List[str]]) -> float:
+    """Share of the exact top-k codes that the approximate search also returned."""
+    found = sum(len(set(e) & set(a)) for e, a in zip(exact, approx))
+    total = sum(len(e) for e in exact)
+    return found / total if total else 1.0
+
+
+def _nearest_centroid(vectors: np.ndarray, centroids: np.ndarray, chunk: int = 8192) -> np.ndarray:
+    """Index of the most similar centroid for each row (chunked to bound memory)."""
+    out = np.empty(vectors.shape[0], dtype=np.int64)
+    for start in range(0, vectors.shape[0], chunk):
+        out[start:start + chunk] = np.argmax(vectors[start:start + chunk] @ centroids.T, axis=1)
+    return out
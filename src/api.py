@@ -1,42 +1,360 @@
-from fastapi import FastAPI, UploadFile, File
-import tempfile
-import os
-from client_landingai import LandingAIClient
-from models import Invoice
+import asyncio
+import secrets
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from fastapi import FastAPI, UploadFile, File, Request, HTTPException, Header
+from fastapi.responses import JSONResponse, PlainTextResponse
+from client_landingai import AsyncLandingAIClient, create_http_client
+from document_cache import get_document_cache
+from pipeline import StageLimits, expand_upload, process_documents
+from config import settings
+from models import Invoice, VendorConfirmation
+from invoices import classify_invoice_lines
+from tenants import DEFAULT_TENANT, validate_tenant_id
+import metrics
+from profiling import ProfilingMiddleware, profiler
+from uploads import UploadLimitMiddleware
+from upstream import CircuitOpenError
+from database import get_account_catalog, init_db, tenant_indexes
+from embedding_cache import embedding_cache
+from vendor_memo import vendor_memo
+from classification_log import ClassificationRecord, create_classification_writer
+from jobs import create_job, get_job, wait_for_job
+from job_worker import WorkerPool
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create missing tables and upgrade an older bookkeeper.db (e.g. to per-tenant keys)
+    await asyncio.to_thread(init_db)
+    # One pooled, keep-alive HTTP client shared by every request
+    http = create_http_client()
+    app.state.landingai = AsyncLandingAIClient(
+        http=http,
+        api_key=settings.LANDING_AI_API_KEY,
+        base_url=settings.LANDING_AI_BASE_URL,
+        cache=get_document_cache(),
+    )
+    # Per-stage concurrency limits shared by every /classify-invoices batch
+    app.state.pipeline_limits = StageLimits.from_settings()
+    # Confirmed vendor -> account mappings, held in a dict for the graph's first node
+    await asyncio.to_thread(vendor_memo.load)
+    # Classification results are queued here and written to SQLite in batches, off the request path
+    app.state.results = create_classification_writer()
+    await app.state.results.start()
+    # Worker processes for POST /jobs. Off by default (JOB_WORKERS=0): every API process
+    # (each uvicorn --workers process) would start its own pool - run job_worker.py instead
+    app.state.job_workers = WorkerPool(settings.JOB_WORKERS) if settings.JOB_WORKERS > 0 else None
+    if app.state.job_workers is not None:
+        app.state.job_workers.start()
+    try:
+        yield
+    finally:
+        if app.state.job_workers is not None:
+            await asyncio.to_thread(app.state.job_workers.stop)  # running jobs are finished first
+        await app.state.results.stop()  # writes whatever is still queued
+        await http.aclose()
+        await asyncio.to_thread(vendor_memo.flush)
+        await asyncio.to_thread(embedding_cache.flush)
+
+
+app = FastAPI(lifespan=lifespan)
+# Counts requests for /admin/profile sessions; a single attribute check when nothing is being profiled
+app.add_middleware(ProfilingMiddleware, profiler=profiler)
+# Oversized uploads are refused while they stream in, before they are spooled
+app.add_middleware(UploadLimitMiddleware, max_bytes=int(settings.MAX_UPLOAD_MB * 1024 * 1024))
+
+
+@app.exception_handler(CircuitOpenError)
+async def upstream_unavailable(request: Request, exc: CircuitOpenError):
+    """An upstream service is down and its circuit is open: tell the client when to come back."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(int(exc.retry_after) + 1)},
+    )
+
+
+def _check_tenant(tenant_id: str) -> str:
+    """Reject a malformed tenant id before any upstream work is done."""
+    try:
+        return validate_tenant_id(tenant_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+async def _record(request: Request, record: ClassificationRecord) -> Optional[str]:
+    """
+    Queue a result for the write-behind buffer and return its id. Only waits if
+    the buffer is full; the SQLite write happens later, in a batch.
+    """
+    if not settings.RESULTS_PERSIST_ENABLED:
+        return None
+    await request.app.state.results.put(record)
+    return record.id
 
-app = FastAPI()
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+
+# ===== METRICS =====
+# Everything below is read from the objects that already keep the numbers, only when /metrics is scraped
+
+def _cache_stats() -> dict:
+    stats = {}
+    embedding = embedding_cache.stats()
+    stats["embedding"] = (embedding["memory_hits"] + embedding["disk_hits"], embedding["misses"])
+    document = getattr(getattr(app.state, "landingai", None), "cache", None)
+    if document is not None:
+        stats["document"] = (document.hits, document.misses)
+    return stats
+
+
+def _cache_requests():
+    for cache, (hits, misses) in _cache_stats().items():
+        yield (cache, "hit"), hits
+        yield (cache, "miss"), misses
+
+
+def _cache_hit_ratio():
+    for cache, (hits, misses) in _cache_stats().items():
+        yield (cache,), hits / (hits + misses) if hits + misses else 0.0
+
+
+def _results_pending():
+    results = getattr(app.state, "results", None)
+    if results is not None:
+        yield (), results.stats()["pending"]
+
+
+metrics.registry.gauge_function(
+    "bookkeeper_cache_requests_total", "Cache lookups by cache and result.",
+    ["cache", "result"], _cache_requests, kind="counter",
+)
+metrics.registry.gauge_function(
+    "bookkeeper_cache_hit_ratio", "Share of cache lookups answered from the cache since startup.",
+    ["cache"], _cache_hit_ratio,
+)
+metrics.registry.gauge_function(
+    "bookkeeper_tenant_index_bytes", "Approximate memory held by resident tenant search indexes.",
+    [], lambda: [((), tenant_indexes.stats()["bytes"])],
+)
+metrics.registry.gauge_function(
+    "bookkeeper_results_pending", "Classification results waiting in the write-behind buffer.",
+    [], _results_pending,
+)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Counters and latency histograms in the Prometheus text format."""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/classify-invoice")
-def classify_invoice(file: UploadFile = File(...)):
-    # 1) Save uploaded file to a temp location
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-        tmp.write(file.file.read())
-        tmp_path = tmp.name
+async def classify_invoice(
+    request: Request,
+    file: UploadFile = File(...),
+    per_line: bool = False,
+    use_cache: bool = True,
+    tenant_id: str = DEFAULT_TENANT,
+):
+    _check_tenant(tenant_id)
 
+    # 1) Use the shared client (created in lifespan)
+    client: AsyncLandingAIClient = request.app.state.landingai
+
+    # 2) Call LandingAI - the upload is streamed from its spooled file (memory up to 1 MB,
+    #    then disk) into the request in chunks; it is never read into memory as a whole.
+    #    While we wait on upstream the event loop serves other requests.
+    #    Repeat uploads are answered from the document cache unless use_cache=false.
+    markdown = await client.ade_parse(file.file, filename=file.filename or "document.pdf", use_cache=use_cache)
+    extraction = await client.ade_extract(markdown, use_cache=use_cache)
+
+    # 3) Build Invoice
+    invoice = Invoice(**extraction["extraction"])
+
+    response = {
+        "invoice": invoice.model_dump(),
+    }
+
+    # 4) Optional: account suggestions for every line (one embedding call, one matrix product)
+    if per_line:
+        classification = await asyncio.to_thread(classify_invoice_lines, invoice, tenant_id=tenant_id)
+        response["line_classification"] = classification.model_dump()
+
+    # 5) Keep a record of it (written behind the response)
+    response["classification_id"] = await _record(request, ClassificationRecord(
+        tenant_id=tenant_id,
+        filename=file.filename,
+        invoice=invoice,
+        line_classification=classification if per_line else None,
+    ))
+
+    return response
+
+
+@app.post("/classify-invoices")
+async def classify_invoices(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    use_cache: bool = True,
+    tenant_id: str = DEFAULT_TENANT,
+):
+    """
+    Classify many invoices in one request. Each upload can be a PDF or a .zip of PDFs.
+    Documents are pipelined through parse -> extract -> describe -> suggest, and each
+    one gets its own result (with per-stage timings) even if others fail.
+    Suggestions come from the chart of accounts of `tenant_id`.
+    """
+    _check_tenant(tenant_id)
+
+    # 1) Collect the documents (zips are expanded)
+    documents = []
+    for file in files:
+        content = await file.read()
+        try:
+            documents.extend(expand_upload(file.filename or "document.pdf", content))
+        except ValueError as exc:
+            raise HTTPException(status_code=413, detail=str(exc))
+        if len(documents) > settings.BATCH_MAX_DOCUMENTS:
+            raise HTTPException(status_code=413, detail=f"At most {settings.BATCH_MAX_DOCUMENTS} documents per batch")
+
+    # 2) Run the pipeline
+    results = await process_documents(
+        request.app.state.landingai,
+        documents,
+        request.app.state.pipeline_limits,
+        use_cache=use_cache,
+        tenant_id=tenant_id,
+    )
+
+    # 3) Keep a record of every document that made it through (written behind the response)
+    for result in results:
+        if result.status == "ok":
+            result.classification_id = await _record(request, ClassificationRecord(
+                tenant_id=tenant_id,
+                filename=result.filename,
+                invoice=result.invoice,
+                description=result.description,
+                suggestions=result.suggestions or [],
+                confidence=result.confidence,
+                final_answer=result.final_answer,
+            ))
+
+    return {
+        "count": len(results),
+        "failed": sum(1 for r in results if r.status == "error"),
+        "results": [r.model_dump() for r in results],
+    }
+
+
+# ===== JOBS =====
+# Submit returns at once; a worker process does parse -> extract -> graph and stores the result
+
+@app.post("/jobs", status_code=202)
+async def submit_job(
+    file: UploadFile = File(...),
+    per_line: bool = False,
+    use_cache: bool = True,
+    tenant_id: str = DEFAULT_TENANT,
+):
+    """
+    Queue one invoice for the job workers (job_worker.py, or JOB_WORKERS started by the API)
+    and return its id straight away.
+    Poll GET /jobs/{job_id} (optionally with ?wait=seconds) for the result.
+    """
+    _check_tenant(tenant_id)
+    # The spooled upload is copied to JOBS_DIR in chunks - never held in memory whole
+    job = await asyncio.to_thread(
+        create_job, file.file, file.filename or "document.pdf",
+        tenant_id=tenant_id, per_line=per_line, use_cache=use_cache,
+    )
+    return {"job_id": job.id, "status": job.status, "status_url": f"/jobs/{job.id}"}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str, wait: float = 0):
+    """
+    Status of a job, with its result once it is 'done' (or its error once 'failed').
+    With wait > 0 the call long-polls: it returns as soon as the job finishes, or
+    after `wait` seconds (at most JOB_MAX_WAIT) with the current status.
+    """
+    if not 0 <= wait <= settings.JOB_MAX_WAIT:
+        raise HTTPException(status_code=400, detail=f"wait must be in [0, {settings.JOB_MAX_WAIT:g}]")
+    if wait:
+        job = await wait_for_job(job_id, wait)
+    else:
+        job = await asyncio.to_thread(get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id!r}")
+    return job.public()
+
+
+@app.post("/vendor-memo/confirm")
+async def confirm_vendor_account(confirmation: VendorConfirmation, tenant_id: str = DEFAULT_TENANT):
+    """
+    Remember that invoices from this vendor go to this account. Later invoices
+    from the vendor are answered from the memo, without embedding or search.
+    """
+    _check_tenant(tenant_id)
+    catalog = await asyncio.to_thread(get_account_catalog, tenant_id)
+    if catalog.get(confirmation.code) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown account code {confirmation.code!r}")
     try:
-        # 2) Create client
-        client = LandingAIClient(
-            api_key=os.environ["LANDING_AI_API_KEY"],
-            base_url="https://api.va.landing.ai",
-        )
+        entry = await asyncio.to_thread(vendor_memo.confirm, confirmation.vendor, confirmation.code, tenant_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return entry.to_dict()
 
-        # 3) Call LandingAI
-        markdown = client.ade_parse(tmp_path)
-        extraction = client.ade_extract(markdown)
 
-        # 4) Build Invoice
-        invoice = Invoice(**extraction["extraction"])
+# ===== ADMIN =====
 
-        return {
-            "invoice": invoice.model_dump(),
-        }
+def _check_admin(token: Optional[str]):
+    """404 unless ADMIN_TOKEN is configured (the admin endpoints don't exist otherwise); 403 on a wrong token."""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not token or not secrets.compare_digest(token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
 
-    finally:
-        # 5) Cleanup temp file
-        os.remove(tmp_path)
 
+@app.post("/admin/profile", response_class=PlainTextResponse)
+async def profile(
+    mode: str = "sampling",
+    seconds: float = 10.0,
+    requests: Optional[int] = None,
+    limit: int = 0,
+    x_admin_token: Optional[str] = Header(default=None),
+):
+    """
+    Profile this worker while it serves live traffic, then return the aggregated profile.
+
+    The call returns after `seconds`, or as soon as `requests` other requests have
+    finished, whichever comes first.
+    - mode=sampling: stack snapshots of every thread every PROFILE_SAMPLE_INTERVAL_MS,
+      returned as collapsed stacks (flamegraph.pl / speedscope input). Low overhead.
+    - mode=deterministic: cProfile, returned as pstats text sorted by cumulative time.
+    `limit` caps the number of stacks / functions in the output (0 = all stacks, 50 functions).
+    """
+    _check_admin(x_admin_token)
+    if not 0 < seconds <= settings.PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be in (0, {settings.PROFILE_MAX_SECONDS:g}]")
+    if requests is not None and requests < 1:
+        raise HTTPException(status_code=400, detail="requests must be at least 1")
+
+    try:
+        session = await profiler.run(
+            mode, seconds, max_requests=requests,
+            sample_interval=settings.PROFILE_SAMPLE_INTERVAL_MS / 1000,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except RuntimeError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
 
+    if session.mode == "deterministic":
+        return session.report(limit or 50)
+    return session.report(limit)
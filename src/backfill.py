@@ -0,0 +1,96 @@
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+from config import settings
+from database import (
+    get_all_accounts,
+    get_embedding_fingerprints,
+    bulk_upsert_account_embeddings,
+    delete_account_embeddings,
+)
+from models import Account
+from query import get_account_text, embed_texts
+from embeddings import EmbeddingProvider, get_embedding_provider
+from tenants import DEFAULT_TENANT
+
+
+class BackfillReport(BaseModel):
+    total_accounts: int
+    embedded: int     # accounts sent to the embeddings API this run
+    unchanged: int    # accounts skipped because text hash + model still match
+    removed: int      # orphan embeddings deleted (account no longer exists)
+    requests: int     # number of batched API calls
+    seconds: float
+
+
+def content_hash(text: str) -> str:
+    """sha256 of the text that gets embedded for an account."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _embed_batch(
+    batch: List[tuple[str, str, str]],
+    provider: EmbeddingProvider,
+) -> List[tuple[str, list[float], str]]:
+    """Embed one batch of (code, text, hash) and return (code, vector, hash) rows."""
+    vectors = embed_texts([text for _, text, _ in batch], use_cache=False, provider=provider)
+    return [(code, vector, h) for (code, _, h), vector in zip(batch, vectors)]
+
+
+def backfill_account_embeddings(
+    batch_size: Optional[int] = None,
+    max_concurrency: Optional[int] = None,
+    provider: Optional[EmbeddingProvider] = None,
+    tenant_id: str = DEFAULT_TENANT,
+) -> BackfillReport:
+    """
+    Bring the tenant's account_embeddings in line with its accounts.
+
+    1. Work out which accounts are new, or whose text hash / embedding model changed.
+    2. Send only those to the API in batched input=[...] requests, with at most
+       max_concurrency requests in flight.
+    3. Bulk-write each finished batch in one transaction.
+    4. Delete embeddings whose account no longer exists.
+    """
+    batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+    max_concurrency = max_concurrency or settings.EMBEDDING_MAX_CONCURRENCY
+    provider = provider or get_embedding_provider()
+    model = provider.model
+    start = time.perf_counter()
+
+    accounts: List[Account] = get_all_accounts(tenant_id)
+    fingerprints = get_embedding_fingerprints(tenant_id)
+
+    # 1. Diff against what is stored
+    todo: List[tuple[str, str, str]] = []
+    for acc in accounts:
+        text = get_account_text(acc)
+        h = content_hash(text)
+        if fingerprints.get(acc.code) != (h, model):
+            todo.append((acc.code, text, h))
+
+    batches = [todo[i:i + batch_size] for i in range(0, len(todo), batch_size)]
+
+    # 2 + 3. Embed concurrently; the writes stay on this thread (one writer)
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        futures = [pool.submit(_embed_batch, batch, provider) for batch in batches]
+        for future in as_completed(futures):
+            bulk_upsert_account_embeddings(future.result(), model=model, tenant_id=tenant_id)
+
+    # 4. Orphans
+    live_codes = {acc.code for acc in accounts}
+    orphans = [code for code in fingerprints if code not in live_codes]
+    delete_account_embeddings(orphans, tenant_id=tenant_id)
+
+    return BackfillReport(
+        total_accounts=len(accounts),
+        embedded=len(todo),
+        unchanged=len(accounts) - len(todo),
+        removed=len(orphans),
+        requests=len(batches),
+        seconds=time.perf_counter() - start,
+    )
@@ -0,0 +1,150 @@
+import time
+import uuid
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+from sqlalchemy import inspect, insert, select, text
+
+import database
+from config import settings
+from models import AccountSuggestion, Invoice, InvoiceClassification
+from orm_models import InvoiceRecord, InvoiceLineRecord, SuggestionRecord
+from tenants import DEFAULT_TENANT
+from write_behind import WriteBehindBuffer
+
+
+class ClassificationRecord(BaseModel):
+    """Everything worth keeping about one classified invoice (becomes rows in three tables)."""
+
+    id: str = Field(default_factory=lambda: uuid.uuid4().hex)
+    tenant_id: str = DEFAULT_TENANT
+    filename: Optional[str] = None
+    invoice: Invoice
+    description: Optional[str] = None
+    suggestions: List[AccountSuggestion] = []       # for the whole invoice (agent graph)
+    confidence: Optional[str] = None
+    final_answer: Optional[str] = None
+    line_classification: Optional[InvoiceClassification] = None  # per-line suggestions, if requested
+    created_at: float = Field(default_factory=time.time)
+
+
+def _suggestion_rows(invoice_id: str, line_no: Optional[int], suggestions: List[AccountSuggestion]) -> List[dict]:
+    return [
+        {
+            "invoice_id": invoice_id, "line_no": line_no, "rank": rank,
+            "code": s.code, "account_name": s.account_name, "score": s.score,
+            "normalized_similarity": s.normalized_similarity, "similarity": s.similarity, "source": s.source,
+        }
+        for rank, s in enumerate(suggestions)
+    ]
+
+
+def write_classifications(records: List[ClassificationRecord]):
+    """
+    Insert a batch of classification records in ONE transaction
+    (three executemany inserts: invoices, invoice_lines, invoice_suggestions).
+    """
+    invoices, lines, suggestions = [], [], []
+    for record in records:
+        invoice = record.invoice
+        invoices.append({
+            "id": record.id, "tenant_id": record.tenant_id, "filename": record.filename,
+            "vendor": invoice.vendor, "invoice_date": invoice.invoice_date,
+            "total_amount": invoice.total_amount, "currency": invoice.currency, "tax": invoice.tax,
+            "description": record.description, "confidence": record.confidence,
+            "final_answer": record.final_answer, "created_at": record.created_at,
+        })
+        suggestions.extend(_suggestion_rows(record.id, None, record.suggestions))
+
+        classified = record.line_classification.lines if record.line_classification else []
+        for line_no, line in enumerate(invoice.lines):
+            result = classified[line_no] if line_no < len(classified) else None
+            lines.append({
+                "invoice_id": record.id, "line_no": line_no, "description": line.description,
+                "amount": line.amount, "confidence": result.confidence if result else None,
+            })
+            if result is not None:
+                suggestions.extend(_suggestion_rows(record.id, line_no, result.suggestions))
+
+    if not invoices:
+        return
+    with database.SessionLocal() as session:
+        _ensure_tables(session)
+        session.execute(insert(InvoiceRecord), invoices)
+        if lines:
+            session.execute(insert(InvoiceLineRecord), lines)
+        if suggestions:
+            session.execute(insert(SuggestionRecord), suggestions)
+        session.commit()
+
+
+def get_classification(invoice_id: str) -> Optional[dict]:
+    """Read one stored classification back: the invoice row with its lines and suggestions."""
+    with database.ReadSessionLocal() as session:
+        _ensure_tables(session)
+        invoice = session.get(InvoiceRecord, invoice_id)
+        if invoice is None:
+            return None
+        lines = session.execute(
+            select(InvoiceLineRecord).where(InvoiceLineRecord.invoice_id == invoice_id).order_by(InvoiceLineRecord.line_no)
+        ).scalars().all()
+        suggestions = session.execute(
+            select(SuggestionRecord).where(SuggestionRecord.invoice_id == invoice_id).order_by(SuggestionRecord.id)
+        ).scalars().all()
+
+        def as_dict(row) -> dict:
+            return {column.key: getattr(row, column.key) for column in row.__table__.columns}
+
+        return {
+            **as_dict(invoice),
+            "lines": [as_dict(line) for line in lines],
+            "suggestions": [as_dict(s) for s in suggestions],
+        }
+
+
+_ready_binds: set[int] = set()
+
+
+def _ensure_tables(session):
+    """Create the three history tables on first use, so callers don't depend on init_db()."""
+    bind = session.get_bind()
+    if id(bind) not in _ready_binds:
+        for model in (InvoiceRecord, InvoiceLineRecord, SuggestionRecord):
+            model.__table__.create(bind=bind, checkfirst=True)
+        _upgrade_suggestions_table(bind)
+        _ready_binds.add(id(bind))
+
+
+def _upgrade_suggestions_table(bind):
+    """
+    invoice_suggestions used to keep the ranking score in 'similarity' (NOT NULL),
+    whatever its scale. Rebuild such a table: the old value becomes 'score', and
+    'similarity' keeps it only where it was a cosine (source 'vector').
+    """
+    columns = inspect(bind).get_columns(SuggestionRecord.__tablename__)
+    if "score" in {col["name"] for col in columns}:
+        return
+
+    table = SuggestionRecord.__table__
+    shared = ", ".join(col["name"] for col in columns if col["name"] in table.columns)
+    with bind.begin() as conn:
+        # SQLite cannot drop NOT NULL in place: rename, recreate, copy
+        conn.execute(text(f"ALTER TABLE {table.name} RENAME TO {table.name}_v1"))
+        for index in table.indexes:
+            conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+        table.create(bind=conn)
+        conn.execute(text(
+            f"INSERT INTO {table.name} ({shared}, score) SELECT {shared}, similarity FROM {table.name}_v1"
+        ))
+        conn.execute(text(f"UPDATE {table.name} SET similarity = NULL WHERE source != 'vector'"))
+        conn.execute(text(f"DROP TABLE {table.name}_v1"))
+
+
+def create_classification_writer() -> WriteBehindBuffer:
+    """The write-behind buffer the API queues ClassificationRecords on (see api.py lifespan)."""
+    return WriteBehindBuffer(
+        write_classifications,
+        max_queue=settings.RESULTS_QUEUE_MAX,
+        batch_size=settings.RESULTS_FLUSH_SIZE,
+        flush_interval=settings.RESULTS_FLUSH_INTERVAL,
+    )
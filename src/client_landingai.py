@@ -1,10 +1,13 @@
 import os
 import json
-import requests
+import asyncio
+import httpx
+from typing import BinaryIO, Optional
 from config import settings
 from models import Invoice
-from invoices import invoice_to_description
-from agent_graph import create_graph
+from document_cache import DocumentCache, parse_key, extract_key
+from metrics import timed, record_upstream_status
+from upstream import RETRYABLE_STATUS, get_upstream
 
 
 class LandingAIClient:
@@ -19,6 +22,7 @@ class LandingAIClient:
         api_key (str): The API key for authenticating requests to the Landing AI API.
         base_url (str): The base URL for the Landing AI API endpoints.
         invoice_schema (dict): The JSON schema used for extracting structured data from invoices.
+        cache (DocumentCache | None): Content-addressed cache of parse/extract results, if any.
 
     Methods:
         ade_parse(file_path: str) -> str:
@@ -27,16 +31,26 @@ class LandingAIClient:
             Extracts structured data from a markdown representation.
     """
 
-    def __init__(self, api_key: str, base_url: str = "https://api.va.landing.ai"):
+    EXTRACT_MODEL = "extract-latest"
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = "https://api.va.landing.ai",
+        cache: Optional[DocumentCache] = None,
+    ):
         """
         Initialize the LandingAIClient with the provided API key and base URL.
 
         Args:
             api_key (str): The API key for authenticating requests to the Landing AI API.
             base_url (str): The base URL for the Landing AI API endpoints. Defaults to "https://api.va.landing.ai".
+            cache (DocumentCache): Where to cache results (see document_cache.get_document_cache()).
+                None disables caching.
         """
         self.api_key = settings.LANDING_AI_API_KEY
         self.base_url = base_url
+        self.cache = cache
         
         self.invoice_schema = {
             "type": "object",
@@ -69,13 +83,42 @@ class LandingAIClient:
             dict: A dictionary containing the authorization header with the API key.
         """
         return {"Authorization": f"Bearer {self.api_key}"}
+
+    def _extract_key(self, markdown_text: str) -> str:
+        return extract_key(markdown_text, self.invoice_schema, self.EXTRACT_MODEL)
+
+    @staticmethod
+    def _markdown_from_payload(payload: dict) -> str:
+        markdown = (payload.get("data") or {}).get("markdown") or payload.get("markdown")
+        if not markdown:
+            raise RuntimeError(f"No markdown found in response keys={list(payload.keys())}")
+        return markdown
+
+    def _request(self, endpoint: str, url: str, **kwargs):
+        """
+        requests.post through the upstream scheduler (rate limit, retries, circuit breaker).
+        Retryable statuses are raised so they can be retried; other responses are returned as-is.
+        """
+        import requests  # only the sync client needs it; the API uses httpx
+
+        def post():
+            response = requests.post(url, headers=self._headers(), timeout=120, **kwargs)
+            record_upstream_status("landingai", endpoint, response.status_code)
+            if response.status_code in RETRYABLE_STATUS:
+                response.raise_for_status()
+            return response
+
+        transient = (requests.ConnectionError, requests.Timeout)
+        return get_upstream("landingai", endpoint).call(post, retry_on=transient)
     
-    def ade_parse(self, file_path: str) -> str:
+    @timed("ade_parse")
+    def ade_parse(self, file_path: str, use_cache: bool = True) -> str:
         """
         Parse a document using the Landing AI API and return its markdown representation.
 
         Args:
             file_path (str): The path to the document file to be parsed.
+            use_cache (bool): Set to False to bypass the document cache (always call the API).
 
         Returns:
             str: The markdown representation of the parsed document.
@@ -85,25 +128,34 @@ class LandingAIClient:
             requests.exceptions.RequestException: If the HTTP request fails.
         """
         url = f"{self.base_url}/v1/ade/parse"
-        headers = self._headers()
         
         with open(file_path, "rb") as f:
-            files ={"document": f}
-            response = requests.post(url, headers=headers, files=files, timeout=120)
-            response.raise_for_status()
-            payload = response.json()
-            markdown = (payload.get("data") or {}).get("markdown") or payload.get("markdown")
-            if not markdown:
-                raise RuntimeError(f"No markdown found in response keys={list(payload.keys())}")
-            return markdown
+            document = f.read()
+        
+        # Same bytes parsed before? Skip the upload.
+        key = parse_key(document) if self.cache else None
+        if key is not None and use_cache:
+            cached = self.cache.get("parse", key)
+            if cached is not None:
+                return cached
+        
+        files ={"document": (os.path.basename(file_path), document)}
+        response = self._request("parse", url, files=files)
+        response.raise_for_status()
+        markdown = self._markdown_from_payload(response.json())
+        if key is not None:
+            self.cache.put("parse", key, markdown)
+        return markdown
             
     
-    def ade_extract(self, markdown_text: str) -> dict:
+    @timed("ade_extract")
+    def ade_extract(self, markdown_text: str, use_cache: bool = True) -> dict:
         """
         Extract structured data from a markdown representation using the Landing AI API.
 
         Args:
             markdown_text (str): The markdown text to be processed.
+            use_cache (bool): Set to False to bypass the document cache (always call the API).
 
         Returns:
             dict: The extracted structured data as a dictionary.
@@ -112,21 +164,181 @@ class LandingAIClient:
             requests.exceptions.RequestException: If the HTTP request fails.
         """
         url = f"{self.base_url}/v1/ade/extract"
-        headers = self._headers()
+        
+        key = self._extract_key(markdown_text) if self.cache else None
+        if key is not None and use_cache:
+            cached = self.cache.get("extract", key)
+            if cached is not None:
+                return cached
         
         data = {"schema": json.dumps(self.invoice_schema),
-                "model": "extract-latest"}
+                "model": self.EXTRACT_MODEL}
         
         files = {
             "markdown": ("document.md", markdown_text.encode("utf-8"), "text/markdown"),
         }
         
-        response = requests.post(url, headers=headers, data=data, files=files, timeout=120)
+        response = self._request("extract", url, data=data, files=files)
         response.raise_for_status()
         payload = response.json()
+        if key is not None:
+            self.cache.put("extract", key, payload)
         
         return payload
 
 
+class AsyncLandingAIClient(LandingAIClient):
+    """
+    Async version of LandingAIClient for the API.
+
+    Instead of module-level requests.post (a new TCP/TLS connection per call), it sends
+    everything through one shared httpx.AsyncClient, so connections are kept alive and
+    reused across requests. The client is created once in the FastAPI lifespan
+    (see api.py) and passed in here.
+
+    ade_parse takes the document bytes or an open binary file. A file (e.g. the
+    spooled upload in api.py) is streamed into the request in chunks, so a large
+    scan is never held in memory as a whole.
+    """
+
+    def __init__(
+        self,
+        http: httpx.AsyncClient,
+        api_key: Optional[str] = None,
+        base_url: str = "https://api.va.landing.ai",
+        cache: Optional[DocumentCache] = None,
+    ):
+        """
+        Args:
+            http (httpx.AsyncClient): The shared, pooled HTTP client.
+            api_key (str): Landing AI API key. Defaults to settings.LANDING_AI_API_KEY.
+            base_url (str): The base URL for the Landing AI API endpoints.
+            cache (DocumentCache): Where to cache results. None disables caching.
+        """
+        super().__init__(api_key=api_key, base_url=base_url, cache=cache)
+        self.api_key = api_key or settings.LANDING_AI_API_KEY
+        self.http = http
+
+    async def _post(self, endpoint: str, url: str, rewind: Optional[BinaryIO] = None, **kwargs) -> httpx.Response:
+        """
+        POST through the shared client and the upstream scheduler (rate limit, retries,
+        circuit breaker), counting every response status (or failure) for /metrics.
+        Retryable statuses are raised so they can be retried; other responses are returned as-is.
+
+        Args:
+            rewind (BinaryIO): A file being uploaded; each attempt starts from its current position.
+        """
+        position = rewind.tell() if rewind is not None else None
+
+        async def post() -> httpx.Response:
+            if position is not None:
+                rewind.seek(position)
+            try:
+                response = await self.http.post(url, headers=self._headers(), **kwargs)
+            except httpx.HTTPError:
+                record_upstream_status("landingai", endpoint, None)
+                raise
+            record_upstream_status("landingai", endpoint, response.status_code)
+            if response.status_code in RETRYABLE_STATUS:
+                response.raise_for_status()
+            return response
+
+        return await get_upstream("landingai", endpoint).acall(post, retry_on=(httpx.TransportError,))
+
+    @timed("ade_parse")
+    async def ade_parse(
+        self,
+        document: bytes | BinaryIO,
+        filename: str = "document.pdf",
+        use_cache: bool = True,
+    ) -> str:
+        """
+        Parse a document using the Landing AI API and return its markdown representation.
+
+        Args:
+            document (bytes | BinaryIO): The document content, or a binary file object to stream from.
+            filename (str): The file name reported to the API.
+            use_cache (bool): Set to False to bypass the document cache (always call the API).
+
+        Returns:
+            str: The markdown representation of the parsed document.
+
+        Raises:
+            RuntimeError: If no markdown is found in the API response.
+            httpx.HTTPStatusError: If the API returns an error status (after retries, for transient ones).
+            CircuitOpenError: If Landing AI kept failing and calls are being refused for now.
+        """
+        url = f"{self.base_url}/v1/ade/parse"
+
+        # Content-addressed lookup: the same bytes always parse to the same markdown.
+        # A file object is hashed in chunks (off the event loop) and rewound, never read whole.
+        key = None
+        if self.cache:
+            key = parse_key(document) if isinstance(document, bytes) else await asyncio.to_thread(parse_key, document)
+            if use_cache:
+                cached = await asyncio.to_thread(self.cache.get, "parse", key)
+                if cached is not None:
+                    return cached
+
+        # httpx reads a file object in small chunks while sending the multipart body
+        files = {"document": (filename, document, "application/pdf")}
+        rewind = None if isinstance(document, bytes) else document
+        response = await self._post("parse", url, rewind=rewind, files=files)
+        response.raise_for_status()
+        markdown = self._markdown_from_payload(response.json())
+
+        if key is not None:
+            await asyncio.to_thread(self.cache.put, "parse", key, markdown)
+        return markdown
+
+    @timed("ade_extract")
+    async def ade_extract(self, markdown_text: str, use_cache: bool = True) -> dict:
+        """
+        Extract structured data from a markdown representation using the Landing AI API.
 
+        Args:
+            markdown_text (str): The markdown text to be processed.
+            use_cache (bool): Set to False to bypass the document cache (always call the API).
 
+        Returns:
+            dict: The extracted structured data as a dictionary.
+
+        Raises:
+            httpx.HTTPStatusError: If the API returns an error status (after retries, for transient ones).
+            CircuitOpenError: If Landing AI kept failing and calls are being refused for now.
+        """
+        url = f"{self.base_url}/v1/ade/extract"
+
+        key = self._extract_key(markdown_text) if self.cache else None
+        if key is not None and use_cache:
+            cached = await asyncio.to_thread(self.cache.get, "extract", key)
+            if cached is not None:
+                return cached
+
+        data = {"schema": json.dumps(self.invoice_schema),
+                "model": self.EXTRACT_MODEL}
+        files = {
+            "markdown": ("document.md", markdown_text.encode("utf-8"), "text/markdown"),
+        }
+
+        response = await self._post("extract", url, data=data, files=files)
+        response.raise_for_status()
+        payload = response.json()
+
+        if key is not None:
+            await asyncio.to_thread(self.cache.put, "extract", key, payload)
+        return payload
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    Build the shared keep-alive connection pool used for all Landing AI calls.
+    Call once at startup and aclose() it at shutdown.
+    """
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(settings.LANDING_AI_TIMEOUT, connect=10.0),
+        limits=httpx.Limits(
+            max_connections=settings.LANDING_AI_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LANDING_AI_MAX_CONNECTIONS,
+        ),
+    )
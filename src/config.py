@@ -1,15 +1,19 @@
 import os
-from dotenv import load_dotenv
+from typing import Optional
 
-#Load environment variables from a .env file
-load_dotenv()
 
 class Settings:
     """
     Centralized configuration.
     This class validates  that required keys exist on startup.
+
+    Values come from the environment, then from the project's .env file. The .env
+    file is only read here (os.environ is left untouched), so importing config has
+    no side effects beyond building this object. Keys meant for other libraries
+    (LangSmith tracing, OpenAI SDK options, ...) reach os.environ through
+    export_env(), called right before those libraries are loaded.
     """
-    def __init__(self):
+    def __init__(self, env_file: Optional[str] = None):
         # --- PATH FIX START ---
         # 1. Get the directory where config.py lives (.../src)
         base_dir = os.path.dirname(os.path.abspath(__file__))
@@ -17,22 +21,166 @@ class Settings:
         # 2. Go up one level to the project root (.../bookkeeper)
         project_root = os.path.join(base_dir, "..")
         
+        # Settings not in the environment fall back to <project root>/.env
+        self._dotenv = _read_env_file(env_file or os.path.join(project_root, ".env"))
+        self._read_keys: set[str] = set()
+        
         db_path = os.path.join(project_root, "bookkeeper.db")
         self.DATABASE_URL = f"sqlite:///{db_path}"
         
+        #SQLite tuning (see database.create_sqlite_engines): WAL lets the read pool keep
+        #serving queries while the single writer connection commits
+        self.SQLITE_WAL = self._getenv("SQLITE_WAL", "1") != "0"
+        self.SQLITE_SYNCHRONOUS = self._getenv("SQLITE_SYNCHRONOUS", "NORMAL")         #OFF | NORMAL | FULL | EXTRA (NORMAL is durable enough with WAL)
+        self.SQLITE_CACHE_SIZE_KB = int(self._getenv("SQLITE_CACHE_SIZE_KB", "65536"))  #page cache per connection
+        self.SQLITE_MMAP_SIZE_MB = int(self._getenv("SQLITE_MMAP_SIZE_MB", "256"))      #memory-mapped reads; 0 = off
+        self.SQLITE_BUSY_TIMEOUT_MS = int(self._getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))  #wait on locks held by other processes
+        self.SQLITE_READ_POOL_SIZE = int(self._getenv("SQLITE_READ_POOL_SIZE", "8"))    #pooled read connections
+        self.SQLITE_WRITE_TIMEOUT = float(self._getenv("SQLITE_WRITE_TIMEOUT", "30"))   #seconds a write waits for the writer connection
+        
         #2. API Keys
-        self.OPENAI_API_KEY = os.getenv("OPENAI_API")
-        self.TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
-        self.LANDING_AI_API_KEY = os.getenv("LANDING_AI_API_KEY")
+        self.OPENAI_API_KEY = self._getenv("OPENAI_API")
+        self.TAVILY_API_KEY = self._getenv("TAVILY_API_KEY")
+        self.LANDING_AI_API_KEY = self._getenv("LANDING_AI_API_KEY")
         
         #3. app settings
         self.SEARCH_LIMIT_K = 5  #Number of similar accounts to retrieve
+        self.GRAPH_MAX_CONCURRENCY = int(self._getenv("GRAPH_MAX_CONCURRENCY", "8"))  #graph runs in flight for run_batch/arun_batch
+        self.EMBEDDING_PROVIDER = self._getenv("EMBEDDING_PROVIDER", "openai")  #'openai' or 'local' (offline hashing embedder)
+        self.EMBEDDING_MODEL = self._getenv("EMBEDDING_MODEL", "text-embedding-3-small")  #OpenAI model for stored & query vectors
+        self.LOCAL_EMBEDDING_DIM = int(self._getenv("LOCAL_EMBEDDING_DIM", "1536"))  #vector size of the 'local' provider
+        self.LINE_HEADER_WEIGHT = float(self._getenv("LINE_HEADER_WEIGHT", "0.25"))  #how much invoice context each line query gets
+        
+        #Keyword (BM25) search over the account texts, tried before embedding the description
+        self.LEXICAL_ENABLED = self._getenv("LEXICAL_ENABLED", "1") != "0"
+        self.LEXICAL_FAST_PATH_MIN_SCORE = float(self._getenv("LEXICAL_FAST_PATH_MIN_SCORE", "4.0"))  #winner's BM25 score needed to skip embedding
+        self.LEXICAL_FAST_PATH_MARGIN = float(self._getenv("LEXICAL_FAST_PATH_MARGIN", "0.5"))        #...and runner-up must be this fraction behind
+        self.LEXICAL_FUSION_WEIGHT = float(self._getenv("LEXICAL_FUSION_WEIGHT", "0.1"))              #otherwise: cosine + weight * bm25/best_bm25
+        self.LEXICAL_CANDIDATES = int(self._getenv("LEXICAL_CANDIDATES", "20"))                       #keyword hits considered for fusion
+        
+        #Vendor -> account memo (first node of the agent graph)
+        self.VENDOR_MEMO_ENABLED = self._getenv("VENDOR_MEMO_ENABLED", "1") != "0"
+        self.VENDOR_MEMO_MIN_CONFIRMATIONS = int(self._getenv("VENDOR_MEMO_MIN_CONFIRMATIONS", "1"))  #confirmations before a mapping is trusted
+        
+        self.IMPORT_CHUNK_SIZE = int(self._getenv("IMPORT_CHUNK_SIZE", "5000"))  #CSV rows per upsert transaction
+        self.EMBEDDING_BATCH_SIZE = int(self._getenv("EMBEDDING_BATCH_SIZE", "100"))  #texts per embeddings request
+        self.EMBEDDING_MAX_CONCURRENCY = int(self._getenv("EMBEDDING_MAX_CONCURRENCY", "4"))  #requests in flight during backfill
+        
+        #Approximate (IVF) search - only used once the chart has ANN_MIN_ROWS accounts
+        self.ANN_ENABLED = self._getenv("ANN_ENABLED", "1") != "0"
+        self.ANN_MIN_ROWS = int(self._getenv("ANN_MIN_ROWS", "50000"))  #below this the exact scan is used
+        self.ANN_NLIST = int(self._getenv("ANN_NLIST", "0"))            #clusters; 0 = about 4*sqrt(rows)
+        self.ANN_NPROBE = int(self._getenv("ANN_NPROBE", "16"))         #clusters searched per query (recall vs latency)
+        self.ANN_INDEX_PATH = self._getenv("ANN_INDEX_PATH", os.path.join(project_root, "bookkeeper.ivf.npz"))
+        
+        #Multi-tenant: each tenant's index is loaded on its first search and the coldest
+        #tenants are dropped from memory once all resident indexes exceed this budget
+        self.TENANT_INDEX_MEMORY_MB = int(self._getenv("TENANT_INDEX_MEMORY_MB", "1024"))  #0 = never evict
+        self.TENANT_INDEX_MAX_TENANTS = int(self._getenv("TENANT_INDEX_MAX_TENANTS", "1000"))  #resident tenants at most (0 = no limit)
+        
+        #4. Landing AI
+        self.LANDING_AI_BASE_URL = self._getenv("LANDING_AI_BASE_URL", "https://api.va.landing.ai")
+        self.LANDING_AI_TIMEOUT = float(self._getenv("LANDING_AI_TIMEOUT", "120"))  #seconds per upstream call
+        self.LANDING_AI_MAX_CONNECTIONS = int(self._getenv("LANDING_AI_MAX_CONNECTIONS", "20"))  #shared keep-alive pool size
+        self.LANDING_AI_PARSE_RPM = float(self._getenv("LANDING_AI_PARSE_RPM", "0"))      #client-side request limit per minute; 0 = none
+        self.LANDING_AI_EXTRACT_RPM = float(self._getenv("LANDING_AI_EXTRACT_RPM", "0"))
+        
+        #Upstream scheduler (see upstream.py), per process: every OpenAI / Landing AI call waits for
+        #its endpoint's token bucket, transient failures are retried, and a circuit breaker per
+        #service fails calls fast while it is down
+        self.OPENAI_EMBEDDING_RPM = float(self._getenv("OPENAI_EMBEDDING_RPM", "3000"))        #embedding requests per minute (per model)
+        self.OPENAI_EMBEDDING_TPM = float(self._getenv("OPENAI_EMBEDDING_TPM", "1000000"))     #embedding input tokens per minute (estimated)
+        self.UPSTREAM_MAX_RETRIES = int(self._getenv("UPSTREAM_MAX_RETRIES", "4"))             #retries after the first attempt
+        self.UPSTREAM_BACKOFF_BASE = float(self._getenv("UPSTREAM_BACKOFF_BASE", "0.5"))      #seconds; full jitter over base * 2^attempt
+        self.UPSTREAM_BACKOFF_MAX = float(self._getenv("UPSTREAM_BACKOFF_MAX", "30"))         #longest single wait; a longer Retry-After fails the call
+        self.UPSTREAM_BREAKER_FAILURES = int(self._getenv("UPSTREAM_BREAKER_FAILURES", "5"))  #failed calls in a row that open the circuit
+        self.UPSTREAM_BREAKER_RESET = float(self._getenv("UPSTREAM_BREAKER_RESET", "30"))     #seconds before a probe call is let through
+        
+        #Content-addressed cache of ade_parse / ade_extract results (next to bookkeeper.db)
+        self.DOCUMENT_CACHE_ENABLED = self._getenv("DOCUMENT_CACHE_ENABLED", "1") != "0"
+        self.DOCUMENT_CACHE_DIR = self._getenv("DOCUMENT_CACHE_DIR", os.path.join(project_root, "cache", "landingai"))
+        self.DOCUMENT_CACHE_MAX_MB = int(self._getenv("DOCUMENT_CACHE_MAX_MB", "512"))
+        
+        #Uploads: bodies larger than this are refused with 413 - up front when Content-Length
+        #says so, otherwise as soon as the streamed body passes the limit
+        self.MAX_UPLOAD_MB = float(self._getenv("MAX_UPLOAD_MB", "50"))  #0 = no limit
         
+        #5. batch pipeline (/classify-invoices) - max documents in each stage at once
+        self.PIPELINE_PARSE_CONCURRENCY = int(self._getenv("PIPELINE_PARSE_CONCURRENCY", "8"))
+        self.PIPELINE_EXTRACT_CONCURRENCY = int(self._getenv("PIPELINE_EXTRACT_CONCURRENCY", "8"))
+        self.PIPELINE_DESCRIBE_CONCURRENCY = int(self._getenv("PIPELINE_DESCRIBE_CONCURRENCY", "32"))
+        self.PIPELINE_SUGGEST_CONCURRENCY = int(self._getenv("PIPELINE_SUGGEST_CONCURRENCY", "4"))
+        self.BATCH_MAX_DOCUMENTS = int(self._getenv("BATCH_MAX_DOCUMENTS", "500"))  #per request, zip contents included
+        self.BATCH_MAX_ZIP_MEMBER_MB = float(self._getenv("BATCH_MAX_ZIP_MEMBER_MB", "50"))  #one PDF inside a .zip, decompressed (0 = no limit)
+        self.BATCH_MAX_UNZIPPED_MB = float(self._getenv("BATCH_MAX_UNZIPPED_MB", "200"))     #all PDFs of one .zip, decompressed (0 = no limit)
+        
+        #6. query embedding cache
+        self.EMBEDDING_CACHE_MEMORY_ENTRIES = int(self._getenv("EMBEDDING_CACHE_MEMORY_ENTRIES", "2048"))  #in-process LRU size
+        self.EMBEDDING_CACHE_MAX_ENTRIES = int(self._getenv("EMBEDDING_CACHE_MAX_ENTRIES", "100000"))      #rows kept in SQLite
+        self.EMBEDDING_CACHE_MAX_AGE_DAYS = float(self._getenv("EMBEDDING_CACHE_MAX_AGE_DAYS", "90"))      #older rows are evicted
+        
+        #Prometheus-style counters and latency histograms, served on /metrics
+        self.METRICS_ENABLED = self._getenv("METRICS_ENABLED", "1") != "0"
+        
+        #Admin endpoints (/admin/profile). Unset token = the endpoints do not exist (404)
+        self.ADMIN_TOKEN = self._getenv("ADMIN_TOKEN")
+        self.PROFILE_MAX_SECONDS = float(self._getenv("PROFILE_MAX_SECONDS", "300"))         #longest allowed profiling run
+        self.PROFILE_SAMPLE_INTERVAL_MS = float(self._getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))  #'sampling' mode stack snapshot period
+        
+        #7. classification history (invoices, invoice_lines, invoice_suggestions), written behind the request
+        self.RESULTS_PERSIST_ENABLED = self._getenv("RESULTS_PERSIST_ENABLED", "1") != "0"
+        self.RESULTS_QUEUE_MAX = int(self._getenv("RESULTS_QUEUE_MAX", "10000"))             #results waiting to be written; requests wait when full
+        self.RESULTS_FLUSH_SIZE = int(self._getenv("RESULTS_FLUSH_SIZE", "200"))              #results per transaction
+        self.RESULTS_FLUSH_INTERVAL = float(self._getenv("RESULTS_FLUSH_INTERVAL", "1.0"))    #seconds a result may wait for its batch to fill
+        
+        #8. job queue (POST /jobs, GET /jobs/{id}) - jobs live in bookkeeper.db, their uploads in JOBS_DIR
+        self.JOBS_DIR = self._getenv("JOBS_DIR", os.path.join(project_root, "jobs"))
+        self.JOB_WORKERS = int(self._getenv("JOB_WORKERS", "0"))                          #worker processes each API process starts (opt-in); 0 = run job_worker.py yourself
+        self.JOB_WORKER_CONCURRENCY = int(self._getenv("JOB_WORKER_CONCURRENCY", "4"))    #jobs in flight per worker process
+        self.JOB_VISIBILITY_TIMEOUT = float(self._getenv("JOB_VISIBILITY_TIMEOUT", "60"))  #seconds without a lease renewal before a job is handed out again
+        self.JOB_MAX_ATTEMPTS = int(self._getenv("JOB_MAX_ATTEMPTS", "3"))                #claims before a job whose workers keep dying is failed
+        self.JOB_RETRY_DELAY = float(self._getenv("JOB_RETRY_DELAY", "15"))              #seconds before a job hit by an upstream outage runs again (doubles each time)
+        self.JOB_MAX_REQUEUES = int(self._getenv("JOB_MAX_REQUEUES", "10"))               #outage requeues before the job is failed after all
+        self.JOB_POLL_INTERVAL = float(self._getenv("JOB_POLL_INTERVAL", "0.5"))          #idle workers / long-polls re-check the table this often
+        self.JOB_MAX_WAIT = float(self._getenv("JOB_MAX_WAIT", "60"))                     #longest long-poll (GET /jobs/{id}?wait=...)
+        
+    def _getenv(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        """Like os.getenv, with the .env file as the fallback (the real environment wins)."""
+        self._read_keys.add(key)
+        value = os.environ.get(key)
+        if value is None:
+            value = self._dotenv.get(key)
+        return default if value is None else value
+    
+    def export_env(self) -> list[str]:
+        """
+        Copy the .env keys the app doesn't read itself into os.environ (variables that
+        are already set win), for libraries that only look there. Safe to call again.
+
+        Returns:
+            list[str]: The keys that were exported.
+        """
+        exported = [
+            key for key in self._dotenv
+            if key not in self._read_keys and key not in os.environ
+        ]
+        for key in exported:
+            os.environ[key] = self._dotenv[key]
+        return exported
+    
     def _get_required_env(self, key: str) -> str:
         """Fetch env var or raise an error if missing."""
-        value = os.getenv(key)
+        value = self._getenv(key)
         if not value:
             raise ValueError(f"❌ Missing required environment variable: {key}")
         return value
     
+def _read_env_file(path: str) -> dict:
+    """KEY=value pairs of a .env file ({} if there is none). python-dotenv is only imported if there is one."""
+    if not os.path.isfile(path):
+        return {}
+    from dotenv import dotenv_values
+    return {key: value for key, value in dotenv_values(path).items() if value is not None}
+
+
 settings = Settings()   
\ No newline at end of file
@@ -1,29 +1,251 @@
-from sqlalchemy import create_engine
+import json
+import os
+import time
+import numpy as np
+from sqlalchemy import create_engine, event, inspect, text, delete, select, Engine
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import StaticPool
 from orm_models import Base, AccountModel, AccountEmbedding
-from models import Account
+from models import Account, get_account_text
 from config import settings
 from typing import Optional
+from vector_index import VectorIndex, encode_embedding, decode_embedding
+from ann_index import IVFIndex, matrix_fingerprint
+from account_catalog import AccountCatalog, CatalogEntry
+from lexical_index import LexicalIndex
+from embeddings import get_embedding_provider
+from tenants import DEFAULT_TENANT, TenantIndexManager, validate_tenant_id
+from metrics import DB_QUERY_SECONDS, statement_type, timed
 
-# 1. Setup the Engine (The Connection)
+# 1. Setup the Engines (The Connections)
 # check_same_thread=False is needed only for SQLite if multiple parts of the app 
 # try to access the DB at once (like a web server). Good practice to have.
+#
+# SQLite allows many readers but only one writer at a time. So there are two engines:
+#   - engine:      ONE connection, used by every write. Writers queue for it in
+#                  Python (pool_timeout) instead of failing with "database is locked".
+#   - read_engine: a pool of connections for the query paths. In WAL mode they keep
+#                  reading the last committed state while the writer is busy.
+# Both set the pragmas from settings (see _configure_connection) on every new connection.
+
+SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+
+
+def _configure_connection(dbapi_connection, writer: bool):
+    """Apply the SQLite pragmas from settings to a freshly opened connection."""
+    synchronous = settings.SQLITE_SYNCHRONOUS.upper()
+    if synchronous not in SYNCHRONOUS_MODES:
+        raise ValueError(f"SQLITE_SYNCHRONOUS must be one of {sorted(SYNCHRONOUS_MODES)}, got {synchronous!r}")
+
+    cursor = dbapi_connection.cursor()
+    try:
+        # journal_mode is stored in the database file - the writer sets it once per connection
+        if writer and settings.SQLITE_WAL:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        cursor.execute(f"PRAGMA synchronous={synchronous}")
+        cursor.execute(f"PRAGMA cache_size={-int(settings.SQLITE_CACHE_SIZE_KB)}")  # negative = KiB
+        cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE_MB) * 1024 * 1024}")
+    finally:
+        cursor.close()
+
+
+def create_sqlite_engines(url: str, read_pool_size: Optional[int] = None) -> tuple[Engine, Engine]:
+    """
+    Build the (writer, reader) engine pair for a SQLite URL.
+
+    An in-memory database only exists inside its one connection, so for
+    ':memory:' both roles share a single StaticPool engine.
+
+    Returns:
+        tuple[Engine, Engine]: (engine for writes, engine for reads).
+    """
+    connect_args = {"check_same_thread": False}
+    if ":memory:" in url or "mode=memory" in url:
+        shared = create_engine(url, echo=False, connect_args=connect_args, poolclass=StaticPool)
+        event.listen(shared, "connect", lambda conn, _: _configure_connection(conn, writer=False))
+        return shared, shared
+
+    writer = create_engine(
+        url, echo=False, connect_args=connect_args,
+        pool_size=1, max_overflow=0, pool_timeout=settings.SQLITE_WRITE_TIMEOUT,
+    )
+    event.listen(writer, "connect", lambda conn, _: _configure_connection(conn, writer=True))
+
+    pool_size = read_pool_size or settings.SQLITE_READ_POOL_SIZE
+    reader = create_engine(
+        url, echo=False, connect_args=connect_args,
+        pool_size=pool_size, max_overflow=pool_size, pool_timeout=settings.SQLITE_WRITE_TIMEOUT,
+    )
+    event.listen(reader, "connect", lambda conn, _: _configure_connection(conn, writer=False))
+    return writer, reader
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_start"] = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_query_time(conn, cursor, statement, parameters, context, executemany):
+    # Every engine (writer, read pool, test engines) reports into the same histogram
+    start = conn.info.pop("query_start", None)
+    if start is not None:
+        DB_QUERY_SECONDS.observe(time.perf_counter() - start, statement=statement_type(statement))
+
 
 DATABASE_URL = settings.DATABASE_URL
-engine = create_engine(DATABASE_URL, echo=False, connect_args={"check_same_thread": False})
+engine, read_engine = create_sqlite_engines(DATABASE_URL)
 
-# 2. Setup the Session Factory
-# This is a factory that produces new Session objects when we ask for them.
+# 2. Setup the Session Factories
+# These are factories that produce new Session objects when we ask for them.
+# SessionLocal is the (single) writer; ReadSessionLocal is for code that only reads.
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+
+def configure_engines(url: str):
+    """Point the whole module (both engines and session factories) at another database."""
+    global engine, read_engine, SessionLocal, ReadSessionLocal
+    engine, read_engine = create_sqlite_engines(url)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+    reset_caches()
+
+# 3. The resident search indexes, one per tenant (client company)
+# Each tenant's vector index and account catalog are loaded from the database on its
+# first search, then kept in sync by the write helpers below so searches never have
+# to re-read the tables. The coldest tenants are dropped once the budget is exceeded.
+tenant_indexes = TenantIndexManager(
+    max_bytes=settings.TENANT_INDEX_MEMORY_MB * 1024 * 1024,
+    max_tenants=settings.TENANT_INDEX_MAX_TENANTS,
+)
+
+
+def reset_caches():
+    """Drop every tenant's in-memory index and catalog (e.g. after pointing SessionLocal at another DB)."""
+    tenant_indexes.clear()
 
 def init_db():
-    """Helper to create tables if they don't exist."""
+    """Helper to create tables if they don't exist (and upgrade old ones)."""
     Base.metadata.create_all(bind=engine)
+    migrate_legacy_embeddings()
+    migrate_to_tenant_keys()
+    _add_missing_columns()
+
+
+# The model every vector was embedded with before the model was recorded per row
+LEGACY_EMBEDDING_MODEL = "text-embedding-3-small"
+
 
-def insert_account(account: AccountModel):
+def migrate_legacy_embeddings() -> int:
+    """
+    Upgrade an old account_embeddings table (one JSON text column) to the
+    binary float32 layout with 'dim' and 'model' columns.
+
+    The old vectors were all produced by text-embedding-3-small, so that is the
+    model recorded for them. Safe to call on an already-migrated database.
+
+    Returns:
+        int: The number of rows converted (0 if nothing to do).
+    """
+    columns = {col["name"] for col in inspect(engine).get_columns(AccountEmbedding.__tablename__)}
+    if "dim" in columns:
+        return 0  # already on the new layout
+
+    table = AccountEmbedding.__table__
+    with engine.begin() as conn:
+        # 1. Move the old table out of the way and create the new one
+        conn.execute(text(f"ALTER TABLE {table.name} RENAME TO {table.name}_legacy"))
+        table.create(bind=conn)
+
+        # 2. Re-encode every JSON vector as float32 bytes
+        legacy_rows = conn.execute(text(f"SELECT code, embedding FROM {table.name}_legacy")).all()
+        new_rows = []
+        for code, raw in legacy_rows:
+            vector = json.loads(raw) if isinstance(raw, str) else raw
+            new_rows.append({
+                "code": code,
+                "embedding": encode_embedding(vector),
+                "dim": len(vector),
+                "model": LEGACY_EMBEDDING_MODEL,
+            })
+        if new_rows:
+            conn.execute(table.insert(), new_rows)
+
+        # 3. Drop the old copy
+        conn.execute(text(f"DROP TABLE {table.name}_legacy"))
+
+    # 4. Give the freed pages back to the filesystem (must run outside a transaction)
+    with engine.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM"))
+
+    reset_caches()
+    return len(new_rows)
+
+
+def migrate_to_tenant_keys() -> int:
+    """
+    Rebuild accounts / account_embeddings tables from before multi-tenancy
+    (primary key 'code') with the (tenant_id, code) primary key.
+
+    SQLite cannot change a primary key in place, so each table is renamed, recreated
+    and copied over; every existing row goes to DEFAULT_TENANT. Safe to call on an
+    already-migrated database.
+
+    Returns:
+        int: The number of rows moved (0 if nothing to do).
+    """
+    inspector = inspect(engine)
+    moved = 0
+    for model in (AccountModel, AccountEmbedding):
+        table = model.__table__
+        if not inspector.has_table(table.name):
+            continue
+        existing = [col["name"] for col in inspector.get_columns(table.name)]
+        if "tenant_id" in existing:
+            continue
+
+        # Columns the old table already has (newer nullable ones are simply left empty)
+        shared = ", ".join(name for name in existing if name in table.columns)
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {table.name} RENAME TO {table.name}_pretenant"))
+            table.create(bind=conn)
+            moved += conn.execute(
+                text(
+                    f"INSERT INTO {table.name} (tenant_id, {shared}) "
+                    f"SELECT :tenant, {shared} FROM {table.name}_pretenant"
+                ),
+                {"tenant": DEFAULT_TENANT},
+            ).rowcount
+            conn.execute(text(f"DROP TABLE {table.name}_pretenant"))
+
+    if moved:
+        reset_caches()
+    return moved
+
+def _add_missing_columns():
+    """
+    create_all() never alters existing tables, so nullable columns added to a
+    model after a DB was created are added here with ALTER TABLE.
+    """
+    with engine.begin() as conn:
+        inspector = inspect(conn)  # the writer pool has one connection - inspect through it
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    col_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}"))
+
+
+def insert_account(account: AccountModel, tenant_id: str = DEFAULT_TENANT):
     """
     Take a Pydantic Account object, convert it to ORM model, 
-        and save it to the database.
+        and save it to the database (in the given tenant's chart).
     """
     
     with SessionLocal() as session:
@@ -31,59 +253,310 @@ def insert_account(account: AccountModel):
         data = account.model_dump()
         
         # Create the ORM object (unpacking the dict)
-        db_account = AccountModel(**data)
+        db_account = AccountModel(tenant_id=tenant_id, **data)
         
-        # Merge checks the Primary Key (code). 
+        # Merge checks the Primary Key (tenant_id, code). 
         # If it exists, it updates. If not, it inserts.
         session.merge(db_account)  
         
         # Commit the transaction to save changes
         session.commit()
+    
+    # Keep the in-memory catalog and lexical index in sync (no-op if not resident)
+    resident = tenant_indexes.peek(tenant_id)
+    if resident is not None:
+        entry = CatalogEntry(**data)
+        resident.catalog.upsert(entry)
+        resident.lexical.upsert(entry.code, get_account_text(entry))
         
+
+
+def bulk_upsert_accounts(rows: list[dict], tenant_id: str = DEFAULT_TENANT) -> int:
+    """
+    Insert or update many accounts of one tenant in one transaction.
+    
+    Each dict has the AccountModel columns (code, account_name, ...). The whole chunk
+    goes through a single INSERT ... ON CONFLICT(tenant_id, code) DO UPDATE executemany,
+    so we pay for one commit (one fsync) per chunk instead of one per row.
+    
+    Returns:
+        int: The number of rows written.
+    """
+    if not rows:
+        return 0
+
+    stmt = sqlite_insert(AccountModel)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[AccountModel.tenant_id, AccountModel.code],
+        set_={
+            col.name: stmt.excluded[col.name]
+            for col in AccountModel.__table__.columns
+            if not col.primary_key
+        },
+    )
+    with SessionLocal() as session:
+        session.execute(stmt, [{**row, "tenant_id": tenant_id} for row in rows])
+        session.commit()
     
-def clear_database():
-    """Helper to clear all data from the database tables."""
+    resident = tenant_indexes.peek(tenant_id)
+    if resident is not None:
+        for row in rows:
+            entry = CatalogEntry(**row)
+            resident.catalog.upsert(entry)
+            resident.lexical.upsert(entry.code, get_account_text(entry))
+    return len(rows)
+
+
+def delete_accounts_except(
+    keep_codes: set[str],
+    chunk_size: int = 500,
+    tenant_id: str = DEFAULT_TENANT,
+) -> int:
+    """
+    Delete every account of the tenant whose code is not in keep_codes (plus its embedding).
+    
+    Returns:
+        int: The number of accounts deleted.
+    """
     with SessionLocal() as session:
-        session.query(AccountModel).delete()
-        session.query(AccountEmbedding).delete()
+        existing = session.execute(
+            select(AccountModel.code).where(AccountModel.tenant_id == tenant_id)
+        ).scalars().all()
+        stale = [code for code in existing if code not in keep_codes]
+
+        # Delete in chunks to stay under SQLite's bound-parameter limit
+        for i in range(0, len(stale), chunk_size):
+            chunk = stale[i:i + chunk_size]
+            session.execute(delete(AccountModel).where(
+                AccountModel.tenant_id == tenant_id, AccountModel.code.in_(chunk)
+            ))
+            session.execute(delete(AccountEmbedding).where(
+                AccountEmbedding.tenant_id == tenant_id, AccountEmbedding.code.in_(chunk)
+            ))
         session.commit()
+
+    if stale:
+        tenant_indexes.drop(tenant_id)
+    return len(stale)
+
+    
+def clear_database(tenant_id: Optional[str] = None):
+    """
+    Helper to clear data from the database tables.
+    
+    Args:
+        tenant_id (str): Only clear this tenant's chart. None clears every tenant.
+    """
+    with SessionLocal() as session:
+        accounts = session.query(AccountModel)
+        embeddings = session.query(AccountEmbedding)
+        if tenant_id is not None:
+            accounts = accounts.filter(AccountModel.tenant_id == tenant_id)
+            embeddings = embeddings.filter(AccountEmbedding.tenant_id == tenant_id)
+        accounts.delete()
+        embeddings.delete()
+        session.commit()
+
+    if tenant_id is None:
+        reset_caches()
+    else:
+        tenant_indexes.drop(tenant_id)
         
 
 
-def insert_account_embedding(code: str, embedding: list[float]):
+def insert_account_embedding(
+    code: str,
+    embedding: list[float],
+    model: Optional[str] = None,
+    content_hash: Optional[str] = None,
+    tenant_id: str = DEFAULT_TENANT,
+):
     """
     Save the vector embedding for a specific account code.
     
-    This replaces the JSON serialization logic. SQLAlchemy handles the list-to-JSON conversion.
+    The vector is packed as little-endian float32 bytes together with its
+    dimension and the name of the model that produced it.
     """
     
     with SessionLocal() as session:
         #Create the ORM object
-        #We just pass the raw list [0.1, 0.2,...] and SQLAlchemy converts it to JSON
-        embedding_obj = AccountEmbedding(code=code, embedding=embedding)
+        #The list [0.1, 0.2,...] becomes 4 bytes per value
+        embedding_obj = AccountEmbedding(
+            tenant_id=tenant_id,
+            code=code,
+            embedding=encode_embedding(embedding),
+            dim=len(embedding),
+            model=model or get_embedding_provider().model,
+            content_hash=content_hash,
+        )
 
         session.merge(embedding_obj)  # Insert or update based on primary key
         session.commit()
+
+    # Keep the resident index in sync (no-op if it is not resident)
+    resident = tenant_indexes.peek(tenant_id)
+    if resident is not None:
+        resident.index.upsert(code, embedding)
         
-def load_all_account_embeddings() -> list[tuple[str, list[float]]]:
+def bulk_upsert_account_embeddings(
+    rows: list[tuple[str, list[float], Optional[str]]],
+    model: Optional[str] = None,
+    tenant_id: str = DEFAULT_TENANT,
+):
+    """
+    Save many (code, embedding, content_hash) rows of one tenant in a single transaction.
+
+    Uses one INSERT ... ON CONFLICT(tenant_id, code) DO UPDATE executemany instead of a
+    session.merge() + commit per row.
+    """
+    if not rows:
+        return
+
+    model = model or get_embedding_provider().model
+    params = [
+        {
+            "tenant_id": tenant_id,
+            "code": code,
+            "embedding": encode_embedding(vector),
+            "dim": len(vector),
+            "model": model,
+            "content_hash": content_hash,
+        }
+        for code, vector, content_hash in rows
+    ]
+
+    stmt = sqlite_insert(AccountEmbedding)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[AccountEmbedding.tenant_id, AccountEmbedding.code],
+        set_={
+            "embedding": stmt.excluded.embedding,
+            "dim": stmt.excluded.dim,
+            "model": stmt.excluded.model,
+            "content_hash": stmt.excluded.content_hash,
+        },
+    )
+    with SessionLocal() as session:
+        session.execute(stmt, params)
+        session.commit()
+
+    resident = tenant_indexes.peek(tenant_id)
+    if resident is not None:
+        for code, vector, _ in rows:
+            resident.index.upsert(code, vector)
+
+
+def get_embedding_fingerprints(tenant_id: str = DEFAULT_TENANT) -> dict[str, tuple[Optional[str], str]]:
+    """Return {code: (content_hash, model)} for every embedding stored for the tenant."""
+    with ReadSessionLocal() as session:
+        rows = session.execute(
+            select(AccountEmbedding.code, AccountEmbedding.content_hash, AccountEmbedding.model)
+            .where(AccountEmbedding.tenant_id == tenant_id)
+        ).all()
+        return {code: (content_hash, model) for code, content_hash, model in rows}
+
+
+def delete_account_embeddings(codes: list[str], tenant_id: str = DEFAULT_TENANT):
+    """Remove the tenant's embeddings for the given account codes."""
+    if not codes:
+        return
+    with SessionLocal() as session:
+        session.execute(delete(AccountEmbedding).where(
+            AccountEmbedding.tenant_id == tenant_id, AccountEmbedding.code.in_(codes)
+        ))
+        session.commit()
+
+    # Rows disappear from the middle of the matrix - simplest correct thing is a reload
+    resident = tenant_indexes.peek(tenant_id)
+    if resident is not None:
+        resident.index.invalidate()
+
+
+@timed("load_all_account_embeddings")
+def load_all_account_embeddings(tenant_id: str = DEFAULT_TENANT) -> list[tuple[str, np.ndarray]]:
     """
-    Downloads all the vectors from the database so we can do math on them.
+    Downloads all the tenant's vectors from the database so we can do math on them.
     Return a list of (code, embedding_vector) tuples to match the search engine's requirements.   
+    
+    Each vector is a read-only float32 view straight over the BLOB bytes - no parsing, no copy.
     """
     
-    with SessionLocal() as session:
-        #Get all rows from the account_embeddings table
-        results = session.query(AccountEmbedding).all()
+    with ReadSessionLocal() as session:
+        #Only fetch the columns we need (skips building full ORM objects)
+        results = (
+            session.query(AccountEmbedding.code, AccountEmbedding.embedding, AccountEmbedding.dim)
+            .filter(AccountEmbedding.tenant_id == tenant_id)
+            .all()
+        )
         
-        # Convert ORM objects into the list of tuples the app expects
-        # We return [(row.code, row.embedding), ...]
-        return [(row.code, row.embedding) for row in results]
+        # We return [(code, vector), ...]
+        return [(code, decode_embedding(blob, dim)) for code, blob, dim in results]
+
+
+def get_account_index(tenant_id: str = DEFAULT_TENANT) -> VectorIndex:
+    """Return the tenant's resident search index, loading it from the database on first use."""
+    entry = tenant_indexes.get(tenant_id)
+    if not entry.index.is_loaded:
+        with entry.load_lock:
+            if not entry.index.is_loaded:
+                entry.index.load(load_all_account_embeddings(tenant_id))
+                entry.index.attach_ann(load_or_build_ann_index(entry.index, tenant_id=tenant_id))
+                tenant_indexes.loaded(tenant_id)
+    return entry.index
+
+
+def ann_index_path(tenant_id: str = DEFAULT_TENANT) -> str:
+    """
+    Where the tenant's approximate index is saved. The default tenant keeps
+    settings.ANN_INDEX_PATH; other tenants get '<name>.<tenant_id>.npz' next to it.
+    """
+    if tenant_id == DEFAULT_TENANT:
+        return settings.ANN_INDEX_PATH
+    root, ext = os.path.splitext(settings.ANN_INDEX_PATH)
+    return f"{root}.{validate_tenant_id(tenant_id)}{ext}"
+
+
+def load_or_build_ann_index(
+    index: VectorIndex,
+    force: bool = False,
+    tenant_id: str = DEFAULT_TENANT,
+) -> Optional[IVFIndex]:
+    """
+    Get the approximate index for a large chart.
     
-def get_all_accounts() -> list[Account]: # Notice return type is Pydantic Account
-    """Fetch all accounts and convert them to Pydantic models."""
-    with SessionLocal() as session:
+    Small charts (fewer than settings.ANN_MIN_ROWS rows) keep using the exact scan and
+    get None; so does an empty chart, even when forced. Otherwise the index saved next to bookkeeper.db is reused if it was built
+    from exactly these vectors, or rebuilt and saved.
+    
+    Args:
+        index (VectorIndex): The loaded exact index to build from.
+        force (bool): Build even if the chart is small or ANN is disabled.
+        tenant_id (str): Whose chart this is (picks the file, see ann_index_path).
+    """
+    if not force and (not settings.ANN_ENABLED or len(index) < settings.ANN_MIN_ROWS):
+        return None
+
+    codes, vectors = index.snapshot()
+    if not codes:
+        return None  # Nothing to cluster: the exact scan handles it
+    fingerprint = matrix_fingerprint(codes, vectors)
+    
+    path = ann_index_path(tenant_id)
+    ann = IVFIndex.load(path, nprobe=settings.ANN_NPROBE)
+    if ann is None or ann.fingerprint != fingerprint:
+        ann = IVFIndex.build(
+            codes, vectors,
+            nlist=settings.ANN_NLIST,
+            nprobe=settings.ANN_NPROBE,
+            fingerprint=fingerprint,
+        )
+        ann.save(path)
+    return ann
+    
+def get_all_accounts(tenant_id: str = DEFAULT_TENANT) -> list[Account]: # Notice return type is Pydantic Account
+    """Fetch all of the tenant's accounts and convert them to Pydantic models."""
+    with ReadSessionLocal() as session:
         # 1. Get ORM objects from DB
-        orm_accounts = session.query(AccountModel).all()
+        orm_accounts = session.query(AccountModel).filter(AccountModel.tenant_id == tenant_id).all()
         
         #2. Convert each ORM object to Pydantic model/object
         pydantic_accounts = []
@@ -101,12 +574,12 @@ def get_all_accounts() -> list[Account]: # Notice return type is Pydantic Accoun
         return pydantic_accounts
     
 
-def get_account_by_code(code: str) -> Account | None:
-    """Fetch account by its unique code and convert to Pydantic model."""
+def get_account_by_code(code: str, tenant_id: str = DEFAULT_TENANT) -> Account | None:
+    """Fetch account by its code (unique within the tenant) and convert to Pydantic model."""
 
-    with SessionLocal() as session:
-        # 1. Query the ORM object by primary key (code)
-        orm_account = session.query(AccountModel).filter(AccountModel.code == code).first()
+    with ReadSessionLocal() as session:
+        # 1. Query the ORM object by primary key (tenant_id, code)
+        orm_account = session.get(AccountModel, (tenant_id, code))
         
         if orm_account is None:
             return None  # Not found
@@ -121,4 +594,61 @@ def get_account_by_code(code: str) -> Account | None:
             description=orm_account.description
         )
 
-    
\ No newline at end of file
+
+def get_accounts_by_codes(codes: list[str], tenant_id: str = DEFAULT_TENANT) -> dict[str, Account]:
+    """
+    Fetch many accounts with a single IN (...) query.
+    
+    Returns:
+        dict[str, Account]: Found accounts keyed by code (unknown codes are left out).
+    """
+    if not codes:
+        return {}
+
+    with ReadSessionLocal() as session:
+        rows = (
+            session.query(AccountModel)
+            .filter(AccountModel.tenant_id == tenant_id, AccountModel.code.in_(set(codes)))
+            .all()
+        )
+        return {
+            row.code: Account(
+                code=row.code,
+                account_name=row.account_name,
+                financial_stat=row.financial_stat,
+                group_name=row.group_name,
+                normally=row.normally,
+                description=row.description,
+            )
+            for row in rows
+        }
+
+
+def get_account_catalog(tenant_id: str = DEFAULT_TENANT) -> AccountCatalog:
+    """Return the tenant's in-memory account catalog, loading it from the database on first use."""
+    entry = tenant_indexes.get(tenant_id)
+    if not entry.catalog.is_loaded:
+        with entry.load_lock:
+            if not entry.catalog.is_loaded:
+                with ReadSessionLocal() as session:
+                    columns = [getattr(AccountModel, field) for field in CatalogEntry.FIELDS]
+                    entry.catalog.load(
+                        session.execute(select(*columns).where(AccountModel.tenant_id == tenant_id)).all()
+                    )
+                tenant_indexes.loaded(tenant_id)
+    return entry.catalog
+
+
+def get_lexical_index(tenant_id: str = DEFAULT_TENANT) -> LexicalIndex:
+    """
+    Return the tenant's keyword (BM25) index over get_account_text() of every
+    account, building it from the catalog on first use.
+    """
+    entry = tenant_indexes.get(tenant_id)
+    if not entry.lexical.is_loaded:
+        catalog = get_account_catalog(tenant_id)
+        with entry.load_lock:
+            if not entry.lexical.is_loaded:
+                entry.lexical.load((e.code, get_account_text(e)) for e in catalog.entries())
+                tenant_indexes.loaded(tenant_id)
+    return entry.lexical
@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Any, BinaryIO, Optional
+
+from config import settings
+
+
+def sha256_hex(data: bytes | str) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+# Read size when hashing a file object (never more than this in memory at once)
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def parse_key(document: bytes | BinaryIO) -> str:
+    """
+    ade_parse results depend only on the document bytes.
+
+    A file object is hashed chunk by chunk from its current position, then put
+    back where it was - so it can still be uploaded afterwards.
+    """
+    if isinstance(document, bytes):
+        return sha256_hex(document)
+    start = document.tell()
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: document.read(HASH_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    document.seek(start)
+    return digest.hexdigest()
+
+
+def extract_key(markdown_text: str, schema: dict, model: str) -> str:
+    """ade_extract results depend on the markdown, the schema and the extract model."""
+    schema_hash = sha256_hex(json.dumps(schema, sort_keys=True, separators=(",", ":")))
+    return sha256_hex(f"{sha256_hex(markdown_text)}:{schema_hash}:{model}")
+
+
+class DocumentCache:
+    """
+    A content-addressed, on-disk cache for Landing AI results.
+
+    Every entry is one JSON file at <root>/<namespace>/<key[:2]>/<key>.json, where key
+    is a sha256 (see parse_key / extract_key). Because keys are content hashes,
+    entries never go stale - they only get evicted.
+
+    Eviction is by total size: when the cache grows past max_bytes, the least
+    recently used files (oldest mtime - hits touch the file) are deleted.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None  # computed lazily on first write
+
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, namespace: str, key: str) -> str:
+        return os.path.join(self.root, namespace, key[:2], f"{key}.json")
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """Return the cached value, or None on a miss."""
+        path = self._path(namespace, key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path)  # mark as recently used
+        except (FileNotFoundError, json.JSONDecodeError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def put(self, namespace: str, key: str, value: Any):
+        """Store a JSON-serializable value, then evict if over budget."""
+        path = self._path(namespace, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temp file and rename, so readers never see half a file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(value, f)
+        old_size = os.path.getsize(path) if os.path.exists(path) else 0
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_size()
+            else:
+                self._total_bytes += os.path.getsize(path) - old_size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+    # ===== HELPERS =====
+
+    def _entries(self) -> list[tuple[float, int, str]]:
+        """(mtime, size, path) for every entry on disk."""
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """Delete least recently used files until we are at 90% of the budget. Caller holds the lock."""
+        target = int(self.max_bytes * 0.9)
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        self._total_bytes = total
+
+
+_document_cache: Optional[DocumentCache] = None
+
+
+def get_document_cache() -> Optional[DocumentCache]:
+    """The shared cache configured in Settings, or None when caching is disabled."""
+    global _document_cache
+    if not settings.DOCUMENT_CACHE_ENABLED:
+        return None
+    if _document_cache is None:
+        _document_cache = DocumentCache(
+            root=settings.DOCUMENT_CACHE_DIR,
+            max_bytes=settings.DOCUMENT_CACHE_MAX_MB * 1024 * 1024,
+        )
+    return _document_cache
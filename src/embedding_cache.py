@@ -0,0 +1,291 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import bindparam, delete, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+import database
+from config import settings
+from orm_models import QueryEmbeddingCacheEntry
+from vector_index import encode_embedding, decode_embedding
+
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace and case so trivially different memos share one entry."""
+    return " ".join(text.split()).casefold()
+
+
+def make_key(model: str, text: str) -> str:
+    """The cache key: sha256 over the model name and the normalized text."""
+    return hashlib.sha256(f"{model}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    A two-tier cache for query embeddings.
+
+    Tier 1 is an in-process LRU (an OrderedDict of float32 arrays).
+    Tier 2 is the query_embedding_cache table in SQLite, so entries survive restarts
+    and are shared between worker processes.
+
+    Entries are keyed by (model, normalized text). The SQLite tier is trimmed by
+    age (max_age_days) and by size (max_entries, least recently used go first).
+
+    Lookups only read (through the read pool), so a query never waits for the
+    single writer connection. New entries and last-used times are collected in
+    memory and written in one transaction by a background thread: after every
+    put, every TOUCH_FLUSH_EVERY lookups, and on flush() (e.g. at shutdown).
+    """
+
+    # Run the (cheap, but not free) SQLite eviction every N inserts
+    EVICT_EVERY = 256
+    # Write the collected last-used times after this many lookups
+    TOUCH_FLUSH_EVERY = 256
+
+    def __init__(
+        self,
+        memory_entries: int = 2048,
+        max_entries: int = 100_000,
+        max_age_days: float = 90,
+    ):
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_days * 24 * 3600
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._puts_since_evict = 0
+        self._ready_binds: set[int] = set()
+
+        # Waiting for the background flush
+        self._pending_rows: dict[str, dict] = {}      # key -> new row
+        self._pending_touches: dict[str, float] = {}  # key -> last_used_at
+        self._flush_lock = threading.Lock()           # one flush at a time
+        self._flushing = False
+
+        # Counters
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    # ===== PUBLIC API =====
+
+    def get(self, model: str, text: str) -> Optional[list[float]]:
+        """Return the cached vector for (model, text), or None on a miss."""
+        key = make_key(model, text)
+
+        # 1. In-process LRU
+        with self._lock:
+            vector = self._memory.get(key)
+            flush_due = False
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                flush_due = self._touch(key)
+        if vector is not None:
+            if flush_due:
+                self._flush_in_background()
+            return vector.tolist()
+
+        # 2. SQLite
+        vector = self._disk_get(key)
+        if vector is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.disk_hits += 1
+            self._remember(key, vector)
+            flush_due = self._touch(key)
+        if flush_due:
+            self._flush_in_background()
+        return vector.tolist()
+
+    def put(self, model: str, text: str, embedding: list[float]):
+        """Store a freshly computed vector: in memory now, in SQLite from the background flush."""
+        key = make_key(model, text)
+        vector = np.asarray(embedding, dtype=np.float32)
+        now = time.time()
+
+        with self._lock:
+            self._remember(key, vector)
+            self._pending_rows[key] = {
+                "key": key, "model": model, "embedding": encode_embedding(vector),
+                "dim": vector.shape[0], "created_at": now, "last_used_at": now,
+            }
+            self._pending_touches.pop(key, None)
+        self._flush_in_background()
+
+    def flush(self) -> int:
+        """
+        Write the queued entries and last-used times in one transaction (and run
+        the eviction every EVICT_EVERY new entries). Blocking.
+
+        Returns:
+            int: The number of rows written or touched.
+        """
+        with self._flush_lock:
+            with self._lock:
+                rows, self._pending_rows = list(self._pending_rows.values()), {}
+                touches, self._pending_touches = self._pending_touches, {}
+                self._puts_since_evict += len(rows)
+                run_eviction = self._puts_since_evict >= self.EVICT_EVERY
+                if run_eviction:
+                    self._puts_since_evict = 0
+            if not rows and not touches:
+                return 0
+
+            table = QueryEmbeddingCacheEntry
+            with database.SessionLocal() as session:
+                self._ensure_table(session)
+                if rows:
+                    upsert = sqlite_insert(table)
+                    session.execute(upsert.on_conflict_do_update(
+                        index_elements=[table.key],
+                        set_={name: upsert.excluded[name] for name in ("model", "embedding", "dim", "created_at", "last_used_at")},
+                    ), rows)
+                if touches:
+                    session.connection().execute(
+                        update(table.__table__)
+                        .where(table.__table__.c.key == bindparam("k"))
+                        .values(last_used_at=bindparam("t")),
+                        [{"k": key, "t": used} for key, used in touches.items()],
+                    )
+                session.commit()
+
+        if run_eviction:
+            self.evict()
+        return len(rows) + len(touches)
+
+    def evict(self) -> int:
+        """
+        Trim the SQLite tier: drop rows older than max_age_days, then the least
+        recently used rows beyond max_entries.
+
+        Returns:
+            int: The number of rows deleted.
+        """
+        table = QueryEmbeddingCacheEntry
+        with database.SessionLocal() as session:
+            self._ensure_table(session)
+
+            # 1. Age
+            cutoff = time.time() - self.max_age_seconds
+            deleted = session.execute(delete(table).where(table.created_at < cutoff)).rowcount
+
+            # 2. Size - find the last_used_at of the newest row we must drop
+            boundary = session.execute(
+                select(table.last_used_at)
+                .order_by(table.last_used_at.desc())
+                .offset(self.max_entries)
+                .limit(1)
+            ).scalar()
+            if boundary is not None:
+                deleted += session.execute(delete(table).where(table.last_used_at <= boundary)).rowcount
+
+            session.commit()
+        return deleted
+
+    def clear_memory(self):
+        """Empty the in-process tier (the SQLite tier is kept, queued entries are written first)."""
+        self.flush()
+        with self._lock:
+            self._memory.clear()
+
+    def reset_stats(self):
+        with self._lock:
+            self.memory_hits = self.disk_hits = self.misses = 0
+
+    def stats(self) -> dict:
+        """Hit/miss counters, e.g. for a health or metrics endpoint."""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+            }
+
+    # ===== HELPERS =====
+
+    def _remember(self, key: str, vector: np.ndarray):
+        """Insert into the LRU and drop the oldest entry if full. Caller holds the lock."""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _touch(self, key: str) -> bool:
+        """Note a lookup hit for the LRU eviction. Caller holds the lock. True when a flush is due."""
+        if key in self._pending_rows:
+            self._pending_rows[key]["last_used_at"] = time.time()
+            return False
+        self._pending_touches[key] = time.time()
+        return len(self._pending_touches) >= self.TOUCH_FLUSH_EVERY
+
+    def _flush_in_background(self):
+        """
+        Run flush() on a daemon thread unless one is already running.
+
+        A put that arrives while a flush is running only queues its row, so the running
+        thread flushes again until nothing is due (the check and the reset of _flushing
+        share the lock, so a later put either is seen here or starts its own thread).
+        """
+        with self._lock:
+            if self._flushing:
+                return
+            self._flushing = True
+
+        def run():
+            while True:
+                try:
+                    self.flush()
+                except Exception:
+                    logger.exception("Writing the embedding cache failed")
+                    with self._lock:
+                        self._flushing = False
+                    return
+                with self._lock:
+                    if not self._pending_rows and len(self._pending_touches) < self.TOUCH_FLUSH_EVERY:
+                        self._flushing = False
+                        return
+
+        threading.Thread(target=run, name="embedding-cache-flush", daemon=True).start()
+
+    def _disk_get(self, key: str) -> Optional[np.ndarray]:
+        # Read pool only: a lookup never waits for (or takes) the writer connection
+        with database.ReadSessionLocal() as session:
+            self._ensure_table(session)
+            row = session.get(QueryEmbeddingCacheEntry, key)
+            if row is None:
+                return None
+            if row.created_at < time.time() - self.max_age_seconds:
+                return None  # expired; evict() will delete it
+            return decode_embedding(row.embedding, row.dim)
+
+    def _ensure_table(self, session):
+        """Create the cache table on first use, so callers don't depend on init_db()."""
+        bind = session.get_bind()
+        if id(bind) not in self._ready_binds:
+            QueryEmbeddingCacheEntry.__table__.create(bind=bind, checkfirst=True)
+            self._ready_binds.add(id(bind))
+
+
+# One shared cache per process
+embedding_cache = EmbeddingCache(
+    memory_entries=settings.EMBEDDING_CACHE_MEMORY_ENTRIES,
+    max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES,
+    max_age_days=settings.EMBEDDING_CACHE_MAX_AGE_DAYS,
+)
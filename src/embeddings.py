@@ -0,0 +1,169 @@
+import re
+import threading
+import zlib
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+import numpy as np
+
+from config import settings
+from metrics import record_upstream_status
+from upstream import SingleFlight, get_upstream
+
+
+class EmbeddingProvider(ABC):
+    """
+    Turns texts into vectors. query.embed_text / embed_texts and the account
+    backfill only talk to this interface; which backend is used is chosen by
+    settings.EMBEDDING_PROVIDER (see get_embedding_provider()).
+
+    Attributes:
+        model (str): Name recorded with every stored vector. Changing it makes the
+            backfill re-embed the chart and keeps query-cache entries apart.
+        cacheable (bool): Whether results are worth putting in embedding_cache
+            (true for slow/paid backends, false for local ones that are faster than a cache lookup).
+    """
+
+    model: str = ""
+    cacheable: bool = True
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> List[list[float]]:
+        """Return one vector per text, in order."""
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """
+    OpenAI embeddings API. The client is only created on the first call.
+
+    Requests go through the shared upstream scheduler (rate limits, retries, circuit
+    breaker - see upstream.py), and identical requests already in flight from other
+    threads are joined instead of sent again.
+    """
+
+    cacheable = True
+
+    def __init__(self, model: str, api_key: Optional[str] = None):
+        self.model = model
+        self.api_key = api_key
+        self._client = None
+        self._lock = threading.Lock()
+        self._in_flight = SingleFlight()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from openai import OpenAI
+                    settings.export_env()  # e.g. OPENAI_BASE_URL / OPENAI_ORG_ID from .env
+                    self._client = OpenAI(api_key=self.api_key, max_retries=0)  # upstream.py retries
+        return self._client
+
+    def embed(self, texts: List[str]) -> List[list[float]]:
+        return self._in_flight.do(tuple(texts), lambda: self._embed(texts))
+
+    def _embed(self, texts: List[str]) -> List[list[float]]:
+        client = self.client
+        import openai  # already loaded by the client
+
+        def create():
+            try:
+                response = client.embeddings.create(
+                    model = self.model,
+                    input = texts
+                )
+            except Exception as exc:
+                # openai.APIStatusError carries the HTTP status; connection errors have none
+                record_upstream_status("openai", "embeddings", getattr(exc, "status_code", None))
+                raise
+            record_upstream_status("openai", "embeddings", 200)
+            return response
+
+        # Rough token count (~4 characters per token) for the tokens-per-minute bucket
+        tokens = sum(len(text) for text in texts) / 4 + len(texts)
+        response = get_upstream("openai", self.model).call(create, tokens=tokens, retry_on=(openai.APIConnectionError,))
+        # One item per input, tagged with its position
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    A local, offline embedder (the "hashing trick").
+
+    Every word and every character trigram of every word is hashed (crc32) into one
+    of `dim` buckets, with a +/- sign taken from another bit of the hash, and the
+    result is L2-normalized. Texts sharing words or word pieces get similar vectors,
+    which is enough for tests, load tests and benchmarks to exercise the real search
+    and graph code without a network round trip.
+    """
+
+    cacheable = False
+    TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+    def __init__(self, dim: int = 1536):
+        self.dim = dim
+        self.model = f"local-hashing-{dim}"
+
+    def _features(self, text: str) -> List[tuple[str, float]]:
+        features = []
+        for token in self.TOKEN_RE.findall(text.lower()):
+            features.append((f"w:{token}", 1.0))
+            padded = f"<{token}>"
+            for i in range(len(padded) - 2):
+                features.append((f"c:{padded[i:i + 3]}", 0.5))
+        return features
+
+    def embed_one(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        features = self._features(text)
+        if not features:
+            return vector
+
+        hashes = np.fromiter((zlib.crc32(f.encode("utf-8")) for f, _ in features), dtype=np.uint64, count=len(features))
+        weights = np.fromiter((w for _, w in features), dtype=np.float32, count=len(features))
+        signs = np.where((hashes >> np.uint64(31)) & np.uint64(1), -1.0, 1.0).astype(np.float32)
+        np.add.at(vector, (hashes % np.uint64(self.dim)).astype(np.intp), signs * weights)
+
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed(self, texts: List[str]) -> List[list[float]]:
+        return [self.embed_one(text).tolist() for text in texts]
+
+
+# ===== PROVIDER SELECTION =====
+
+_provider: Optional[EmbeddingProvider] = None
+_provider_lock = threading.Lock()
+
+
+def create_embedding_provider(name: Optional[str] = None) -> EmbeddingProvider:
+    """Build the provider named in settings.EMBEDDING_PROVIDER ('openai' or 'local')."""
+    name = (name or settings.EMBEDDING_PROVIDER).lower()
+    if name == "openai":
+        return OpenAIEmbeddingProvider(model=settings.EMBEDDING_MODEL, api_key=settings.OPENAI_API_KEY)
+    if name == "local":
+        return HashingEmbeddingProvider(dim=settings.LOCAL_EMBEDDING_DIM)
+    raise ValueError(f"Unknown EMBEDDING_PROVIDER: {name!r} (expected 'openai' or 'local')")
+
+
+def get_embedding_provider() -> EmbeddingProvider:
+    """Return the process-wide provider, creating it on first use."""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = create_embedding_provider()
+    return _provider
+
+
+def set_embedding_provider(provider: Optional[EmbeddingProvider]) -> Optional[EmbeddingProvider]:
+    """
+    Swap the process-wide provider (e.g. in tests or benchmarks).
+    Pass None to go back to the configured one. Returns the previous provider.
+    """
+    global _provider
+    with _provider_lock:
+        previous, _provider = _provider, provider
+    return previous
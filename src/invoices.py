@@ -1,6 +1,13 @@
-from typing import List
-from models import InvoiceLine, Invoice
-from query import suggest_accounts, grade_confidence
+from typing import List, Dict
+import numpy as np
+from models import (
+    InvoiceLine, Invoice, AccountSuggestion, LineClassification,
+    AccountAllocation, InvoiceClassification,
+)
+from query import suggest_accounts, grade_confidence, embed_texts
+from database import get_account_index, get_account_catalog
+from config import settings
+from tenants import DEFAULT_TENANT
 
 def invoice_to_description(invoice: Invoice) -> str:
     """ Turn a structured Invoice into a single text description 
@@ -19,6 +26,90 @@ def invoice_to_description(invoice: Invoice) -> str:
     )
     return description
 
+def invoice_header_text(invoice: Invoice) -> str:
+    """The invoice context without the lines (vendor, date, total)."""
+    return (
+        f"Invoice from {invoice.vendor} on {invoice.invoice_date}. "
+        f"Total: {invoice.total_amount} {invoice.currency}."
+    )
+
+
+def classify_invoice_lines(
+    invoice: Invoice,
+    k: int = 5,
+    header_weight: float | None = None,
+    tenant_id: str = DEFAULT_TENANT,
+) -> InvoiceClassification:
+    """
+    Suggest accounts for every invoice line separately, instead of one blurred
+    suggestion for the whole invoice.
+
+    1. Embed every line description plus the header in ONE batched request.
+    2. Mix a little of the header vector into each line vector (vendor context).
+    3. Score all lines against all of the tenant's accounts in ONE matrix-matrix product.
+    4. Roll the per-line results up into amount-weighted account allocations.
+    """
+    header_weight = settings.LINE_HEADER_WEIGHT if header_weight is None else header_weight
+    lines = invoice.lines
+    if not lines:
+        return InvoiceClassification(lines=[], allocations=[])
+
+    # 1. One embeddings call: [line_0, ..., line_n-1, header]
+    vectors = np.asarray(
+        embed_texts([line.description for line in lines] + [invoice_header_text(invoice)]),
+        dtype=np.float32,
+    )
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    vectors = vectors / norms
+    line_vectors, header_vector = vectors[:-1], vectors[-1]
+
+    # 2. Blend in the header
+    queries = line_vectors + header_weight * header_vector
+
+    # 3. One matrix-matrix product for every line
+    per_line_hits = get_account_index(tenant_id).top_k_batch(queries, k)
+    catalog = get_account_catalog(tenant_id)
+
+    # 4. Build the per-line answers and the amount-weighted roll-up
+    total_amount = sum(abs(line.amount) for line in lines)
+    allocations: Dict[str, AccountAllocation] = {}
+    line_results: List[LineClassification] = []
+
+    for line, hits in zip(lines, per_line_hits):
+        suggestions: List[AccountSuggestion] = []
+        top_score = hits[0][1] if hits else 0.0
+        for entry, (_, score) in zip(catalog.get_many(code for code, _ in hits), hits):
+            if entry is None:
+                continue
+            suggestions.append(AccountSuggestion(
+                code=entry.code,
+                account_name=entry.account_name,
+                score=score,
+                normalized_similarity=score / top_score if top_score else 0.0,
+                similarity=score,
+            ))
+
+        line_results.append(LineClassification(
+            description=line.description,
+            amount=line.amount,
+            suggestions=suggestions,
+            confidence=grade_confidence(suggestions) if suggestions else None,
+        ))
+
+        share = abs(line.amount) / total_amount if total_amount else 1.0 / len(lines)
+        for rank, s in enumerate(suggestions):
+            alloc = allocations.setdefault(
+                s.code, AccountAllocation(code=s.code, account_name=s.account_name, amount=0.0, weighted_score=0.0)
+            )
+            alloc.weighted_score += share * s.score
+            if rank == 0:
+                alloc.amount += line.amount
+
+    ranked = sorted(allocations.values(), key=lambda a: (abs(a.amount), a.weighted_score), reverse=True)
+    return InvoiceClassification(lines=line_results, allocations=ranked)
+
+
 def needs_manual_review(invoice: Invoice, confidence: str) -> bool:
 
     if invoice.total_amount > 1000:
@@ -0,0 +1,277 @@
+"""
+Job workers: take invoices off the jobs table (see jobs.py) and run them through
+parse -> extract -> graph, like /classify-invoices does for one document.
+
+Run them next to the API (which only queues jobs):
+
+    python src/job_worker.py --workers 4
+
+For a single-process setup the API can start JOB_WORKERS of them itself instead.
+That is off by default: each API process (every uvicorn --workers process) would
+start its own pool.
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from typing import List, Optional
+
+import httpx
+
+from client_landingai import AsyncLandingAIClient, create_http_client
+from config import settings
+from document_cache import get_document_cache
+from jobs import Job, claim_job, finish_job, renew_lease, requeue_job
+from pipeline import StageLimits, UploadedDocument, process_document
+from upstream import retry_later_delay
+
+
+logger = logging.getLogger(__name__)
+
+
+class RetryLater(Exception):
+    """The job failed on an upstream outage (circuit open, 5xx after retries): requeue it."""
+
+    def __init__(self, error: str, retry_after: float = 0.0):
+        super().__init__(error)
+        self.error = error
+        self.retry_after = retry_after
+
+
+class JobWorker:
+    """
+    Runs jobs in one process: `concurrency` loops, each claiming one job at a time.
+
+    While a job is processed its lease is renewed every third of the visibility
+    timeout. If the process dies the renewals stop, the lease runs out and another
+    worker picks the job up again (at most JOB_MAX_ATTEMPTS times).
+
+    A job that fails because Landing AI or OpenAI is down is not failed: it goes back
+    on the queue for JOB_RETRY_DELAY seconds (doubling each time, at least what the
+    service asked for), up to JOB_MAX_REQUEUES times.
+    """
+
+    def __init__(
+        self,
+        worker_id: str,
+        client: AsyncLandingAIClient,
+        limits: Optional[StageLimits] = None,
+        concurrency: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+        visibility_timeout: Optional[float] = None,
+    ):
+        self.worker_id = worker_id
+        self.client = client
+        self.limits = limits or StageLimits.from_settings()
+        self.concurrency = concurrency or settings.JOB_WORKER_CONCURRENCY
+        self.poll_interval = poll_interval or settings.JOB_POLL_INTERVAL
+        self.visibility_timeout = visibility_timeout or settings.JOB_VISIBILITY_TIMEOUT
+        self.processed = 0
+
+    async def run(self, should_stop):
+        """Work until should_stop() is true; jobs already started are finished first."""
+        async def loop():
+            while not should_stop():
+                if not await self.run_once():
+                    await asyncio.sleep(self.poll_interval)
+
+        await asyncio.gather(*(loop() for _ in range(self.concurrency)))
+
+    async def run_once(self) -> bool:
+        """Claim and process one job. False when there was nothing to do."""
+        job = await asyncio.to_thread(claim_job, self.worker_id, self.visibility_timeout)
+        if job is None:
+            return False
+
+        heartbeat = asyncio.create_task(self._keep_lease(job))
+        retry = None
+        try:
+            result, error = await self.process(job)
+        except RetryLater as exc:
+            retry = exc
+        except Exception as exc:
+            delay = retry_later_delay(exc, retry_on=(httpx.TransportError,))
+            if delay is not None:
+                retry = RetryLater(f"{type(exc).__name__}: {exc}", delay)
+            else:  # a bug, not a bad document - record it instead of retrying forever
+                logger.exception("Job %s crashed", job.id)
+                result, error = None, f"{type(exc).__name__}: {exc}"
+        finally:
+            heartbeat.cancel()
+
+        if retry is not None and (job.requeues or 0) < settings.JOB_MAX_REQUEUES:
+            delay = max(retry.retry_after, settings.JOB_RETRY_DELAY * 2 ** (job.requeues or 0))
+            logger.warning("Job %s: %s - requeued for %.1fs", job.id, retry.error, delay)
+            finished = await asyncio.to_thread(requeue_job, job, self.worker_id, delay, retry.error)
+        else:
+            if retry is not None:
+                result, error = None, f"Gave up after {settings.JOB_MAX_REQUEUES} requeues: {retry.error}"
+            finished = await asyncio.to_thread(finish_job, job, self.worker_id, result, error)
+
+        if not finished:
+            logger.warning("Job %s: lease lost before it finished, result dropped", job.id)
+        self.processed += 1
+        return True
+
+    async def process(self, job: Job) -> tuple[Optional[dict], Optional[str]]:
+        """
+        Run one job through the pipeline. Returns (result, error).
+
+        Raises:
+            RetryLater: The pipeline failed on an upstream outage.
+        """
+        from agent_graph import get_graph
+        from classification_log import ClassificationRecord, write_classifications
+        from invoices import classify_invoice_lines
+
+        # The spooled upload is streamed to Landing AI from disk
+        document = UploadedDocument(filename=job.filename, path=job.document_path)
+        outcome = await process_document(
+            self.client, document, self.limits, get_graph(), job.use_cache, job.tenant_id,
+        )
+        if outcome.status == "error":
+            if outcome.retry_after is not None:
+                raise RetryLater(f"{outcome.failed_stage}: {outcome.error}", outcome.retry_after)
+            return outcome.model_dump(), f"{outcome.failed_stage}: {outcome.error}"
+
+        classification = None
+        if job.per_line:
+            classification = await asyncio.to_thread(classify_invoice_lines, outcome.invoice, tenant_id=job.tenant_id)
+
+        if settings.RESULTS_PERSIST_ENABLED:
+            record = ClassificationRecord(
+                id=job.id,
+                tenant_id=job.tenant_id,
+                filename=job.filename,
+                invoice=outcome.invoice,
+                description=outcome.description,
+                suggestions=outcome.suggestions or [],
+                confidence=outcome.confidence,
+                final_answer=outcome.final_answer,
+                line_classification=classification,
+            )
+            await asyncio.to_thread(write_classifications, [record])
+            outcome.classification_id = record.id
+
+        result = outcome.model_dump()
+        if classification is not None:
+            result["line_classification"] = classification.model_dump()
+        return result, None
+
+    async def _keep_lease(self, job: Job):
+        while True:
+            await asyncio.sleep(self.visibility_timeout / 3)
+            if not await asyncio.to_thread(renew_lease, job.id, self.worker_id, self.visibility_timeout):
+                logger.warning("Job %s: lease lost", job.id)
+                return
+
+
+# ===== PROCESSES =====
+
+async def _serve(worker_id: str, stop) -> None:
+    from embedding_cache import embedding_cache
+    from vendor_memo import vendor_memo
+
+    http = create_http_client()
+    client = AsyncLandingAIClient(
+        http=http,
+        api_key=settings.LANDING_AI_API_KEY,
+        base_url=settings.LANDING_AI_BASE_URL,
+        cache=get_document_cache(),
+    )
+    await asyncio.to_thread(vendor_memo.load)
+    try:
+        await JobWorker(worker_id, client).run(stop.is_set)
+    finally:
+        await http.aclose()
+        await asyncio.to_thread(vendor_memo.flush)
+        await asyncio.to_thread(embedding_cache.flush)
+
+
+def worker_process(worker_id: str, stop):
+    """Entry point of one worker process. `stop` is a multiprocessing.Event set by the pool."""
+    logging.basicConfig(level=logging.INFO)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C goes to the pool, which sets `stop`
+    asyncio.run(_serve(worker_id, stop))
+
+
+class WorkerPool:
+    """
+    `size` worker processes (spawned, so nothing is shared with the parent but the
+    database file). A monitor thread restarts any process that dies; the jobs it
+    held come back once their leases expire.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._context = multiprocessing.get_context("spawn")
+        self._stop = self._context.Event()
+        self._processes: List[Optional[multiprocessing.Process]] = [None] * size
+        self._monitor: Optional[threading.Thread] = None
+        self.restarts = 0
+
+    def start(self):
+        for slot in range(self.size):
+            self._spawn(slot)
+        self._monitor = threading.Thread(target=self._watch, name="job-worker-monitor", daemon=True)
+        self._monitor.start()
+
+    def stop(self, timeout: float = 30.0):
+        """Let every worker finish its current jobs, then stop. Blocking."""
+        self._stop.set()
+        deadline = time.monotonic() + timeout
+        for process in self._processes:
+            if process is None:
+                continue
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()  # its jobs are picked up again after the visibility timeout
+                process.join()
+
+    def alive(self) -> int:
+        return sum(1 for p in self._processes if p is not None and p.is_alive())
+
+    def _spawn(self, slot: int):
+        worker_id = f"{socket.gethostname()}:{os.getpid()}:{slot}:{self.restarts}"
+        process = self._context.Process(
+            target=worker_process, args=(worker_id, self._stop), name=f"job-worker-{slot}", daemon=True,
+        )
+        process.start()
+        self._processes[slot] = process
+
+    def _watch(self):
+        while not self._stop.wait(1.0):
+            for slot, process in enumerate(self._processes):
+                if process is not None and not process.is_alive() and not self._stop.is_set():
+                    logger.warning("Job worker %s exited with %s, restarting", process.name, process.exitcode)
+                    self.restarts += 1
+                    self._spawn(slot)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=settings.JOB_WORKERS or 2, help="worker processes")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from database import init_db
+    init_db()  # once, before the workers start - they don't migrate the database themselves
+    pool = WorkerPool(args.workers)
+    pool.start()
+    print(f"{args.workers} job workers running - Ctrl-C to stop")
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+    try:
+        stopped.wait()
+    except KeyboardInterrupt:
+        pass
+    pool.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+import asyncio
+import os
+import shutil
+import time
+import uuid
+from typing import BinaryIO, Optional
+
+from pydantic import BaseModel
+from sqlalchemy import and_, inspect, or_, select, text, update
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+import database
+from config import settings
+from orm_models import JobRecord
+from tenants import DEFAULT_TENANT
+
+
+# A job is 'queued' until a worker claims it, 'running' while the worker holds its lease,
+# then 'done' (result set) or 'failed' (error set). A job that failed on an upstream outage
+# goes back to 'queued', invisible until its lease_expires_at.
+FINISHED_STATUSES = {"done", "failed"}
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class Job(BaseModel):
+    """One row of the jobs table."""
+
+    id: str
+    tenant_id: str = DEFAULT_TENANT
+    filename: str
+    document_path: str
+    per_line: bool = False
+    use_cache: bool = True
+    status: str
+    attempts: int = 0
+    max_attempts: int
+    requeues: Optional[int] = 0
+    worker_id: Optional[str] = None
+    lease_expires_at: Optional[float] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[dict] = None
+    error: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def public(self) -> dict:
+        """What GET /jobs/{id} returns (no server paths or lease bookkeeping)."""
+        return self.model_dump(exclude={"document_path", "worker_id", "lease_expires_at"})
+
+
+def _to_job(row: JobRecord) -> Job:
+    return Job(**{column.key: getattr(row, column.key) for column in JobRecord.__table__.columns})
+
+
+# ===== CLIENT SIDE (the API) =====
+
+def create_job(
+    document: BinaryIO,
+    filename: str,
+    tenant_id: str = DEFAULT_TENANT,
+    per_line: bool = False,
+    use_cache: bool = True,
+) -> Job:
+    """
+    Copy the upload to JOBS_DIR (in chunks) and queue a job for it. Blocking - call
+    it via asyncio.to_thread from the API.
+    """
+    job_id = uuid.uuid4().hex
+    os.makedirs(settings.JOBS_DIR, exist_ok=True)
+    path = os.path.join(settings.JOBS_DIR, f"{job_id}.upload")
+    with open(path, "wb") as out:
+        shutil.copyfileobj(document, out, COPY_CHUNK_SIZE)
+
+    record = JobRecord(
+        id=job_id, tenant_id=tenant_id, filename=filename, document_path=path,
+        per_line=per_line, use_cache=use_cache, status="queued", attempts=0,
+        max_attempts=settings.JOB_MAX_ATTEMPTS, created_at=time.time(),
+    )
+    try:
+        with database.SessionLocal() as session:
+            _ensure_table(session)
+            session.add(record)
+            session.commit()
+            return _to_job(record)
+    except Exception:
+        _remove_document(path)
+        raise
+
+
+def get_job(job_id: str) -> Optional[Job]:
+    with database.ReadSessionLocal() as session:
+        _ensure_table(session)
+        row = session.get(JobRecord, job_id)
+        return _to_job(row) if row is not None else None
+
+
+async def wait_for_job(job_id: str, timeout: float, interval: Optional[float] = None) -> Optional[Job]:
+    """
+    Long-poll: return the job as soon as it is finished, or as it is when `timeout`
+    runs out. The workers are other processes, so this re-reads the row every
+    `interval` seconds (JOB_POLL_INTERVAL) - a cheap primary-key lookup on the read pool.
+    """
+    interval = interval or settings.JOB_POLL_INTERVAL
+    deadline = time.monotonic() + timeout
+    while True:
+        job = await asyncio.to_thread(get_job, job_id)
+        remaining = deadline - time.monotonic()
+        if job is None or job.finished or remaining <= 0:
+            return job
+        await asyncio.sleep(min(interval, remaining))
+
+
+# ===== WORKER SIDE =====
+
+def claim_job(worker_id: str, visibility_timeout: Optional[float] = None) -> Optional[Job]:
+    """
+    Take the oldest available job: queued (past its retry delay, if it was requeued),
+    or running with an expired lease (its worker crashed or hung). The job becomes
+    invisible to other workers for `visibility_timeout` seconds; renew_lease()
+    extends that while it is worked on.
+
+    Jobs whose lease expired max_attempts times are marked failed instead of being
+    handed out again.
+
+    One UPDATE ... RETURNING picks and takes the job, so two workers (in any process)
+    can never claim the same one.
+    """
+    visibility_timeout = visibility_timeout or settings.JOB_VISIBILITY_TIMEOUT
+    now = time.time()
+    expired = and_(JobRecord.status == "running", JobRecord.lease_expires_at < now)
+    visible = or_(JobRecord.lease_expires_at.is_(None), JobRecord.lease_expires_at <= now)
+
+    with database.SessionLocal() as session:
+        _ensure_table(session)
+        # 1. Give up on jobs that keep taking their workers down
+        abandoned = session.execute(
+            update(JobRecord)
+            .where(expired, JobRecord.attempts >= JobRecord.max_attempts)
+            .values(
+                status="failed", finished_at=now, worker_id=None, lease_expires_at=None,
+                error="Abandoned: its worker stopped renewing the lease on every attempt",
+            )
+            .returning(JobRecord.document_path)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+
+        # 2. Claim the oldest visible job
+        candidate = (
+            select(JobRecord.id)
+            .where(or_(and_(JobRecord.status == "queued", visible), expired))
+            .order_by(JobRecord.created_at)
+            .limit(1)
+            .scalar_subquery()
+        )
+        row = session.execute(
+            update(JobRecord)
+            .where(JobRecord.id == candidate)
+            .values(
+                status="running", worker_id=worker_id, attempts=JobRecord.attempts + 1,
+                lease_expires_at=now + visibility_timeout, started_at=now,
+            )
+            .returning(JobRecord)
+            .execution_options(synchronize_session=False)
+        ).scalar_one_or_none()
+        job = _to_job(row) if row is not None else None
+        session.commit()
+
+    for path in abandoned:
+        _remove_document(path)
+    return job
+
+
+def renew_lease(job_id: str, worker_id: str, visibility_timeout: Optional[float] = None) -> bool:
+    """Heartbeat: push the lease out again. False if the job is no longer ours."""
+    visibility_timeout = visibility_timeout or settings.JOB_VISIBILITY_TIMEOUT
+    with database.SessionLocal() as session:
+        result = session.execute(
+            update(JobRecord)
+            .where(JobRecord.id == job_id, JobRecord.worker_id == worker_id, JobRecord.status == "running")
+            .values(lease_expires_at=time.time() + visibility_timeout)
+            .execution_options(synchronize_session=False)
+        )
+        session.commit()
+        return result.rowcount == 1
+
+
+def finish_job(
+    job: Job,
+    worker_id: str,
+    result: Optional[dict] = None,
+    error: Optional[str] = None,
+) -> bool:
+    """
+    Store the outcome ('failed' when error is set, 'done' otherwise) and delete the
+    spooled upload. Returns False - and changes nothing - when the lease was lost
+    and another worker owns the job now.
+    """
+    with database.SessionLocal() as session:
+        updated = session.execute(
+            update(JobRecord)
+            .where(JobRecord.id == job.id, JobRecord.worker_id == worker_id, JobRecord.status == "running")
+            .values(
+                status="failed" if error else "done", result=result, error=error,
+                finished_at=time.time(), lease_expires_at=None,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        session.commit()
+    if updated.rowcount != 1:
+        return False
+    _remove_document(job.document_path)
+    return True
+
+
+def requeue_job(job: Job, worker_id: str, delay: float, error: str) -> bool:
+    """
+    Hand a job that failed on an upstream outage back to the queue, to be claimed
+    again after `delay` seconds. The spooled upload is kept, the claim doesn't count
+    against max_attempts (those are for workers that die), and `error` shows why it
+    is waiting. Returns False - and changes nothing - when the lease was lost.
+    """
+    with database.SessionLocal() as session:
+        updated = session.execute(
+            update(JobRecord)
+            .where(JobRecord.id == job.id, JobRecord.worker_id == worker_id, JobRecord.status == "running")
+            .values(
+                status="queued", worker_id=None, error=error,
+                attempts=JobRecord.attempts - 1, requeues=(job.requeues or 0) + 1,
+                lease_expires_at=time.time() + delay,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        session.commit()
+    return updated.rowcount == 1
+
+
+def _remove_document(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+_ready_binds: set[int] = set()
+
+
+def _ensure_table(session):
+    """
+    Create the jobs table on first use, so callers don't depend on init_db(), and
+    add columns newer than an existing table (e.g. requeues).
+    IF NOT EXISTS: several worker processes may get here at the same moment.
+    """
+    bind = session.get_bind()
+    if id(bind) not in _ready_binds:
+        table = JobRecord.__table__
+        with bind.begin() as connection:
+            connection.execute(CreateTable(table, if_not_exists=True))
+            for index in table.indexes:
+                connection.execute(CreateIndex(index, if_not_exists=True))
+            existing = {col["name"] for col in inspect(connection).get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    col_type = column.type.compile(dialect=bind.dialect)
+                    connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}"))
+        _ready_binds.add(id(bind))
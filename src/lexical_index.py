@@ -0,0 +1,235 @@
+import heapq
+import math
+import re
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lower-case word tokens for the lexical index.
+
+    Punctuation splits words ("GST/HST" -> gst, hst; "e-Transfer" -> e, transfer),
+    single letters are dropped, and a plain plural 's' is stripped so "transfers"
+    matches "transfer".
+    """
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        if len(token) < 2:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class LexicalIndex:
+    """
+    A BM25 inverted index over account texts (see models.get_account_text).
+
+    term -> {row: term frequency}, where each account code owns one row. A query
+    only touches the postings of its own terms; each term's postings are kept as
+    numpy arrays (built on first use, rebuilt after a write touches the term), so
+    scoring is a few vector operations per term - no embedding call, no scan of
+    the chart.
+
+    Terms found in more than max_df_ratio of the chart ("expense", "debit",
+    "income statement" ...) carry no signal and are ignored at query time.
+
+    Like VectorIndex, it is filled once (`load`) and then patched through `upsert`.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, max_df_ratio: float = 0.5):
+        self.k1 = k1
+        self.b = b
+        self.max_df_ratio = max_df_ratio
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._compiled: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}  # term -> (rows, tf) arrays
+        self._codes: List[str] = []                 # row -> code
+        self._row_by_code: Dict[str, int] = {}
+        self._lengths: List[int] = []               # row -> number of tokens
+        self._lengths_array: Optional[np.ndarray] = None
+        self._doc_terms: Dict[int, Tuple[str, ...]] = {}  # row -> its distinct terms (for removal)
+        self._total_len = 0
+        self._n_postings = 0
+        self.is_loaded = False
+
+    # ===== WRITE PATH =====
+
+    def load(self, rows: Iterable[Tuple[str, str]]):
+        """
+        Replace the index contents.
+
+        Args:
+            rows: (code, account_text) pairs.
+        """
+        with self._lock:
+            self._reset()
+            for code, text in rows:
+                self._add(code, text)
+            self.is_loaded = True
+
+    def upsert(self, code: str, text: str):
+        """Add or replace one account. No-op until the index has been loaded."""
+        with self._lock:
+            if not self.is_loaded:
+                return
+            self._remove(code)
+            self._add(code, text)
+
+    def invalidate(self):
+        """Drop everything; the next search reloads."""
+        with self._lock:
+            self._reset()
+
+    def _add(self, code: str, text: str):
+        row = self._row_by_code.get(code)
+        if row is None:
+            row = len(self._codes)
+            self._row_by_code[code] = row
+            self._codes.append(code)
+            self._lengths.append(0)
+
+        counts: Dict[str, int] = {}
+        tokens = tokenize(text)
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for term, tf in counts.items():
+            self._postings.setdefault(term, {})[row] = tf
+            self._compiled.pop(term, None)
+
+        self._lengths[row] = len(tokens)
+        self._lengths_array = None
+        self._doc_terms[row] = tuple(counts)
+        self._total_len += len(tokens)
+        self._n_postings += len(counts)
+
+    def _remove(self, code: str):
+        row = self._row_by_code.get(code)
+        terms = self._doc_terms.pop(row, None) if row is not None else None
+        if terms is None:
+            return
+        for term in terms:
+            posting = self._postings[term]
+            del posting[row]
+            if not posting:
+                del self._postings[term]
+            self._compiled.pop(term, None)
+        self._total_len -= self._lengths[row]
+        self._n_postings -= len(terms)
+
+    def _term_arrays(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        compiled = self._compiled.get(term)
+        if compiled is None:
+            posting = self._postings.get(term)
+            if not posting:
+                return None
+            compiled = (
+                np.fromiter(posting.keys(), dtype=np.int64, count=len(posting)),
+                np.fromiter(posting.values(), dtype=np.float32, count=len(posting)),
+            )
+            self._compiled[term] = compiled
+        return compiled
+
+    # ===== READ PATH =====
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    @property
+    def nbytes(self) -> int:
+        """Rough memory estimate: ~100 bytes per posting, ~200 per account."""
+        return self._n_postings * 100 + len(self._codes) * 200
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[str, float]]:
+        """
+        Return the k best (code, bm25_score) pairs, best first. Accounts sharing
+        no useful term with the query are not returned at all.
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            n_docs = len(self._doc_terms)
+            if not terms or n_docs == 0 or k <= 0:
+                return []
+            if self._lengths_array is None:
+                self._lengths_array = np.asarray(self._lengths, dtype=np.float32)
+            lengths = self._lengths_array / (self._total_len / n_docs)
+            max_df = max(1.0, self.max_df_ratio * n_docs)
+            k1, b = self.k1, self.b
+
+            scores = None
+            for term in terms:
+                arrays = self._term_arrays(term)
+                if arrays is None or arrays[0].shape[0] > max_df:
+                    continue
+                rows, tf = arrays
+                df = rows.shape[0]
+                idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+                if scores is None:
+                    scores = np.zeros(len(self._codes), dtype=np.float32)
+                # rows are unique within one term, so fancy-index += is safe
+                scores[rows] += idf * tf * (k1 + 1.0) / (tf + k1 * (1.0 - b + b * lengths[rows]))
+            codes = self._codes
+
+        if scores is None:
+            return []
+        hit = np.flatnonzero(scores)
+        if k < hit.shape[0]:
+            hit = hit[np.argpartition(-scores[hit], k - 1)[:k]]
+        hit = hit[np.argsort(-scores[hit], kind="stable")]
+        return [(codes[i], float(scores[i])) for i in hit]
+
+
+# ===== DECIDING AND FUSING =====
+
+def is_decisive(hits: List[Tuple[str, float]], min_score: float, margin: float) -> bool:
+    """
+    True when the lexical winner is clear enough to skip the embedding call:
+    its score is at least min_score and the runner-up is at least `margin`
+    (a fraction of the winner's score) behind.
+    """
+    if not hits or hits[0][1] < min_score:
+        return False
+    if len(hits) == 1:
+        return True
+    best, second = hits[0][1], hits[1][1]
+    return (best - second) / best >= margin
+
+
+def fuse_scores(
+    vector_hits: List[Tuple[str, float]],
+    lexical_hits: List[Tuple[str, float]],
+    cosine_for: Callable[[List[str]], List[float]],
+    weight: float,
+    k: int,
+) -> List[Tuple[str, float]]:
+    """
+    Combine both rankings: fused = cosine + weight * (bm25 / best_bm25).
+
+    Every candidate from either list is scored on both scales; lexical-only
+    candidates get their exact cosine from `cosine_for(codes)`.
+
+    Returns:
+        List[Tuple[str, float]]: The k best (code, fused_score) pairs, best first.
+    """
+    cosine: Dict[str, float] = dict(vector_hits)
+    best_lexical = lexical_hits[0][1] if lexical_hits else 0.0
+    lexical: Dict[str, float] = {
+        code: score / best_lexical for code, score in lexical_hits
+    } if best_lexical > 0 else {}
+
+    missing = [code for code in lexical if code not in cosine]
+    if missing:
+        cosine.update(zip(missing, cosine_for(missing)))
+
+    fused = {code: cos + weight * lexical.get(code, 0.0) for code, cos in cosine.items()}
+    return heapq.nlargest(k, fused.items(), key=lambda item: item[1])
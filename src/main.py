@@ -3,7 +3,8 @@ from models import Invoice, InvoiceLine
 from query import suggest_accounts, format_suggestions_for_user, grade_confidence
 
 
-if __name__ == "__main__":
+def main():
+    """Classify one hard-coded sample invoice and print the suggestions (a quick end-to-end check)."""
     invoice = Invoice(
         vendor="lunch",
         invoice_date="2023-01-01",
@@ -15,13 +16,17 @@ if __name__ == "__main__":
         ],
     )
 
-text = invoice_to_description(invoice)
-print("Generated description:", text)
+    text = invoice_to_description(invoice)
+    print("Generated description:", text)
+
+    confidence_score = "high"
+    suggestions = suggest_accounts(text, k=5)
+    print("Suggestions:")
+    for s in suggestions:
+        print(f"{s.code}: {s.account_name} (similarity: {s.normalized_similarity:.2f})")
+        print("Confidence:", grade_confidence(suggestions))
+    print("Final answer:", format_suggestions_for_user(suggestions, confidence_score))
 
-confidence_score = "high"
-suggestions = suggest_accounts(text, k=5)
-print("Suggestions:")
-for s in suggestions:
-    print(f"{s.code}: {s.account_name} (similarity: {s.normalized_similarity:.2f})")
-    print("Confidence:", grade_confidence(suggestions))
-print("Final answer:", format_suggestions_for_user(suggestions, confidence_score))
\ No newline at end of file
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+import bisect
+import functools
+import inspect
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from config import settings
+
+
+# Latency buckets in seconds: sub-millisecond (in-memory search) up to a slow upstream call
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labelnames: Sequence[str], labels: Dict[str, object]) -> Tuple[str, ...]:
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _format_labels(labelnames: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """A monotonically increasing number per label set (e.g. upstream responses by status)."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        if not settings.METRICS_ENABLED:
+            return
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(self.labelnames, labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items]
+
+
+class Histogram:
+    """
+    Observation counts per latency bucket, plus count and sum, per label set.
+
+    observe() is a dict lookup, a bisect and three additions under a lock; the
+    cumulative bucket counts Prometheus wants are only computed when /metrics is read.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # label values -> [per-bucket counts (+1 for +Inf), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        if not settings.METRICS_ENABLED:
+            return
+        key = _label_key(self.labelnames, labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][slot] += 1
+            series[1] += value
+
+    def time(self, **labels) -> "_Timer":
+        """Context manager that observes the time spent inside the block."""
+        return _Timer(self, labels)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(_label_key(self.labelnames, labels))
+        return sum(series[0]) if series else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(counts), total) for key, (counts, total) in self._series.items())
+        lines = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: Histogram, labels: dict):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class GaugeFunction:
+    """
+    Samples read from a callback at scrape time (cache sizes, hit ratios ...), so
+    they cost nothing in between. kind='counter' exposes totals some other object
+    already keeps (e.g. EmbeddingCache.misses).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str],
+        read: Callable[[], Iterable[Tuple[Sequence[str], float]]],
+        kind: str = "gauge",
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.read = read
+        self.kind = kind
+
+    def render(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, [str(v) for v in key])} {_format_value(value)}"
+            for key, value in self.read()
+        ]
+
+
+class Registry:
+    """Every metric of the process, rendered together in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def _add(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None and type(existing) is type(metric) and not isinstance(metric, GaugeFunction):
+            return existing  # re-imports get the same instance
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def gauge_function(self, name: str, help: str, labelnames: Sequence[str], read, kind: str = "gauge") -> GaugeFunction:
+        """Register (or replace) a metric whose samples come from read() -> [(label values, value), ...]."""
+        return self._add(GaugeFunction(name, help, labelnames, read, kind))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                samples = metric.render()
+            except Exception:
+                continue  # a broken callback must not take /metrics down
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+# ===== THE APP'S METRICS =====
+
+OPERATION_SECONDS = registry.histogram(
+    "bookkeeper_operation_seconds",
+    "Time spent in instrumented functions (upstream calls, embedding, search, DB loads).",
+    ["operation"],
+)
+PIPELINE_STAGE_SECONDS = registry.histogram(
+    "bookkeeper_pipeline_stage_seconds",
+    "Time each document spent in a /classify-invoices pipeline stage (excludes queueing).",
+    ["stage"],
+)
+GRAPH_NODE_SECONDS = registry.histogram(
+    "bookkeeper_graph_node_seconds",
+    "Time spent in each agent graph node.",
+    ["node"],
+)
+DB_QUERY_SECONDS = registry.histogram(
+    "bookkeeper_db_query_seconds",
+    "SQLite statement execution time, by statement type.",
+    ["statement"],
+)
+UPSTREAM_RESPONSES = registry.counter(
+    "bookkeeper_upstream_responses_total",
+    "Responses from upstream APIs, by service, endpoint and HTTP status.",
+    ["service", "endpoint", "status"],
+)
+UPSTREAM_RETRIES = registry.counter(
+    "bookkeeper_upstream_retries_total",
+    "Upstream calls retried after a transient failure, by service, endpoint and status ('error' = no response).",
+    ["service", "endpoint", "reason"],
+)
+UPSTREAM_THROTTLE_SECONDS = registry.histogram(
+    "bookkeeper_upstream_throttle_seconds",
+    "Time calls waited for the client-side rate limit (or a server-requested pause) before going out.",
+    ["service", "endpoint"],
+)
+
+
+def timed(operation: str):
+    """
+    Decorator: record every call's duration in OPERATION_SECONDS{operation=...}.
+    Works on plain and async functions; exceptions are timed too.
+    """
+    def decorate(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    OPERATION_SECONDS.observe(time.perf_counter() - start, operation=operation)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                OPERATION_SECONDS.observe(time.perf_counter() - start, operation=operation)
+        return wrapper
+    return decorate
+
+
+# Statement types kept apart in DB_QUERY_SECONDS; everything else (PRAGMA, CREATE ...) is 'OTHER'
+_STATEMENT_TYPES = {"SELECT", "INSERT", "UPDATE", "DELETE"}
+
+
+def statement_type(statement: str) -> str:
+    head = statement.lstrip()[:6].upper()
+    return head if head in _STATEMENT_TYPES else "OTHER"
+
+
+def record_upstream_status(service: str, endpoint: str, status: Optional[int]):
+    """Count one upstream response ('error' when the request failed before any status came back)."""
+    UPSTREAM_RESPONSES.inc(service=service, endpoint=endpoint, status=status if status is not None else "error")
@@ -25,8 +25,36 @@ class Account(BaseModel):
 class AccountSuggestion(BaseModel):
   code: str  
   account_name: str
-  similarity: float
-  normalized_similarity: float
+  score: float                        # what the list is ranked by - its scale depends on source (see query._rank_accounts)
+  normalized_similarity: float        # score / the top score of the list (1.0 for the best suggestion)
+  similarity: Optional[float] = None  # cosine between the query and the account embeddings; None when nothing was embedded
+  source: str = "vector"      # 'vector' (embedding search), 'lexical' (keyword fast path), 'hybrid' (both fused) or 'memo' (confirmed vendor)
+
+
+def get_account_text(account: Account) -> str:
+    """
+    Combine all the account fields into one long string.
+    (Also works on account_catalog.CatalogEntry, which has the same attributes.)
+
+    Args:
+        account (Account): The account object containing various fields.
+
+    Returns:
+        str: A concatenated string of all account fields, separated by periods.
+    """
+    return (
+    f"{account.account_name}."
+    f"{account.code}."
+    f"{account.financial_stat}."
+    f"{account.group_name}."
+    f"{account.normally}."
+    f"{account.description}"
+    )
+
+
+class VendorConfirmation(BaseModel):
+    vendor: str    # as printed on the invoice, e.g. "Bell Canada Inc."
+    code: str      # the account the bookkeeper confirmed
 
 
 class InvoiceLine(BaseModel):
@@ -42,7 +70,20 @@ class Invoice(BaseModel):
     lines: List[InvoiceLine]
 
 
+class LineClassification(BaseModel):
+    description: str
+    amount: float
+    suggestions: List[AccountSuggestion]
+    confidence: Optional[str] = None  # 'low' | 'medium' | 'high'
+
 
+class AccountAllocation(BaseModel):
+    code: str
+    account_name: str
+    amount: float            # sum of line amounts whose best suggestion is this account
+    weighted_score: float    # sum over lines of (line amount share * score)
 
 
-    
\ No newline at end of file
+class InvoiceClassification(BaseModel):
+    lines: List[LineClassification]
+    allocations: List[AccountAllocation]  # sorted by amount, largest first
@@ -1,5 +1,7 @@
-from sqlalchemy import create_engine, JSON, String
+from sqlalchemy import create_engine, JSON, String, Integer, LargeBinary, Float, ForeignKey, Boolean, Index
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+from typing import Optional
+from tenants import DEFAULT_TENANT
 
 
 
@@ -14,7 +16,8 @@ class AccountModel(Base):
     __tablename__ = 'accounts' #This is the actual name is the DB
     
     #the primary Key is the unique ID for each row
-    #Since 'code' is unique for each account, we use that as the primary key
+    #Codes are unique within one client's chart, so the key is (tenant_id, code)
+    tenant_id: Mapped[str] = mapped_column(String, primary_key=True, default=DEFAULT_TENANT)
     account_name: Mapped[str] = mapped_column(String)
     code: Mapped[str] = mapped_column(String, primary_key=True)    
     financial_stat: Mapped[str] = mapped_column(String)
@@ -26,5 +29,109 @@ class AccountModel(Base):
 class AccountEmbedding(Base):
     __tablename__ = 'account_embeddings'
     
+    tenant_id: Mapped[str] = mapped_column(String, primary_key=True, default=DEFAULT_TENANT)
     code: Mapped[str] = mapped_column(String, primary_key=True)
-    embedding: Mapped[list[float]] = mapped_column(JSON)  # Store as JSON string    
\ No newline at end of file
+    
+    #The vector is stored as raw little-endian float32 bytes (4 bytes per dimension),
+    #about 4x smaller than the old JSON text and decodable without parsing.
+    embedding: Mapped[bytes] = mapped_column(LargeBinary)
+    dim: Mapped[int] = mapped_column(Integer)    # number of float32 values in 'embedding'
+    model: Mapped[str] = mapped_column(String)   # e.g. "text-embedding-3-small"
+    
+    #sha256 of get_account_text() at embedding time - lets the backfill skip unchanged accounts
+    content_hash: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+
+
+class QueryEmbeddingCacheEntry(Base):
+    __tablename__ = 'query_embedding_cache'
+    
+    #sha256 of (model, normalized text) - see embedding_cache.make_key()
+    key: Mapped[str] = mapped_column(String, primary_key=True)
+    model: Mapped[str] = mapped_column(String)
+    embedding: Mapped[bytes] = mapped_column(LargeBinary)  # little-endian float32, like AccountEmbedding
+    dim: Mapped[int] = mapped_column(Integer)
+    created_at: Mapped[float] = mapped_column(Float)       # unix time, used for age eviction
+    last_used_at: Mapped[float] = mapped_column(Float, index=True)  # unix time, used for size eviction
+
+
+class VendorAccountMemo(Base):
+    __tablename__ = 'vendor_account_memo'
+    
+    #One remembered account per vendor and tenant - see vendor_memo.py
+    tenant_id: Mapped[str] = mapped_column(String, primary_key=True, default=DEFAULT_TENANT)
+    vendor_key: Mapped[str] = mapped_column(String, primary_key=True)  # vendor_memo.normalize_vendor(vendor)
+    vendor: Mapped[str] = mapped_column(String)        # the name as last confirmed, e.g. "Bell Canada Inc."
+    code: Mapped[str] = mapped_column(String)          # account code
+    confirmations: Mapped[int] = mapped_column(Integer, default=0)  # times a person confirmed this code
+    hits: Mapped[int] = mapped_column(Integer, default=0)           # times it answered instead of the retriever
+    created_at: Mapped[float] = mapped_column(Float)   # unix time
+    last_seen: Mapped[float] = mapped_column(Float)    # unix time of the last confirmation or hit
+
+
+class InvoiceRecord(Base):
+    __tablename__ = 'invoices'
+    
+    #One classified document - written behind the request by classification_log.py
+    id: Mapped[str] = mapped_column(String, primary_key=True)  # uuid4 hex, assigned when the result is queued
+    tenant_id: Mapped[str] = mapped_column(String, index=True, default=DEFAULT_TENANT)
+    filename: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    vendor: Mapped[str] = mapped_column(String)
+    invoice_date: Mapped[str] = mapped_column(String)
+    total_amount: Mapped[float] = mapped_column(Float)
+    currency: Mapped[str] = mapped_column(String)
+    tax: Mapped[float] = mapped_column(Float)
+    description: Mapped[Optional[str]] = mapped_column(String, nullable=True)   # what the graph was asked
+    confidence: Mapped[Optional[str]] = mapped_column(String, nullable=True)    # 'low' | 'medium' | 'high'
+    final_answer: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    created_at: Mapped[float] = mapped_column(Float, index=True)  # unix time the classification finished
+
+
+class InvoiceLineRecord(Base):
+    __tablename__ = 'invoice_lines'
+    
+    invoice_id: Mapped[str] = mapped_column(String, ForeignKey('invoices.id'), primary_key=True)
+    line_no: Mapped[int] = mapped_column(Integer, primary_key=True)  # 0-based position on the invoice
+    description: Mapped[str] = mapped_column(String)
+    amount: Mapped[float] = mapped_column(Float)
+    confidence: Mapped[Optional[str]] = mapped_column(String, nullable=True)  # only set when lines were classified
+
+
+class SuggestionRecord(Base):
+    __tablename__ = 'invoice_suggestions'
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    invoice_id: Mapped[str] = mapped_column(String, ForeignKey('invoices.id'), index=True)
+    line_no: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)  # None = suggestion for the whole invoice
+    rank: Mapped[int] = mapped_column(Integer)  # 0 = best
+    code: Mapped[str] = mapped_column(String)
+    account_name: Mapped[str] = mapped_column(String)
+    similarity: Mapped[Optional[float]] = mapped_column(Float, nullable=True)  # cosine; None when nothing was embedded
+    normalized_similarity: Mapped[float] = mapped_column(Float)
+    source: Mapped[str] = mapped_column(String)  # see models.AccountSuggestion.source
+    score: Mapped[Optional[float]] = mapped_column(Float, nullable=True)  # the ranking score (scale depends on source)
+
+
+class JobRecord(Base):
+    __tablename__ = 'jobs'
+    
+    #One invoice submitted to POST /jobs, processed by a job worker - see jobs.py
+    id: Mapped[str] = mapped_column(String, primary_key=True)  # uuid4 hex, returned to the client
+    tenant_id: Mapped[str] = mapped_column(String, default=DEFAULT_TENANT)
+    filename: Mapped[str] = mapped_column(String)
+    document_path: Mapped[str] = mapped_column(String)  # the spooled upload under JOBS_DIR, deleted once the job finishes
+    per_line: Mapped[bool] = mapped_column(Boolean, default=False)
+    use_cache: Mapped[bool] = mapped_column(Boolean, default=True)
+    status: Mapped[str] = mapped_column(String)          # 'queued' | 'running' | 'done' | 'failed'
+    attempts: Mapped[int] = mapped_column(Integer, default=0)       # times a worker claimed it (and didn't hand it back)
+    max_attempts: Mapped[int] = mapped_column(Integer)
+    requeues: Mapped[Optional[int]] = mapped_column(Integer, nullable=True, default=0)  # times it was handed back after an upstream outage
+    worker_id: Mapped[Optional[str]] = mapped_column(String, nullable=True)           # current owner while 'running'
+    lease_expires_at: Mapped[Optional[float]] = mapped_column(Float, nullable=True)   # unix time; after it another worker may take the job (running) / it becomes visible again (requeued)
+    created_at: Mapped[float] = mapped_column(Float)
+    started_at: Mapped[Optional[float]] = mapped_column(Float, nullable=True)   # unix time of the latest claim
+    finished_at: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    result: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)   # pipeline.DocumentResult (+ line_classification)
+    error: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    
+    #Workers look for the oldest job that is queued (or running with an expired lease)
+    __table_args__ = (Index("ix_jobs_status_created_at", "status", "created_at"),)
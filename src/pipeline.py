@@ -0,0 +1,252 @@
+import asyncio
+import io
+import time
+import zipfile
+from typing import Dict, List, Optional
+
+import httpx
+from pydantic import BaseModel
+
+from client_landingai import AsyncLandingAIClient
+from config import settings
+from metrics import PIPELINE_STAGE_SECONDS
+from invoices import invoice_to_description
+from models import Invoice, AccountSuggestion
+from tenants import DEFAULT_TENANT
+from upstream import retry_later_delay
+
+
+# The pipeline stages, in order
+STAGES = ("parse", "extract", "describe", "suggest")
+
+# Zip members are decompressed in chunks of this size
+UNZIP_CHUNK_SIZE = 1024 * 1024
+
+
+class StageLimits:
+    """
+    One semaphore per pipeline stage.
+
+    Each document moves through parse -> extract -> describe -> suggest on its own,
+    and only waits for a free slot in the stage it is about to enter. A slow PDF
+    therefore holds one 'parse' slot and nothing else - the other documents keep
+    flowing through the later stages.
+
+    Create one per app (see api.py lifespan) so concurrent batches share the limits.
+    """
+
+    def __init__(self, parse: int, extract: int, describe: int, suggest: int):
+        self.semaphores: Dict[str, asyncio.Semaphore] = {
+            "parse": asyncio.Semaphore(parse),
+            "extract": asyncio.Semaphore(extract),
+            "describe": asyncio.Semaphore(describe),
+            "suggest": asyncio.Semaphore(suggest),
+        }
+
+    @classmethod
+    def from_settings(cls) -> "StageLimits":
+        return cls(
+            parse=settings.PIPELINE_PARSE_CONCURRENCY,
+            extract=settings.PIPELINE_EXTRACT_CONCURRENCY,
+            describe=settings.PIPELINE_DESCRIBE_CONCURRENCY,
+            suggest=settings.PIPELINE_SUGGEST_CONCURRENCY,
+        )
+
+
+class UploadedDocument(BaseModel):
+    """
+    One document to classify: its bytes, or the path of a file holding them
+    (streamed to Landing AI from disk, never read into memory whole).
+    """
+
+    filename: str
+    content: Optional[bytes] = None
+    path: Optional[str] = None
+
+
+class DocumentResult(BaseModel):
+    filename: str
+    status: str                          # 'ok' | 'error'
+    failed_stage: Optional[str] = None   # set when status == 'error'
+    error: Optional[str] = None
+    retry_after: Optional[float] = None  # set when the error was an upstream outage: trying again later may work (seconds the service asked for, or 0)
+    invoice: Optional[Invoice] = None
+    description: Optional[str] = None
+    suggestions: Optional[List[AccountSuggestion]] = None
+    confidence: Optional[str] = None
+    final_answer: Optional[str] = None
+    timings: Dict[str, float] = {}       # stage -> seconds spent in the stage (excludes queueing)
+    node_timings: Dict[str, float] = {}  # agent graph node -> seconds (inside the 'suggest' stage)
+    classification_id: Optional[str] = None  # id of the stored record (see classification_log.py)
+
+
+# ===== UPLOAD HANDLING =====
+
+def expand_upload(
+    filename: str,
+    content: bytes,
+    max_documents: Optional[int] = None,
+    max_member_bytes: Optional[int] = None,
+    max_total_bytes: Optional[int] = None,
+) -> List[UploadedDocument]:
+    """
+    Turn one upload into documents: a .zip becomes one document per PDF inside it,
+    anything else is passed through as-is.
+
+    A small zip can decompress to gigabytes, so each PDF is limited to
+    max_member_bytes (BATCH_MAX_ZIP_MEMBER_MB) and all of them together to
+    max_total_bytes (BATCH_MAX_UNZIPPED_MB). Oversized members are refused from
+    their header before anything is read, and the reads themselves stop at the
+    limit in case the header lies.
+
+    Raises:
+        ValueError: Too many PDFs, or too much decompressed data.
+    """
+    max_documents = max_documents or settings.BATCH_MAX_DOCUMENTS
+    if max_member_bytes is None:
+        max_member_bytes = int(settings.BATCH_MAX_ZIP_MEMBER_MB * 1024 * 1024)
+    if max_total_bytes is None:
+        max_total_bytes = int(settings.BATCH_MAX_UNZIPPED_MB * 1024 * 1024)
+
+    if not zipfile.is_zipfile(io.BytesIO(content)):
+        return [UploadedDocument(filename=filename, content=content)]
+
+    documents = []
+    total = 0
+    with zipfile.ZipFile(io.BytesIO(content)) as archive:
+        for member in archive.infolist():
+            if member.is_dir() or not member.filename.lower().endswith(".pdf"):
+                continue
+            if len(documents) >= max_documents:
+                raise ValueError(f"{filename} contains more than {max_documents} PDFs")
+
+            # 1. What the header declares
+            limit = max_member_bytes or None
+            if max_total_bytes:
+                limit = min(limit or max_total_bytes, max_total_bytes - total)
+            if limit is not None and member.file_size > limit:
+                raise ValueError(_too_much_unzipped(filename, member.filename, member.file_size, max_member_bytes, max_total_bytes))
+
+            # 2. What actually comes out
+            data = _read_member(archive, member, limit)
+            if data is None:
+                raise ValueError(_too_much_unzipped(filename, member.filename, limit + 1, max_member_bytes, max_total_bytes))
+            total += len(data)
+            documents.append(UploadedDocument(filename=member.filename, content=data))
+    return documents
+
+
+def _read_member(archive: zipfile.ZipFile, member: zipfile.ZipInfo, limit: Optional[int]) -> Optional[bytes]:
+    """Decompress one member, or return None as soon as it passes `limit` bytes."""
+    chunks = []
+    size = 0
+    with archive.open(member) as stream:
+        while chunk := stream.read(UNZIP_CHUNK_SIZE):
+            size += len(chunk)
+            if limit is not None and size > limit:
+                return None
+            chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def _too_much_unzipped(filename: str, member: str, size: int, max_member_bytes: int, max_total_bytes: int) -> str:
+    if max_member_bytes and size > max_member_bytes:
+        return f"{member} in {filename} is larger than {max_member_bytes / (1024 * 1024):g} MB uncompressed"
+    return f"{filename} decompresses to more than {max_total_bytes / (1024 * 1024):g} MB"
+
+
+# ===== PIPELINE =====
+
+async def run_suggestion_graph(
+    graph,
+    description: str,
+    tenant_id: str = DEFAULT_TENANT,
+    vendor: Optional[str] = None,
+) -> dict:
+    """Run the agent graph for one description, using the async node variants."""
+    from agent_graph import GraphState
+
+    return await graph.ainvoke(GraphState(description=description, tenant_id=tenant_id, vendor=vendor))
+
+
+async def process_document(
+    client: AsyncLandingAIClient,
+    document: UploadedDocument,
+    limits: StageLimits,
+    graph,
+    use_cache: bool = True,
+    tenant_id: str = DEFAULT_TENANT,
+) -> DocumentResult:
+    """
+    Push one document through every stage. Never raises: a failure is reported
+    in the result (with the stage it happened in) so the rest of the batch is unaffected.
+    """
+    result = DocumentResult(filename=document.filename, status="ok")
+    stage = STAGES[0]
+
+    async def run_stage(name: str, coro_fn):
+        nonlocal stage
+        stage = name
+        async with limits.semaphores[name]:
+            start = time.perf_counter()
+            try:
+                return await coro_fn()
+            finally:
+                result.timings[name] = time.perf_counter() - start
+                PIPELINE_STAGE_SECONDS.observe(result.timings[name], stage=name)
+
+    try:
+        # 1. Parse (upstream)
+        async def parse():
+            if document.path is None:
+                return await client.ade_parse(document.content, filename=document.filename, use_cache=use_cache)
+            with open(document.path, "rb") as file:
+                return await client.ade_parse(file, filename=document.filename, use_cache=use_cache)
+        markdown = await run_stage("parse", parse)
+
+        # 2. Extract (upstream)
+        extraction = await run_stage("extract", lambda: client.ade_extract(markdown, use_cache=use_cache))
+        result.invoice = Invoice(**extraction["extraction"])
+
+        # 3. Describe (local, cheap)
+        async def describe():
+            return invoice_to_description(result.invoice)
+        result.description = await run_stage("describe", describe)
+
+        # 4. Suggest (vendor memo, or embedding + search + graph)
+        final_state = await run_stage("suggest", lambda: run_suggestion_graph(
+            graph, result.description, tenant_id, vendor=result.invoice.vendor,
+        ))
+        result.suggestions = final_state.get("suggestions")
+        result.confidence = final_state.get("confidence")
+        result.final_answer = final_state.get("final_answer")
+        result.node_timings = final_state.get("timings") or {}
+
+    except Exception as exc:
+        result.status = "error"
+        result.failed_stage = stage
+        result.error = f"{type(exc).__name__}: {exc}"
+        result.retry_after = retry_later_delay(exc, retry_on=(httpx.TransportError,))
+
+    return result
+
+
+async def process_documents(
+    client: AsyncLandingAIClient,
+    documents: List[UploadedDocument],
+    limits: Optional[StageLimits] = None,
+    use_cache: bool = True,
+    tenant_id: str = DEFAULT_TENANT,
+) -> List[DocumentResult]:
+    """
+    Classify many documents concurrently, pipelined by stage, against one tenant's chart.
+
+    Returns:
+        List[DocumentResult]: One result per document, in input order.
+    """
+    # langgraph is only imported (and the graph compiled) by the first batch, not at startup
+    from agent_graph import get_graph
+
+    limits = limits or StageLimits.from_settings()
+    graph = get_graph()  # compiled once per process
+    return await asyncio.gather(*(process_document(client, doc, limits, graph, use_cache, tenant_id) for doc in documents))
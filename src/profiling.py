@@ -0,0 +1,215 @@
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import Optional
+
+
+# Leaf frames of threads that are just waiting (idle pool workers, the event loop's select)
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+
+class ProfileSession(ABC):
+    """
+    One profiling run. It ends after max_requests profiled requests or when the
+    caller's time limit runs out, whichever comes first.
+    """
+
+    mode = ""
+
+    def __init__(self, max_requests: Optional[int] = None):
+        self.max_requests = max_requests
+        self.requests = 0
+        self.started_at = time.time()
+        self.done = asyncio.Event()
+
+    @abstractmethod
+    def start(self):
+        ...
+
+    @abstractmethod
+    def stop(self):
+        ...
+
+    @abstractmethod
+    def report(self, limit: int) -> str:
+        ...
+
+    def request_finished(self):
+        """Called (on the event loop) by ProfilingMiddleware after every profiled request."""
+        self.requests += 1
+        if self.max_requests is not None and self.requests >= self.max_requests:
+            self.done.set()
+
+
+class DeterministicSession(ProfileSession):
+    """
+    cProfile: every function call is counted and timed. Exact, but it slows the
+    profiled code down noticeably. Before Python 3.12 cProfile only sees the thread
+    it was started on (the event loop) - use sampling for code run in
+    asyncio.to_thread or sync endpoints there. Report: pstats text, sorted by
+    cumulative time.
+    """
+
+    mode = "deterministic"
+
+    def __init__(self, max_requests: Optional[int] = None):
+        super().__init__(max_requests)
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def report(self, limit: int = 50) -> str:
+        out = io.StringIO()
+        out.write(f"# {self.requests} requests profiled in {time.time() - self.started_at:.1f}s\n")
+        stats = pstats.Stats(self.profile, stream=out)
+        stats.sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
+
+
+class SamplingSession(ProfileSession):
+    """
+    A background thread looks at every thread's Python stack every `interval`
+    seconds (sys._current_frames) and counts identical stacks. The profiled code
+    runs at full speed, and work in asyncio.to_thread pools is seen too. Report:
+    collapsed stacks ("frame;frame;frame count" per line, root first), ready for
+    flamegraph.pl or speedscope.
+    """
+
+    mode = "sampling"
+
+    def __init__(self, max_requests: Optional[int] = None, interval: float = 0.005):
+        super().__init__(max_requests)
+        self.interval = interval
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def report(self, limit: int = 0) -> str:
+        """All stacks (or the `limit` most frequent), most frequent first."""
+        items = self.stacks.most_common(limit or None)
+        return "".join(f"{stack} {count}\n" for stack, count in items)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = self._collapse(frame)
+                if stack:
+                    self.stacks[stack] += 1
+            self.samples += 1
+
+    @staticmethod
+    def _collapse(frame) -> Optional[str]:
+        code = frame.f_code
+        if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+            return None
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+
+MODES = {"deterministic": DeterministicSession, "sampling": SamplingSession}
+
+
+class Profiler:
+    """
+    Holds the (at most one) running ProfileSession of this worker process.
+    While `session` is None nothing is profiled; the middleware only checks that attribute.
+    """
+
+    def __init__(self):
+        self.session: Optional[ProfileSession] = None
+
+    async def run(
+        self,
+        mode: str,
+        seconds: float,
+        max_requests: Optional[int] = None,
+        sample_interval: float = 0.005,
+    ) -> ProfileSession:
+        """
+        Profile for `seconds`, or until `max_requests` requests have finished, and
+        return the stopped session (call .report() on it).
+
+        Raises:
+            ValueError: Unknown mode.
+            RuntimeError: A session is already running.
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode {mode!r} (use one of {sorted(MODES)})")
+        if self.session is not None:
+            raise RuntimeError("A profiling session is already running")
+
+        if mode == "sampling":
+            session = SamplingSession(max_requests, interval=sample_interval)
+        else:
+            session = DeterministicSession(max_requests)
+        try:
+            session.start()
+        except ValueError as exc:  # Python 3.12+: another profiler (e.g. a debugger) is active
+            raise RuntimeError(str(exc)) from exc
+        self.session = session
+        try:
+            await asyncio.wait_for(session.done.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self.session = None
+            session.stop()
+        return session
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that counts finished requests for the running ProfileSession.
+    When no session is running it costs one attribute lookup per request.
+    Requests to /admin/ (the profiling endpoint itself) are not counted.
+    """
+
+    def __init__(self, app, profiler: Profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        session = self.profiler.session
+        if session is None or scope["type"] != "http" or scope["path"].startswith("/admin/"):
+            return await self.app(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            session.request_finished()
+
+
+# One profiler per worker process
+profiler = Profiler()
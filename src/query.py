@@ -1,51 +1,80 @@
 import math 
-from typing import List, Tuple, Dict 
-from models import Account, AccountSuggestion 
-from database import get_account_by_code, load_all_account_embeddings
-from openai import OpenAI
-from dotenv import load_dotenv
+import numpy as np
+from typing import List, Tuple, Dict, Optional
+from models import Account, AccountSuggestion, get_account_text
+from database import get_account_by_code, get_account_index, get_account_catalog, get_lexical_index
+from account_catalog import CatalogEntry, AccountCatalog
 from config import settings
-
-client = OpenAI(api_key=settings.OPENAI_API_KEY)    
+from lexical_index import is_decisive, fuse_scores
+from embedding_cache import embedding_cache
+from embeddings import EmbeddingProvider, get_embedding_provider
+from tenants import DEFAULT_TENANT
+from metrics import timed
 
 # ===== TEXT PROCESSING =====
-def get_account_text(account: Account) -> str:
+# get_account_text() lives in models.py (the write helpers in database.py need it too)
+
+#Sends text to the embedding provider and gets back a list of numbers (the vector).
+@timed("embed_text")
+def embed_text(text: str) -> list[float]:
     """
-    Combine all the account fields into one long string.
+    Generate an embedding vector for the given text using the configured
+    embedding provider (OpenAI by default, see embeddings.py).
+
+    Repeated descriptions (recurring vendors, identical bank memos) are answered
+    from embedding_cache instead of making another network round trip.
 
     Args:
-        account (Account): The account object containing various fields.
+        text (str): The input text to be embedded.
 
     Returns:
-        str: A concatenated string of all account fields, separated by periods.
+        list[float]: A list of floating-point numbers representing the embedding vector.
     """
-    return (
-    f"{account.account_name}."
-    f"{account.code}."
-    f"{account.financial_stat}."
-    f"{account.group_name}."
-    f"{account.normally}."
-    f"{account.description}"
-    )
+    return embed_texts([text])[0]
 
 
 
-#Sends text to OpenAI and gets back a list of numbers (the vector).
-def embed_text(text: str) -> list[float]:
+def embed_texts(
+    texts: List[str],
+    use_cache: bool = True,
+    provider: EmbeddingProvider | None = None,
+    ) -> List[list[float]]:
     """
-    Generate an embedding vector for the given text using OpenAI's embedding model.
+    Embed many texts with a single batched request (input=[...]).
 
     Args:
-        text (str): The input text to be embedded.
+        texts (List[str]): The input texts, in order.
+        use_cache (bool): Look up / store each text in embedding_cache. The account
+            backfill turns this off so account texts don't crowd out real queries.
+            Providers that are faster than the cache (provider.cacheable=False) skip it anyway.
+        provider (EmbeddingProvider): Defaults to get_embedding_provider().
 
     Returns:
-        list[float]: A list of floating-point numbers representing the embedding vector.
+        List[list[float]]: One vector per input text, in the same order.
     """
-    embedding = client.embeddings.create(
-        model = "text-embedding-3-small",
-        input = text
-    )
-    return embedding.data[0].embedding
+    provider = provider or get_embedding_provider()
+    model = provider.model
+    use_cache = use_cache and provider.cacheable
+    vectors: List[list[float] | None] = [None] * len(texts)
+
+    # 1. Fill what we can from the cache
+    missing: List[int] = []
+    for i, text in enumerate(texts):
+        cached = embedding_cache.get(model, text) if use_cache else None
+        if cached is None:
+            missing.append(i)
+        else:
+            vectors[i] = cached
+
+    # 2. One request for everything else
+    if missing:
+        fresh = provider.embed([texts[i] for i in missing])
+        for i, vector in zip(missing, fresh):
+            vectors[i] = vector
+            if use_cache:
+                embedding_cache.put(model, texts[i], vector)
+
+    return vectors
 
 
 
@@ -71,31 +100,21 @@ def cosine_similarity(vec1: list[float], vec2: list[float]) -> float:
 
 # ===== SEARCH LOGIC =====
 
-def find_top_k_account_codes(query_embedding: list[float], k: int = 5) -> List[Tuple[str, float]]:
+@timed("find_top_k_account_codes")
+def find_top_k_account_codes(
+    query_embedding: list[float],
+    k: int = 5,
+    tenant_id: str = DEFAULT_TENANT,
+    ) -> List[Tuple[str, float]]:
     """
     The Search Engine Logic:
-    1. Load all account vectors.
-    2. Compare the query vector to every account vector.
-    3. Sort by the highest score.
-    4. Return the top k results.
+    1. Get the tenant's resident index (loaded from the DB only once).
+    2. Score every account with one matrix-vector product.
+    3. Partially sort to find the k best.
+    4. Return the top k results, best first.
     """
-    # 1. Load all (code, embedding) pairs
-    all_embeddings = load_all_account_embeddings()
-
-    #2 prepare an empty list to collect (code, score)
-    all_scores: List[Tuple[str, float]] = []
-
-    # 3. Loop through each stored account embedding
-    for code, emb in all_embeddings:
-        score = cosine_similarity(query_embedding, emb)
-        all_scores.append((code, score))
-
-    # 4. Sort the scores in descending order
-    all_scores.sort(key=lambda x: x[1], reverse=True)
-
-    #5 take top k
-    top_k_scores = all_scores[:k]
-    return top_k_scores
+    index = get_account_index(tenant_id)
+    return index.top_k(query_embedding, k)
 
 
 
@@ -130,67 +149,130 @@ def search_account(client, query_text: str):
     return account_details
 
 
-def retrieve_top_k_accounts(
+# (entry, ranking score, cosine or None)
+RankedAccount = Tuple[CatalogEntry, float, Optional[float]]
+
+
+def _resolve(
+    catalog: AccountCatalog,
+    hits: List[Tuple[str, float]],
+    cosine: Optional[Dict[str, float]] = None,
+    ) -> List[RankedAccount]:
+    """Turn (code, score) hits into (CatalogEntry, score, cosine), in one pass over the catalog."""
+    entries = catalog.get_many(code for code, _ in hits)
+    return [
+        (entry, score, cosine.get(code) if cosine is not None else None)
+        for entry, (code, score) in zip(entries, hits)
+        if entry is not None  # safety check
+    ]
+
+
+def _rank_accounts(
     text_description: str,
-    k: int = 5
-    ) -> List[Dict]:
-    """
-    Given a transaction description, return the top-k matching accounts
-    with their similarity scores and normality. 
+    k: int = 5,
+    tenant_id: str = DEFAULT_TENANT,
+    ) -> Tuple[List[RankedAccount], str]:
     """
+    Rank the tenant's accounts for a description and resolve every hit against
+    its in-memory catalog (no DB round trip per hit).
 
-    # 1) Turn text into an embedding
-    query_embedding = embed_text(text_description)
+    1. Keyword (BM25) search - no network. If the winner is decisive
+       (settings.LEXICAL_FAST_PATH_*) it is returned as is and nothing is embedded.
+    2. Otherwise embed the description and search the vector index.
+    3. If there were keyword hits, fuse both scores (settings.LEXICAL_FUSION_WEIGHT).
 
-    # 2) Find top-k (code, score) pairs
-    top_codes_and_scores = find_top_k_account_codes(
+    Returns:
+        The ranked (entry, score, cosine) triples and where they came from, which
+        sets the scale of the scores: 'lexical' (bm25 / best bm25, cosine None as
+        nothing was embedded), 'vector' (cosine) or 'hybrid' (cosine + weight * lexical).
+    """
+    catalog = get_account_catalog(tenant_id)
+
+    # 1) Keyword pass
+    lexical_hits: List[Tuple[str, float]] = []
+    if settings.LEXICAL_ENABLED:
+        lexical_hits = get_lexical_index(tenant_id).search(
+            text_description, k=max(k, settings.LEXICAL_CANDIDATES)
+        )
+        if is_decisive(lexical_hits, settings.LEXICAL_FAST_PATH_MIN_SCORE, settings.LEXICAL_FAST_PATH_MARGIN):
+            best = lexical_hits[0][1]
+            return _resolve(catalog, [(code, score / best) for code, score in lexical_hits[:k]]), "lexical"
+
+    # 2) Turn text into an embedding and find the top-k (code, cosine) pairs
+    #    (converted to an array once - both the search and the fusion use it)
+    query_embedding = np.asarray(embed_text(text_description), dtype=np.float32)
+    vector_hits = find_top_k_account_codes(
         query_embedding=query_embedding,
         k=k,
+        tenant_id=tenant_id,
+    )
+    if not lexical_hits:
+        return _resolve(catalog, vector_hits, dict(vector_hits)), "vector"
+
+    # 3) Re-rank the union of both candidate lists
+    index = get_account_index(tenant_id)
+    fused = fuse_scores(
+        vector_hits,
+        lexical_hits,
+        cosine_for=lambda codes: index.score_codes(query_embedding, codes),
+        weight=settings.LEXICAL_FUSION_WEIGHT,
+        k=k,
     )
+    cosine = dict(vector_hits)
+    missing = [code for code, _ in fused if code not in cosine]
+    if missing:
+        cosine.update(zip(missing, index.score_codes(query_embedding, missing)))
+    return _resolve(catalog, fused, cosine), "hybrid"
 
-    # 3) For each code, fetch account info and attach similarity
-    results: List[Dict] = []
 
-    for code, score in top_codes_and_scores:
-        account_obj = get_account_by_code(code)  # Return Account object
+def retrieve_top_k_accounts(
+    text_description: str,
+    k: int = 5,
+    tenant_id: str = DEFAULT_TENANT,
+    ) -> List[Dict]:
+    """
+    Given a transaction description, return the top-k matching accounts of the
+    tenant's chart with their similarity scores and normality. 
+    """
+    ranked, source = _rank_accounts(text_description, k=k, tenant_id=tenant_id)
 
-        if account_obj is None:
-            continue  # safety check
+    # Normalize the ranking scores relative to the top score
+    top_score = ranked[0][1] if ranked else 0.0
 
-        # NEW: Convert to dictionary so we can add temporary fields
-        account_info = account_obj.model_dump()
-        
-        # attach similarity
-        account_info["similarity"] = score
+    results: List[Dict] = []
+    for entry, score, cosine in ranked:
+        account_info = entry.to_dict()
+        account_info["score"] = score
+        account_info["similarity"] = cosine
+        account_info["normalized_similarity"] = score / top_score if top_score else 0.0
+        account_info["source"] = source
         results.append(account_info)
 
-    # 4) Normalize similarity values relative to the top score
-    if results:
-        top_score = results[0]["similarity"]
-        for r in results:
-            r["normalized_similarity"] = r["similarity"] / top_score
-
     return results
 
 def suggest_accounts(
     text_description: str,
-    k: int = 5
+    k: int = 5,
+    tenant_id: str = DEFAULT_TENANT,
     ) -> List["AccountSuggestion"]:
 
-    rows = retrieve_top_k_accounts(text_description, k=k)
+    ranked, source = _rank_accounts(text_description, k=k, tenant_id=tenant_id)
+    if not ranked:
+        return []
     
-    suggestions: List[AccountSuggestion] = []
+    top_score = ranked[0][1]
     
-    for row in rows:
-        suggestions.append(AccountSuggestion(
-        code=row["code"],
-        account_name=row["account_name"],
-        similarity=row["similarity"],
-        normalized_similarity=row["normalized_similarity"],
-            )
+    return [
+        AccountSuggestion(
+            code=entry.code,
+            account_name=entry.account_name,
+            score=score,
+            normalized_similarity=score / top_score if top_score else 0.0,
+            similarity=cosine,
+            source=source,
         )
-    
-    return suggestions
+        for entry, score, cosine in ranked
+    ]
 
 
 def format_suggestions_for_user(
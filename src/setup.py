@@ -1,61 +1,125 @@
 import csv
+import time
 from models import Account
-from database import init_db, insert_account, clear_database, insert_account_embedding, load_all_account_embeddings, get_all_accounts, get_account_by_code
-from query import get_account_text, embed_text
+from config import settings
+from database import init_db, insert_account, clear_database, insert_account_embedding, load_all_account_embeddings, get_all_accounts, get_account_by_code, bulk_upsert_accounts, delete_accounts_except
+from backfill import backfill_account_embeddings
+from tenants import DEFAULT_TENANT, validate_tenant_id
 
 
-def import_coa_from_csv(csv_path: str):
-    """Read CSV and insert accounts one by one."""
+# CSV header -> AccountModel column
+CSV_COLUMNS = {
+    "Account Name": "account_name",
+    "Code": "code",
+    "Financial Statement": "financial_stat",
+    "Group": "group_name",
+    "Normally": "normally",
+    "Description": "description",
+}
+
+
+def import_coa_from_csv(
+    csv_path: str,
+    chunk_size: int | None = None,
+    prune: bool = False,
+    tenant_id: str = DEFAULT_TENANT,
+) -> int:
+    """
+    Stream the CSV and upsert accounts into the tenant's chart in chunks.
+    
+    Every chunk of rows is written with one INSERT ... ON CONFLICT statement in a
+    single transaction (see database.bulk_upsert_accounts), instead of one
+    session + commit per row.
+    
+    Args:
+        csv_path (str): Path to the chart of accounts CSV.
+        chunk_size (int): Rows per transaction. Defaults to settings.IMPORT_CHUNK_SIZE.
+        prune (bool): Also delete accounts that are no longer in the CSV.
+        tenant_id (str): The client company the chart belongs to.
+    
+    Returns:
+        int: The number of rows imported.
+    """
+    chunk_size = chunk_size or settings.IMPORT_CHUNK_SIZE
     print(f"Reading from {csv_path}...")
+    start = time.perf_counter()
     
+    count = 0
+    seen_codes: set[str] = set()
     with open(csv_path, mode="r", encoding="utf-8") as f:
         reader = csv.DictReader(f)
-        count = 0
+        chunk: list[dict] = []
         for row in reader:
-            # 1. Create the Pydantic Object (The "Nail")
-            account = Account(
-                account_name=row["Account Name"],
-                code=row["Code"],
-                financial_stat=row["Financial Statement"],
-                group_name=row["Group"],
-                normally=row["Normally"],
-                description=row["Description"],
-            )
-            
-            # 2. Use the Tool (The "Hammer")
-            insert_account(account)
-            count += 1
+            # 1. Map CSV headers to DB columns (a missing header raises KeyError)
+            chunk.append({column: row[header] for header, column in CSV_COLUMNS.items()})
+            seen_codes.add(row["Code"])
             
-    print(f"✅ Imported {count} accounts.")
-
+            # 2. Write a full chunk in one transaction
+            if len(chunk) >= chunk_size:
+                count += bulk_upsert_accounts(chunk, tenant_id=tenant_id)
+                chunk = []
+        
+        count += bulk_upsert_accounts(chunk, tenant_id=tenant_id)
+    
+    removed = delete_accounts_except(seen_codes, tenant_id=tenant_id) if prune else 0
+    
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed > 0 else float("inf")
+    print(f"✅ Imported {count} accounts in {elapsed:.2f}s ({rate:,.0f} rows/s).")
+    if removed:
+        print(f"Removed {removed} accounts no longer in the CSV.")
+    return count
 
-def embed_all_accounts():
-    """Generate and store embeddings for all accounts in the database."""
-    accounts = get_all_accounts()
-    print(f"Generating embeddings for {len(accounts)} accounts...")
 
-    for acc in accounts:
-        text = get_account_text(acc)
-        vector = embed_text(text)
-        insert_account_embedding(acc.code, vector)
+def embed_all_accounts(tenant_id: str = DEFAULT_TENANT):
+    """
+    Generate and store embeddings for all of the tenant's accounts.
+    
+    Only accounts whose text or embedding model changed since the last run are sent
+    to OpenAI (in batches, a few requests at a time) - see backfill.py.
+    """
+    report = backfill_account_embeddings(tenant_id=tenant_id)
+    print(
+        f"Embedded {report.embedded} of {report.total_accounts} accounts "
+        f"({report.unchanged} unchanged, {report.removed} removed) "
+        f"in {report.requests} requests, {report.seconds:.1f}s."
+    )
 
     print("✅ All account embeddings generated and stored.")
 
 
-def clear_and_setup():
-    print("========Setting up the database========")
+def clear_and_setup(
+    full_rebuild: bool = False,
+    tenant_id: str = DEFAULT_TENANT,
+    csv_path: str = "data/coav2.csv",
+):
+    """
+    Build (or refresh) one tenant's chart of accounts from a CSV (data/coav2.csv by default).
+    
+    By default existing embeddings are kept and only changed accounts are re-embedded.
+    Pass full_rebuild=True to wipe the tenant's chart first. Other tenants are never touched.
+    """
+    validate_tenant_id(tenant_id)
+    print(f"========Setting up the database (tenant {tenant_id})========")
     init_db()
-    print("========Clearing existing data========")
-    clear_database()
+    if full_rebuild:
+        print("========Clearing existing data========")
+        clear_database(tenant_id)
     print("========Importing Chart of Accounts from CSV========")
     # This function handles the looping and inserting internally
-    import_coa_from_csv("data/coav2.csv")
+    import_coa_from_csv(csv_path, prune=True, tenant_id=tenant_id)
     print("========Generating and storing embeddings========")
     # This function handles the AI work and saving internally
-    embed_all_accounts()
+    embed_all_accounts(tenant_id)
     
     print("========Setup Complete========")
     
 
 if __name__ == "__main__":
-    clear_and_setup()
+    import argparse
+    parser = argparse.ArgumentParser(description="Import a chart of accounts and embed it.")
+    parser.add_argument("--full", action="store_true", help="wipe the tenant's chart first")
+    parser.add_argument("--tenant", default=DEFAULT_TENANT, help="client company / chart id")
+    parser.add_argument("--csv", default="data/coav2.csv", help="chart of accounts CSV")
+    args = parser.parse_args()
+    clear_and_setup(full_rebuild=args.full, tenant_id=args.tenant, csv_path=args.csv)
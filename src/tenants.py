@@ -0,0 +1,137 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from account_catalog import AccountCatalog
+from lexical_index import LexicalIndex
+from vector_index import VectorIndex
+
+
+# Rows written without a tenant (and every row from before tenants existed) belong here
+DEFAULT_TENANT = "default"
+
+# Tenant ids end up in file names (per-tenant ANN index), so keep them boring
+TENANT_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def validate_tenant_id(tenant_id: str) -> str:
+    """Return tenant_id unchanged, or raise ValueError if it is not a valid id."""
+    if not isinstance(tenant_id, str) or not TENANT_ID_RE.match(tenant_id):
+        raise ValueError(f"Invalid tenant id: {tenant_id!r} (use 1-64 letters, digits, '_' or '-')")
+    return tenant_id
+
+
+class TenantIndexes:
+    """The resident search structures of one tenant: its vector index, account catalog and lexical index."""
+
+    __slots__ = ("tenant_id", "index", "catalog", "lexical", "load_lock")
+
+    def __init__(self, tenant_id: str):
+        self.tenant_id = tenant_id
+        self.index = VectorIndex()
+        self.catalog = AccountCatalog()
+        self.lexical = LexicalIndex()
+        self.load_lock = threading.Lock()  # one loader per tenant at a time
+
+    @property
+    def nbytes(self) -> int:
+        return self.index.nbytes + self.catalog.nbytes + self.lexical.nbytes
+
+
+class TenantIndexManager:
+    """
+    Keeps the search indexes of the tenants that are actually being used.
+
+    A tenant's entry is created empty on first use and filled lazily by
+    database.get_account_index / get_account_catalog / get_lexical_index.
+    Entries are kept in least-recently-used order; once their combined size
+    passes max_bytes, or there are more than max_tenants of them, the coldest
+    tenants are dropped and simply reload from the database on their next
+    request. The count matters too: a tenant with no accounts costs next to no
+    bytes, but any valid tenant id gets an entry. The tenant being served is
+    never evicted, even if it alone is over the budget.
+    """
+
+    def __init__(self, max_bytes: int = 0, max_tenants: int = 0):
+        self.max_bytes = max_bytes      # 0 = no limit
+        self.max_tenants = max_tenants  # 0 = no limit
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, TenantIndexes]" = OrderedDict()
+        self.loads = 0
+        self.evictions = 0
+
+    def get(self, tenant_id: str) -> TenantIndexes:
+        """Return the tenant's entry (created empty if needed) and mark it most recently used."""
+        with self._lock:
+            entry = self._entries.get(tenant_id)
+            if entry is not None:
+                self._entries.move_to_end(tenant_id)
+                return entry
+            entry = TenantIndexes(validate_tenant_id(tenant_id))
+            self._entries[tenant_id] = entry
+            over_count = 0 < self.max_tenants < len(self._entries)
+        if over_count:  # (bytes are checked once the entry is loaded, see loaded())
+            self.enforce_budget(keep=tenant_id)
+        return entry
+
+    def peek(self, tenant_id: str) -> Optional[TenantIndexes]:
+        """The tenant's entry if it is resident, without creating it or touching the LRU order."""
+        return self._entries.get(tenant_id)
+
+    def loaded(self, tenant_id: str):
+        """Record that part of the tenant's entry was just loaded, then enforce the budget."""
+        with self._lock:
+            self.loads += 1
+        self.enforce_budget(keep=tenant_id)
+
+    def enforce_budget(self, keep: Optional[str] = None) -> List[str]:
+        """
+        Drop least-recently-used tenants until the total size fits max_bytes and
+        at most max_tenants are left.
+
+        Returns:
+            List[str]: The evicted tenant ids.
+        """
+        if self.max_bytes <= 0 and self.max_tenants <= 0:
+            return []
+
+        evicted = []
+        with self._lock:
+            total = sum(entry.nbytes for entry in self._entries.values()) if self.max_bytes > 0 else 0
+            for tenant_id in list(self._entries):
+                over_bytes = self.max_bytes > 0 and total > self.max_bytes
+                over_count = self.max_tenants > 0 and len(self._entries) > self.max_tenants
+                if not (over_bytes or over_count):
+                    break
+                if tenant_id == keep:
+                    continue
+                total -= self._entries.pop(tenant_id).nbytes
+                evicted.append(tenant_id)
+            self.evictions += len(evicted)
+        return evicted
+
+    def drop(self, tenant_id: str):
+        """Forget one tenant; its next request reloads from the database."""
+        with self._lock:
+            self._entries.pop(tenant_id, None)
+
+    def clear(self):
+        """Forget every tenant."""
+        with self._lock:
+            self._entries.clear()
+
+    def tenants(self) -> List[str]:
+        """Resident tenant ids, coldest first."""
+        return list(self._entries)
+
+    def stats(self) -> Dict:
+        entries = list(self._entries.values())
+        return {
+            "tenants": len(entries),
+            "bytes": sum(entry.nbytes for entry in entries),
+            "max_bytes": self.max_bytes,
+            "max_tenants": self.max_tenants,
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,73 @@
+import json
+
+from fastapi import HTTPException
+
+
+class UploadTooLarge(HTTPException):
+    """413 for a request body over the limit. FastAPI passes HTTPExceptions raised while parsing the form through as-is."""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(status_code=413, detail=f"Upload exceeds the {max_bytes / (1024 * 1024):g} MB limit")
+
+
+class UploadLimitMiddleware:
+    """
+    ASGI middleware that caps request bodies at max_bytes without buffering them.
+
+    - A Content-Length over the limit is refused before a single body byte is read.
+    - Otherwise (e.g. chunked uploads) the bytes are counted as the app receives
+      them, and UploadTooLarge is raised the moment the limit is passed, so the
+      multipart parser stops spooling the upload to disk.
+
+    Starlette spools each uploaded file (in memory up to 1 MB, then a temp file),
+    so what a request keeps in memory stays bounded whatever the document size.
+    """
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes  # 0 = no limit
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.max_bytes <= 0:
+            return await self.app(scope, receive, send)
+
+        # 1. Early rejection on the declared size
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit() and int(value) > self.max_bytes:
+                return await self._reject(send)
+
+        # 2. Count what actually arrives
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise UploadTooLarge(self.max_bytes)
+            return message
+
+        async def tracking_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except UploadTooLarge:
+            # Raised outside FastAPI's body parsing (nothing turned it into a response yet)
+            if response_started:
+                raise
+            await self._reject(send)
+
+    async def _reject(self, send):
+        body = json.dumps({"detail": UploadTooLarge(self.max_bytes).detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,401 @@
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional, Tuple
+
+from config import settings
+import metrics
+
+
+# Statuses worth another try: timeouts, rate limits and server-side failures
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+# Failures without a status that are always transient; callers add their client's own (retry_on=...)
+TRANSIENT_ERRORS: Tuple[type, ...] = (ConnectionError, TimeoutError)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a service whose circuit breaker is open."""
+
+    def __init__(self, service: str, retry_after: float):
+        super().__init__(f"{service} is unavailable (circuit open, retry in {retry_after:.0f}s)")
+        self.service = service
+        self.retry_after = retry_after
+
+
+# ===== BUILDING BLOCKS =====
+
+class TokenBucket:
+    """
+    `rate` tokens per second, at most `capacity` saved up for a burst (rate 0 = no limit).
+
+    reserve() takes the tokens right away and returns how long the caller must wait
+    before using them (the balance may go negative), so sync and async callers
+    share one bucket and are served in arrival order. pause() stops everyone until
+    a deadline - used when the service answers 429 with Retry-After.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        tokens = min(tokens, self.capacity)  # a request bigger than the bucket still gets through, alone
+        with self._lock:
+            now = time.monotonic()
+            if self.rate <= 0:
+                return max(0.0, self.paused_until - now)
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= tokens
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.paused_until - now)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` failed calls in a row (retries exhausted
+    on 5xx / connection errors). While open, calls fail at once with CircuitOpenError.
+    After `reset_timeout` seconds one probe call is let through (half-open): success
+    closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, service: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.service = service
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """
+        Raise CircuitOpenError unless a call may go out now.
+        Returns True when that call is the half-open probe.
+        """
+        with self._lock:
+            if self.state == "closed":
+                return False
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining <= 0 and not self._probing:
+                self.state = "half_open"
+                self._probing = True
+                return True
+            raise CircuitOpenError(self.service, max(remaining, 1.0))
+
+    def release_probe(self):
+        """The probe ended without an outcome (e.g. it was cancelled): let the next call probe instead."""
+        with self._lock:
+            if self.state == "half_open":
+                self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+
+class SingleFlight:
+    """
+    Identical calls in flight at the same time share one execution: the first caller
+    runs func, the others (other threads) wait for its result or its exception.
+    """
+
+    def __init__(self):
+        self.coalesced = 0
+        self._calls: Dict[object, "_Flight"] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func: Callable):
+        with self._lock:
+            flight = self._calls.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._calls[key] = _Flight()
+            else:
+                self.coalesced += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = func()
+            return flight.result
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            flight.done.set()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+# ===== FAILURE CLASSIFICATION =====
+
+def status_of(exc: BaseException) -> Optional[int]:
+    """HTTP status carried by an exception (openai.APIStatusError, httpx/requests HTTPError), if any."""
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def retry_after_of(exc: BaseException) -> Optional[float]:
+    """Seconds from the response's Retry-After header (delta-seconds or an HTTP date), if any."""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    value = headers.get("retry-after") if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_transient(exc: BaseException, retry_on: Tuple[type, ...] = ()) -> bool:
+    """A failure worth retrying: a RETRYABLE_STATUS, or (without a status) a connection / timeout error."""
+    status = status_of(exc)
+    return status in RETRYABLE_STATUS if status is not None else isinstance(exc, TRANSIENT_ERRORS + retry_on)
+
+
+def retry_later_delay(exc: BaseException, retry_on: Tuple[type, ...] = ()) -> Optional[float]:
+    """
+    For a call that failed for good (its retries are used up, or the circuit is open):
+    whether trying the whole operation again later may work.
+
+    Returns:
+        Optional[float]: None if the failure is not transient. Otherwise the seconds
+            the service asked for (Retry-After, or the circuit's remaining reset time), or 0.
+    """
+    if isinstance(exc, CircuitOpenError):
+        return exc.retry_after
+    if not is_transient(exc, retry_on):
+        return None
+    retry_after = retry_after_of(exc)
+    return retry_after if retry_after is not None else 0.0
+
+
+# ===== THE SCHEDULER =====
+
+class Upstream:
+    """
+    Every call to one upstream endpoint (or model) goes through here:
+
+    1. The service's circuit breaker must be closed (or letting a probe through).
+    2. The request bucket (and the token bucket, for token-metered APIs) must have room;
+       the caller sleeps until it does.
+    3. Retryable failures are retried with full-jitter exponential backoff. A Retry-After
+       from the server is honoured, and a 429 pauses the whole bucket so concurrent
+       callers back off together instead of piling on.
+
+    rate_per_minute / tokens_per_minute of 0 mean no client-side limit.
+    """
+
+    def __init__(
+        self,
+        service: str,
+        endpoint: str,
+        breaker: CircuitBreaker,
+        rate_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        max_retries: int = 4,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+    ):
+        self.service = service
+        self.endpoint = endpoint
+        self.breaker = breaker
+        self.requests = TokenBucket(rate_per_minute / 60)
+        self.tokens = TokenBucket(tokens_per_minute / 60)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def call(self, func: Callable, tokens: float = 0, retry_on: Tuple[type, ...] = ()):
+        """Run func() (a plain function) under the limits, retrying transient failures."""
+        # Retries belong to a call that was already let through (maybe as the probe)
+        probe = self.breaker.allow()
+        try:
+            attempt = 0
+            while True:
+                wait = self._admit(tokens)
+                if wait > 0:
+                    time.sleep(wait)
+                try:
+                    result = func()
+                except Exception as exc:
+                    delay = self._retry_delay(exc, attempt, retry_on)
+                    if delay is None:
+                        raise
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+                self.breaker.record_success()
+                return result
+        except BaseException:
+            # Outcomes were recorded above; this only matters for a probe that never got one
+            if probe:
+                self.breaker.release_probe()
+            raise
+
+    async def acall(self, func: Callable, tokens: float = 0, retry_on: Tuple[type, ...] = ()):
+        """Await func() (a coroutine function) under the limits, retrying transient failures."""
+        probe = self.breaker.allow()
+        try:
+            attempt = 0
+            while True:
+                wait = self._admit(tokens)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                try:
+                    result = await func()
+                except Exception as exc:
+                    delay = self._retry_delay(exc, attempt, retry_on)
+                    if delay is None:
+                        raise
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+                self.breaker.record_success()
+                return result
+        except BaseException:
+            # e.g. CancelledError (client gone, wait_for timeout, shutdown) while probing
+            if probe:
+                self.breaker.release_probe()
+            raise
+
+    def _admit(self, tokens: float) -> float:
+        wait = self.requests.reserve()
+        if tokens:
+            wait = max(wait, self.tokens.reserve(tokens))
+        if wait > 0:
+            metrics.UPSTREAM_THROTTLE_SECONDS.observe(wait, service=self.service, endpoint=self.endpoint)
+        return wait
+
+    def _retry_delay(self, exc: Exception, attempt: int, retry_on: Tuple[type, ...]) -> Optional[float]:
+        """Seconds to wait before the next attempt, or None to give up and re-raise."""
+        status = status_of(exc)
+        if not is_transient(exc, retry_on):
+            if status is not None and 400 <= status < 500:
+                self.breaker.record_success()  # the service answered; the request itself was bad
+            # Anything else (e.g. a bug on our side) says nothing about the service: leave the
+            # breaker alone (a probe's slot is handed back by call/acall)
+            return None
+
+        retry_after = retry_after_of(exc)
+        out_of_retries = attempt >= self.max_retries or (retry_after is not None and retry_after > self.backoff_max)
+        if status == 429:
+            # Rate limited, not broken: hold back every caller of this endpoint, leave the breaker alone
+            self.requests.pause(retry_after if retry_after is not None else self._backoff(attempt))
+            if out_of_retries:
+                return None
+        elif out_of_retries:
+            self.breaker.record_failure()
+            return None
+
+        metrics.UPSTREAM_RETRIES.inc(service=self.service, endpoint=self.endpoint, reason=status or "error")
+        delay = self._backoff(attempt)
+        if retry_after is not None:
+            delay = retry_after + random.uniform(0, self.backoff_base)  # spread out callers told the same time
+        return delay
+
+    def _backoff(self, attempt: int) -> float:
+        """Full jitter: uniform in [0, min(max, base * 2^attempt)]."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+
+# ===== ONE SCHEDULER PER PROCESS =====
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_upstreams: Dict[Tuple[str, str], Upstream] = {}
+_lock = threading.Lock()
+
+
+def _limits(service: str, endpoint: str) -> Tuple[float, float]:
+    """(requests, tokens) per minute allowed for one endpoint or model."""
+    if service == "openai":
+        return settings.OPENAI_EMBEDDING_RPM, settings.OPENAI_EMBEDDING_TPM
+    if endpoint == "parse":
+        return settings.LANDING_AI_PARSE_RPM, 0
+    return settings.LANDING_AI_EXTRACT_RPM, 0
+
+
+def get_upstream(service: str, endpoint: str) -> Upstream:
+    """
+    The shared Upstream for a service endpoint ('landingai', 'parse') or model
+    ('openai', 'text-embedding-3-small'), created from settings on first use.
+    Endpoints of one service share its circuit breaker.
+    """
+    key = (service, endpoint)
+    upstream = _upstreams.get(key)
+    if upstream is None:
+        with _lock:
+            upstream = _upstreams.get(key)
+            if upstream is None:
+                breaker = _breakers.get(service)
+                if breaker is None:
+                    breaker = _breakers[service] = CircuitBreaker(
+                        service, settings.UPSTREAM_BREAKER_FAILURES, settings.UPSTREAM_BREAKER_RESET,
+                    )
+                rate, tokens = _limits(service, endpoint)
+                upstream = _upstreams[key] = Upstream(
+                    service, endpoint, breaker,
+                    rate_per_minute=rate,
+                    tokens_per_minute=tokens,
+                    max_retries=settings.UPSTREAM_MAX_RETRIES,
+                    backoff_base=settings.UPSTREAM_BACKOFF_BASE,
+                    backoff_max=settings.UPSTREAM_BACKOFF_MAX,
+                )
+    return upstream
+
+
+def reset_upstreams():
+    """Forget every bucket and breaker (settings changes, tests)."""
+    with _lock:
+        _upstreams.clear()
+        _breakers.clear()
+
+
+def _circuit_states():
+    for service, breaker in list(_breakers.items()):
+        yield (service,), {"closed": 0, "half_open": 1, "open": 2}[breaker.state]
+
+
+metrics.registry.gauge_function(
+    "bookkeeper_upstream_circuit_state", "Circuit breaker per upstream service: 0 closed, 1 half-open, 2 open.",
+    ["service"], _circuit_states,
+)
@@ -0,0 +1,263 @@
+import threading
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from ann_index import IVFIndex
+
+
+class VectorIndex:
+    """
+    An in-process, resident index of account embeddings.
+
+    All vectors live in one contiguous float32 matrix. Every row is normalized
+    to unit length when it is added, so cosine similarity against a normalized
+    query is just a dot product, and scoring the whole chart is a single
+    matrix-vector product.
+
+    The index is filled once (see `load`) and then kept up to date incrementally
+    through `upsert` and `invalidate`, so it is never rebuilt per query.
+
+    For large charts an approximate IVFIndex can be attached (see `attach_ann`);
+    top_k then searches only a few clusters instead of every row.
+    """
+
+    def __init__(self, initial_capacity: int = 64):
+        self._lock = threading.Lock()
+        self._initial_capacity = initial_capacity
+        self._reset()
+
+    def _reset(self):
+        self._matrix: Optional[np.ndarray] = None   # shape (capacity, dim), float32
+        self._codes: List[str] = []                  # row i -> account code
+        self._row_by_code: dict[str, int] = {}       # account code -> row i
+        self._size = 0
+        self.is_loaded = False
+        self.ann: Optional[IVFIndex] = None
+
+    # ===== WRITE PATH =====
+
+    def load(self, rows: Iterable[Tuple[str, Iterable[float]]]):
+        """
+        Replace the whole index with the given (code, embedding) pairs.
+
+        Args:
+            rows: The (code, embedding_vector) tuples, e.g. from load_all_account_embeddings().
+        """
+        codes = []
+        vectors = []
+        for code, emb in rows:
+            codes.append(code)
+            vectors.append(np.asarray(emb, dtype=np.float32))
+
+        with self._lock:
+            self._reset()
+            if vectors:
+                matrix = np.vstack(vectors)
+                self._matrix = _normalize_rows(matrix)
+                self._codes = codes
+                self._row_by_code = {code: i for i, code in enumerate(codes)}
+                self._size = len(codes)
+            self.is_loaded = True
+
+    def upsert(self, code: str, embedding: Iterable[float]):
+        """
+        Insert or replace the vector for one account code.
+
+        Does nothing if the index has not been loaded yet: the next load()
+        will pick the row up from the database anyway.
+        """
+        with self._lock:
+            if not self.is_loaded:
+                return
+
+            vector = _normalize_rows(np.asarray(embedding, dtype=np.float32).reshape(1, -1))[0]
+
+            # 1. First vector decides the dimension of the whole index
+            if self._matrix is None:
+                self._matrix = np.zeros((self._initial_capacity, vector.shape[0]), dtype=np.float32)
+            elif vector.shape[0] != self._matrix.shape[1]:
+                raise ValueError(
+                    f"Embedding for {code} has {vector.shape[0]} dims, index has {self._matrix.shape[1]}"
+                )
+
+            # Keep the approximate index (if any) in step
+            if self.ann is not None:
+                self.ann.add(code, vector)
+
+            # 2. Existing code -> overwrite its row in place
+            row = self._row_by_code.get(code)
+            if row is not None:
+                self._matrix[row] = vector
+                return
+
+            # 3. New code -> append, growing the buffer geometrically when full
+            if self._size == self._matrix.shape[0]:
+                grown = np.zeros((self._matrix.shape[0] * 2, self._matrix.shape[1]), dtype=np.float32)
+                grown[: self._size] = self._matrix[: self._size]
+                self._matrix = grown
+
+            self._matrix[self._size] = vector
+            self._codes = self._codes + [code]  # new list so readers keep a consistent snapshot
+            self._row_by_code[code] = self._size
+            self._size += 1
+
+    def invalidate(self):
+        """Drop everything. The next search will trigger a fresh load()."""
+        with self._lock:
+            self._reset()
+
+    def attach_ann(self, ann: Optional[IVFIndex]):
+        """Route top_k through an approximate index built from snapshot() (None = exact only)."""
+        self.ann = ann
+
+    # ===== READ PATH =====
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def dim(self) -> Optional[int]:
+        return None if self._matrix is None else self._matrix.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the index (matrix capacity plus the ANN index, if any)."""
+        matrix, ann = self._matrix, self.ann
+        return (0 if matrix is None else matrix.nbytes) + (0 if ann is None else ann.nbytes)
+
+    def snapshot(self) -> Tuple[List[str], np.ndarray]:
+        """The codes and the (normalized) rows currently in the index."""
+        matrix, codes, size = self._matrix, self._codes, self._size
+        if matrix is None:
+            return [], np.zeros((0, 0), dtype=np.float32)
+        return list(codes[:size]), matrix[:size]
+
+    def top_k(self, query_embedding: Iterable[float], k: int = 5, exact: bool = False) -> List[Tuple[str, float]]:
+        """
+        Return the k most similar (code, cosine_similarity) pairs, best first.
+
+        Args:
+            query_embedding: The raw (not necessarily normalized) query vector.
+            k (int): How many results to return.
+            exact (bool): Always do the full scan, even if an approximate index is attached.
+        """
+        ann = self.ann
+        if ann is not None and not exact:
+            return ann.search(query_embedding, k)
+
+        # Take a snapshot so a concurrent upsert cannot change the shapes under us
+        matrix, codes, size = self._matrix, self._codes, self._size
+        if matrix is None or size == 0 or k <= 0:
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            # Same behaviour as cosine_similarity(): a zero vector matches nothing
+            return [(code, 0.0) for code in codes[: min(k, size)]]
+
+        # 1. One matrix-vector product scores every account
+        scores = matrix[:size] @ (query / norm)
+
+        # 2. Partial sort: only the top k need ordering
+        if k < size:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(size)
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        return [(codes[i], float(scores[i])) for i in top]
+
+    def score_codes(self, query_embedding: Iterable[float], codes: List[str]) -> List[float]:
+        """Exact cosine similarity of the query to each given code (0.0 for codes not in the index)."""
+        matrix, row_by_code = self._matrix, self._row_by_code
+        if matrix is None:
+            return [0.0] * len(codes)
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return [0.0] * len(codes)
+
+        rows = [row_by_code.get(code) for code in codes]
+        found = [i for i, row in enumerate(rows) if row is not None and row < matrix.shape[0]]
+        scores = [0.0] * len(codes)
+        if found:
+            values = matrix[[rows[i] for i in found]] @ (query / norm)
+            for i, value in zip(found, values.tolist()):
+                scores[i] = value
+        return scores
+
+    def top_k_batch(self, query_embeddings, k: int = 5) -> List[List[Tuple[str, float]]]:
+        """
+        Like top_k, but for many queries at once: one matrix-matrix product scores
+        every query against every account.
+
+        Args:
+            query_embeddings: A (n_queries, dim) array or list of vectors.
+            k (int): How many results to return per query.
+
+        Returns:
+            List[List[Tuple[str, float]]]: One best-first result list per query.
+        """
+        matrix, codes, size = self._matrix, self._codes, self._size
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries.reshape(1, -1)
+        if matrix is None or size == 0 or k <= 0:
+            return [[] for _ in range(queries.shape[0])]
+
+        # 1. (n_queries, dim) @ (dim, n_accounts) -> (n_queries, n_accounts)
+        scores = _normalize_rows(queries) @ matrix[:size].T
+
+        # 2. Partial sort along each row
+        k = min(k, size)
+        if k < size:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(size), (scores.shape[0], 1))
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        return [
+            [(codes[i], float(score)) for i, score in zip(row_idx, row_scores)]
+            for row_idx, row_scores in zip(top.tolist(), top_scores.tolist())
+        ]
+
+
+# ===== BINARY STORAGE FORMAT =====
+
+# Embeddings are stored as little-endian float32, whatever the host byte order is.
+EMBEDDING_DTYPE = np.dtype("<f4")
+
+
+def encode_embedding(embedding: Iterable[float]) -> bytes:
+    """Pack a vector into little-endian float32 bytes for the BLOB column."""
+    return np.asarray(embedding, dtype=EMBEDDING_DTYPE).tobytes()
+
+
+def decode_embedding(blob: bytes, dim: Optional[int] = None) -> np.ndarray:
+    """
+    View BLOB bytes as a float32 vector without copying them.
+
+    Args:
+        blob (bytes): The raw bytes from the embedding column.
+        dim (int): The expected number of dimensions (checked when given).
+
+    Returns:
+        np.ndarray: A read-only float32 array backed by the bytes buffer.
+    """
+    vector = np.frombuffer(blob, dtype=EMBEDDING_DTYPE)
+    if dim is not None and vector.shape[0] != dim:
+        raise ValueError(f"Embedding blob holds {vector.shape[0]} values, expected {dim}")
+    return vector
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Scale each row to unit length (zero rows stay zero)."""
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
@@ -0,0 +1,200 @@
+import re
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import bindparam, func, select, update
+
+import database
+from config import settings
+from orm_models import VendorAccountMemo
+from tenants import DEFAULT_TENANT
+
+
+# Legal-form words that should not make "Bell Canada Inc." and "BELL CANADA" different vendors
+VENDOR_SUFFIXES = {"inc", "incorporated", "ltd", "limited", "llc", "llp", "corp", "corporation", "co", "company", "ltee"}
+
+
+def normalize_vendor(vendor: str) -> str:
+    """Lower-case, drop punctuation and trailing legal-form words: 'Bell Canada Inc.' -> 'bell canada'."""
+    words = re.findall(r"[a-z0-9]+", vendor.casefold())
+    while len(words) > 1 and words[-1] in VENDOR_SUFFIXES:
+        words.pop()
+    return " ".join(words)
+
+
+class MemoEntry:
+    """One remembered vendor -> account mapping (in memory)."""
+
+    __slots__ = ("vendor", "code", "confirmations", "hits", "last_seen")
+
+    def __init__(self, vendor: str, code: str, confirmations: int, hits: int, last_seen: float):
+        self.vendor = vendor
+        self.code = code
+        self.confirmations = confirmations
+        self.hits = hits
+        self.last_seen = last_seen
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+class VendorMemo:
+    """
+    Vendor -> account mappings learned from confirmed classifications.
+
+    The whole vendor_account_memo table is held in a dict keyed by
+    (tenant_id, normalized vendor), loaded once (at API startup, or on the first
+    lookup), so checking a vendor costs one hash lookup.
+
+    confirm() writes through to SQLite immediately. Hit counts and last-seen times
+    from lookups are only counted in memory and written in one batch every
+    HIT_FLUSH_EVERY hits (and on flush(), e.g. at shutdown).
+    """
+
+    # Write accumulated hit counts to SQLite every N hits
+    HIT_FLUSH_EVERY = 100
+
+    def __init__(self, min_confirmations: int = 1):
+        self.min_confirmations = min_confirmations
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, str], MemoEntry] = {}
+        self._pending_hits: Dict[Tuple[str, str], int] = {}
+        self._ready_binds: set[int] = set()
+        self.is_loaded = False
+
+    # ===== PUBLIC API =====
+
+    def load(self):
+        """Read the whole table into memory (replaces what is there)."""
+        with database.ReadSessionLocal() as session:
+            self._ensure_table(session)
+            rows = session.execute(select(VendorAccountMemo)).scalars().all()
+            entries = {
+                (row.tenant_id, row.vendor_key): MemoEntry(
+                    row.vendor, row.code, row.confirmations, row.hits, row.last_seen,
+                )
+                for row in rows
+            }
+        with self._lock:
+            self._entries = entries
+            self._pending_hits = {}
+            self.is_loaded = True
+
+    def invalidate(self):
+        """Forget the in-memory copy (unflushed hit counts are dropped); the next lookup reloads."""
+        with self._lock:
+            self._entries = {}
+            self._pending_hits = {}
+            self.is_loaded = False
+
+    def lookup(self, vendor: Optional[str], tenant_id: str = DEFAULT_TENANT) -> Optional[MemoEntry]:
+        """
+        Return the remembered account for this vendor, or None.
+
+        Only mappings confirmed at least min_confirmations times are returned.
+        A returned mapping counts as a hit.
+        """
+        if not vendor:
+            return None
+        if not self.is_loaded:
+            self.load()
+
+        key = (tenant_id, normalize_vendor(vendor))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.confirmations < self.min_confirmations:
+                return None
+            entry.hits += 1
+            entry.last_seen = time.time()
+            self._pending_hits[key] = self._pending_hits.get(key, 0) + 1
+            run_flush = sum(self._pending_hits.values()) >= self.HIT_FLUSH_EVERY
+
+        if run_flush:
+            self.flush()
+        return entry
+
+    def confirm(self, vendor: str, code: str, tenant_id: str = DEFAULT_TENANT) -> MemoEntry:
+        """
+        Record that `vendor` was (manually) confirmed as account `code`.
+
+        Confirming the same account again bumps its confirmation count; confirming a
+        different account replaces the mapping and starts counting from 1.
+        """
+        vendor_key = normalize_vendor(vendor)
+        if not vendor_key:
+            raise ValueError(f"Vendor name {vendor!r} has no letters or digits")
+        if not self.is_loaded:
+            self.load()
+        now = time.time()
+
+        with database.SessionLocal() as session:
+            self._ensure_table(session)
+            row = session.get(VendorAccountMemo, (tenant_id, vendor_key))
+            if row is None:
+                row = VendorAccountMemo(
+                    tenant_id=tenant_id, vendor_key=vendor_key, vendor=vendor, code=code,
+                    confirmations=1, hits=0, created_at=now, last_seen=now,
+                )
+                session.add(row)
+            else:
+                row.confirmations = row.confirmations + 1 if row.code == code else 1
+                row.code = code
+                row.vendor = vendor
+                row.last_seen = now
+            session.commit()
+            entry = MemoEntry(row.vendor, row.code, row.confirmations, row.hits, row.last_seen)
+
+        with self._lock:
+            key = (tenant_id, vendor_key)
+            entry.hits += self._pending_hits.get(key, 0)  # not flushed yet
+            self._entries[key] = entry
+        return entry
+
+    def flush(self) -> int:
+        """
+        Write the hit counts and last-seen times gathered since the last flush.
+
+        Returns:
+            int: The number of vendors updated.
+        """
+        with self._lock:
+            pending, self._pending_hits = self._pending_hits, {}
+            params = [
+                {"t": tenant_id, "k": vendor_key, "delta": delta, "seen": self._entries[(tenant_id, vendor_key)].last_seen}
+                for (tenant_id, vendor_key), delta in pending.items()
+                if (tenant_id, vendor_key) in self._entries
+            ]
+        if not params:
+            return 0
+
+        table = VendorAccountMemo.__table__
+        stmt = (
+            update(table)
+            .where(table.c.tenant_id == bindparam("t"), table.c.vendor_key == bindparam("k"))
+            .values(
+                hits=table.c.hits + bindparam("delta"),
+                last_seen=func.max(table.c.last_seen, bindparam("seen")),
+            )
+        )
+        with database.SessionLocal() as session:
+            self._ensure_table(session)
+            session.connection().execute(stmt, params)
+            session.commit()
+        return len(params)
+
+    def stats(self) -> dict:
+        return {"vendors": len(self._entries), "pending_hits": sum(self._pending_hits.values())}
+
+    # ===== INTERNALS =====
+
+    def _ensure_table(self, session):
+        """Create the memo table on first use, so callers don't depend on init_db()."""
+        bind = session.get_bind()
+        if id(bind) not in self._ready_binds:
+            VendorAccountMemo.__table__.create(bind=bind, checkfirst=True)
+            self._ready_binds.add(id(bind))
+
+
+# One shared memo per process
+vendor_memo = VendorMemo(min_confirmations=settings.VENDOR_MEMO_MIN_CONFIRMATIONS)
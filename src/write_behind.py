@@ -0,0 +1,145 @@
+import asyncio
+import logging
+from typing import Any, Callable, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+# Queued after the last item by stop(); the flusher writes what is left and exits
+_STOP = object()
+
+
+class WriteBehindBuffer:
+    """
+    Collects items on the event loop and writes them in batches from a worker thread.
+
+    put() only appends to an asyncio.Queue, so a request never waits on SQLite
+    (or its fsync). A background task takes items off the queue and hands them to
+    `write_batch` (a plain, blocking function run via asyncio.to_thread) in one call,
+    as soon as either:
+        - batch_size items are waiting, or
+        - the oldest waiting item has waited flush_interval seconds.
+
+    The queue holds at most max_queue items. When it is full put() waits until
+    the writer has caught up - callers slow down instead of memory growing
+    without bound.
+
+    stop() writes everything queued before it and ends the task (call it on shutdown).
+    A batch whose write fails is logged and counted in `failed`, not retried.
+    """
+
+    def __init__(
+        self,
+        write_batch: Callable[[List[Any]], None],
+        max_queue: int = 10_000,
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+    ):
+        self.write_batch = write_batch
+        self.max_queue = max_queue
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Counters
+        self.queued = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_error: Optional[str] = None
+
+    # ===== LIFECYCLE =====
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        """Start the flusher task on the running event loop."""
+        if self.is_running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Write everything queued so far, then stop the flusher task."""
+        if not self.is_running:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    # ===== PRODUCERS =====
+
+    async def put(self, item: Any):
+        """Queue one item. Waits only while the queue is full."""
+        if not self.is_running:
+            raise RuntimeError("WriteBehindBuffer.put() called before start()")
+        await self._queue.put(item)
+        self.queued += 1
+
+    async def flush(self):
+        """Wait until every item queued so far has been written (or has failed)."""
+        if self.is_running:
+            await self._queue.join()
+
+    def stats(self) -> dict:
+        return {
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "queued": self.queued,
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches,
+            "last_error": self.last_error,
+        }
+
+    # ===== FLUSHER =====
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        queue = self._queue
+        stopping = False
+
+        while not stopping:
+            # 1. Block until there is something to write
+            item = await queue.get()
+            if item is _STOP:
+                queue.task_done()
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+
+            # 2. Fill the batch: take what is already queued, then wait for more until the deadline
+            while len(batch) < self.batch_size:
+                if queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    item = queue.get_nowait()
+                if item is _STOP:
+                    queue.task_done()
+                    stopping = True
+                    break
+                batch.append(item)
+
+            # 3. One write (one transaction) for the whole batch, off the event loop
+            await self._write(batch)
+            for _ in batch:
+                queue.task_done()
+
+    async def _write(self, batch: List[Any]):
+        try:
+            await asyncio.to_thread(self.write_batch, batch)
+        except Exception as exc:
+            self.failed += len(batch)
+            self.last_error = f"{type(exc).__name__}: {exc}"
+            logger.exception("write-behind batch of %d items failed", len(batch))
+        else:
+            self.written += len(batch)
+            self.batches += 1
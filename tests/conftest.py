@@ -7,9 +7,15 @@ sys.path.append(os.path.join(os.path.dirname(__file__), "../src"))
 
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 from orm_models import Base
 from config import settings
+from unittest.mock import MagicMock
 import database 
+import embeddings
+import upstream
+from embedding_cache import embedding_cache
+from vendor_memo import vendor_memo
 
 # Define the connection to the fake in-memory DB
 TEST_DATABASE_URL = "sqlite:///:memory:"
@@ -24,7 +30,11 @@ def test_db():
     """
     # --- SETUP ---
     # Create a new engine for the test (In-Memory)
-    test_engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
+    # StaticPool: one shared connection, so worker threads (graph nodes, asyncio.to_thread)
+    # see the same in-memory DB instead of each getting an empty one
+    test_engine = create_engine(
+        TEST_DATABASE_URL, connect_args={"check_same_thread": False}, poolclass=StaticPool,
+    )
     
     # Create the tables in RAM
     Base.metadata.create_all(bind=test_engine)
@@ -32,10 +42,18 @@ def test_db():
     # Create a session factory bound to this RAM engine
     TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=test_engine)
     
-    # MAGIC: We overwrite the 'SessionLocal' in the real database module
-    # Now, when insert_account() calls SessionLocal(), it gets OUR fake one!
-    original_session_maker = database.SessionLocal
+    # MAGIC: We overwrite the 'SessionLocal' (writer) and 'ReadSessionLocal' (reader)
+    # in the real database module. Now, when insert_account() calls SessionLocal(), it gets OUR fake one!
+    original_session_makers = (database.SessionLocal, database.ReadSessionLocal)
     database.SessionLocal = TestingSessionLocal
+    database.ReadSessionLocal = TestingSessionLocal
+    # ...and the engines, which init_db() (API startup) migrates through
+    original_engines = (database.engine, database.read_engine)
+    database.engine = database.read_engine = test_engine
+    
+    # The in-memory index/catalog/vendor memo may hold rows from the real DB - start empty
+    database.reset_caches()
+    vendor_memo.invalidate()
     
     # Create a session for the test to use
     session = TestingSessionLocal()
@@ -43,8 +61,56 @@ def test_db():
     yield session
     
     # --- TEARDOWN ---
+    # Entries the test cached go to the test DB, not the real one
+    embedding_cache.flush()
     session.close()
     Base.metadata.drop_all(bind=test_engine)
     
     # Restore the real engine so we don't break anything else
-    database.SessionLocal = original_session_maker
\ No newline at end of file
+    database.SessionLocal, database.ReadSessionLocal = original_session_makers
+    database.engine, database.read_engine = original_engines
+    database.reset_caches()
+    vendor_memo.invalidate()
+
+
+@pytest.fixture
+def openai_embeddings():
+    """
+    Install an OpenAI embedding provider whose API client is a MagicMock,
+    and yield that mock (set mock.embeddings.create.return_value / side_effect).
+    """
+    provider = embeddings.OpenAIEmbeddingProvider(model="text-embedding-3-small", api_key="test")
+    provider._client = MagicMock()
+    previous = embeddings.set_embedding_provider(provider)
+    embedding_cache.clear_memory()
+    embedding_cache.reset_stats()
+    
+    yield provider._client
+    
+    embeddings.set_embedding_provider(previous)
+    embedding_cache.clear_memory()
+
+
+@pytest.fixture
+def local_embeddings():
+    """Install the offline hashing embedder (small vectors, no network)."""
+    provider = embeddings.HashingEmbeddingProvider(dim=256)
+    previous = embeddings.set_embedding_provider(provider)
+    
+    yield provider
+    
+    embeddings.set_embedding_provider(previous)
+
+
+@pytest.fixture(autouse=True)
+def fast_upstream(monkeypatch):
+    """
+    Upstream retries back off in milliseconds, and every test starts with fresh buckets
+    and closed circuits.
+    """
+    monkeypatch.setattr(settings, "UPSTREAM_BACKOFF_BASE", 0.001)
+    upstream.reset_upstreams()
+    
+    yield
+    
+    upstream.reset_upstreams()
@@ -0,0 +1,35 @@
+import asyncio
+from unittest.mock import patch
+from models import AccountSuggestion
+from agent_graph import get_graph, run_batch, arun_batch, GraphState
+
+
+def _fake_suggestions(description, k, tenant_id="default"):
+    top = 0.9 if "lunch" in description else 0.5
+    return [
+        AccountSuggestion(code="5300", account_name="Meals", score=top, normalized_similarity=1.0, similarity=top),
+        AccountSuggestion(code="5100", account_name="Supplies", score=0.4, normalized_similarity=0.4 / top, similarity=0.4),
+    ]
+
+
+@patch("agent_graph.suggest_accounts", side_effect=_fake_suggestions)
+def test_graph_is_compiled_once_and_records_node_timings(mock_suggest):
+    assert get_graph() is get_graph()
+
+    state = get_graph().invoke(GraphState(description="client lunch"))
+    assert state["final_answer"].startswith("Meals with code 5300")
+    assert set(state["timings"]) == {"vendor_memo", "retriever", "confidence", "finalize"}
+    assert all(seconds >= 0 for seconds in state["timings"].values())
+
+
+@patch("agent_graph.suggest_accounts", side_effect=_fake_suggestions)
+def test_batch_sync_and_async_keep_input_order(mock_suggest):
+    descriptions = [f"item {i} lunch" for i in range(5)]
+
+    sync_states = run_batch(descriptions, max_concurrency=2)
+    async_states = asyncio.run(arun_batch([GraphState(description=d) for d in descriptions], max_concurrency=2))
+
+    for states in (sync_states, async_states):
+        assert [s["description"] for s in states] == descriptions
+        assert all("retriever" in s["timings"] for s in states)
+    assert mock_suggest.call_count == 10
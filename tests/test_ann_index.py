@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+import database
+from ann_index import IVFIndex, recall_at_k, matrix_fingerprint
+from vector_index import VectorIndex
+
+
+def _clustered_chart(n_rows=4000, dim=64, n_topics=40, seed=7):
+    """Synthetic embeddings that cluster by 'topic', like real account texts do."""
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((n_topics, dim))
+    rows = topics[rng.integers(0, n_topics, n_rows)] + 0.6 * rng.standard_normal((n_rows, dim))
+    rows = (rows / np.linalg.norm(rows, axis=1, keepdims=True)).astype(np.float32)
+    queries = topics[rng.integers(0, n_topics, 200)] + 0.6 * rng.standard_normal((200, dim))
+    return [str(i) for i in range(n_rows)], rows, queries.astype(np.float32)
+
+
+def test_recall_vs_exact_report(capsys):
+    """Recall@10 of the IVF index against the exact scan, for several nprobe settings."""
+    codes, rows, queries = _clustered_chart()
+    exact = VectorIndex()
+    exact.load(zip(codes, rows))
+    ann = IVFIndex.build(codes, rows, nlist=64)
+
+    truth = [[c for c, _ in exact.top_k(q, 10)] for q in queries]
+    report = {}
+    for nprobe in (1, 4, 8, 16, 64):
+        approx = [[c for c, _ in ann.search(q, 10, nprobe=nprobe)] for q in queries]
+        report[nprobe] = recall_at_k(truth, approx)
+
+    with capsys.disabled():
+        print("\nIVF recall@10 vs exact (4000 rows, nlist=64): "
+              + ", ".join(f"nprobe={p}: {r:.3f}" for p, r in report.items()))
+
+    assert report[64] == 1.0                      # probing every list is exact
+    assert report[8] >= 0.9
+    assert report[1] <= report[8] <= report[64]   # more probes never hurt
+
+
+def test_incremental_add_and_persistence(tmp_path):
+    codes, rows, _ = _clustered_chart(n_rows=500, dim=16)
+    ann = IVFIndex.build(codes, rows, nlist=8, fingerprint=matrix_fingerprint(codes, rows))
+
+    # Overwrite an existing code and add a new one: both must be found at once
+    target = np.zeros(16, dtype=np.float32)
+    target[0] = 1.0
+    ann.add("3", target)
+    ann.add("new", -target)
+    assert ann.search(target, k=1, nprobe=1) == [("3", 1.0)]
+    assert ann.search(-target, k=1, nprobe=1) == [("new", 1.0)]
+    assert [c for c, _ in ann.search(target, k=500, nprobe=8)].count("3") == 1
+
+    path = str(tmp_path / "index.npz")
+    ann.save(path)
+    loaded = IVFIndex.load(path)
+    assert loaded.fingerprint == ann.fingerprint
+    assert loaded.search(rows[10], k=1, nprobe=8)[0][0] == "10"
+
+
+def test_zero_query_scores_every_row_zero_like_the_exact_scan():
+    codes, rows, _ = _clustered_chart(n_rows=200, dim=16)
+    exact = VectorIndex()
+    exact.load(zip(codes, rows))
+    ann = IVFIndex.build(codes, rows, nlist=8)
+
+    zero = np.zeros(16, dtype=np.float32)
+    assert [score for _, score in ann.search(zero, 5)] == [score for _, score in exact.top_k(zero, 5)] == [0.0] * 5
+
+
+def test_empty_chart_keeps_the_exact_scan(tmp_path, monkeypatch):
+    with pytest.raises(ValueError):
+        IVFIndex.build([], np.zeros((0, 16), dtype=np.float32))
+
+    monkeypatch.setattr(database, "ann_index_path", lambda tenant_id: str(tmp_path / "index.npz"))
+    empty = VectorIndex()
+    assert database.load_or_build_ann_index(empty, force=True) is None
+    assert empty.top_k(np.ones(16, dtype=np.float32), k=3) == []
+
+    # A chart smaller than the requested nlist still builds, with one row per cluster
+    codes, rows, _ = _clustered_chart(n_rows=5, dim=16)
+    ann = IVFIndex.build(codes, rows, nlist=64)
+    assert ann.search(rows[2], k=1)[0][0] == "2"
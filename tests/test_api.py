@@ -0,0 +1,115 @@
+import httpx
+from fastapi.testclient import TestClient
+from api import app
+from client_landingai import AsyncLandingAIClient
+
+
+def _fake_landingai(request: httpx.Request) -> httpx.Response:
+    """Stand-in for the Landing AI API: parse returns markdown, extract returns an invoice."""
+    if request.url.path.endswith("/parse"):
+        assert b"%PDF-fake" in request.read()  # upload bytes forwarded as-is
+        return httpx.Response(200, json={"markdown": "# Invoice"})
+    return httpx.Response(200, json={"extraction": {
+        "vendor": "Bell", "invoice_date": "2024-01-31", "total_amount": 113.0,
+        "currency": "CAD", "tax": 13.0, "lines": [{"description": "Internet", "amount": 100.0}],
+    }})
+
+
+def test_classify_invoice_uses_shared_async_client(test_db):
+    with TestClient(app) as client:
+        # Swap the pooled client made in lifespan for one with a fake transport
+        connections = []
+        transport = httpx.MockTransport(lambda r: connections.append(r) or _fake_landingai(r))
+        app.state.landingai = AsyncLandingAIClient(http=httpx.AsyncClient(transport=transport), api_key="k")
+
+        for _ in range(2):
+            response = client.post("/classify-invoice", files={"file": ("inv.pdf", b"%PDF-fake", "application/pdf")})
+            assert response.status_code == 200
+            assert response.json()["invoice"]["vendor"] == "Bell"
+
+        assert len(connections) == 4  # parse + extract per request, same client
+        assert connections[0].headers["Authorization"] == "Bearer k"
+
+
+def test_classify_invoices_batch_isolates_failures(monkeypatch, test_db):
+    import io
+    import zipfile
+    import pipeline
+
+    # Skip embeddings/search - the graph stage just echoes the description
+    async def fake_graph(graph, description, tenant_id="default", vendor=None):
+        return {"suggestions": [], "confidence": "high", "final_answer": description}
+    monkeypatch.setattr(pipeline, "run_suggestion_graph", fake_graph)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/parse") and b"broken" in request.read():
+            return httpx.Response(500, json={"error": "boom"})
+        return _fake_landingai_any(request)
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("a.pdf", b"%PDF-fake a")
+        zf.writestr("notes.txt", b"ignored")
+        zf.writestr("b.pdf", b"%PDF-fake broken")
+
+    with TestClient(app) as client:
+        app.state.landingai = AsyncLandingAIClient(
+            http=httpx.AsyncClient(transport=httpx.MockTransport(handler)), api_key="k",
+        )
+        response = client.post("/classify-invoices", files=[
+            ("files", ("one.pdf", b"%PDF-fake 1", "application/pdf")),
+            ("files", ("batch.zip", archive.getvalue(), "application/zip")),
+        ])
+
+    body = response.json()
+    assert response.status_code == 200
+    assert (body["count"], body["failed"]) == (3, 1)
+
+    ok, from_zip, broken = body["results"]
+    assert ok["filename"] == "one.pdf" and ok["status"] == "ok"
+    assert set(ok["timings"]) == {"parse", "extract", "describe", "suggest"}
+    assert from_zip["filename"] == "a.pdf" and from_zip["final_answer"].startswith("Invoice from Bell")
+    assert broken["status"] == "error" and broken["failed_stage"] == "parse"
+
+    # Documents that made it through are stored (the lifespan shutdown flushed the buffer)
+    from classification_log import get_classification
+    assert get_classification(ok["classification_id"])["filename"] == "one.pdf"
+    assert broken["classification_id"] is None
+
+
+def _fake_landingai_any(request: httpx.Request) -> httpx.Response:
+    """Like _fake_landingai but accepts any uploaded document."""
+    if request.url.path.endswith("/parse"):
+        return httpx.Response(200, json={"markdown": "# Invoice"})
+    return _fake_landingai(request)
+
+
+def test_classify_invoice_is_recorded(test_db, local_embeddings):
+    import database
+    from classification_log import get_classification
+    from models import Account
+
+    for code, name in [("5400", "Internet"), ("5280", "Rent")]:
+        account = Account(
+            code=code, account_name=name, financial_stat="Income Statement",
+            group_name="Expenses", normally="Debit", description=name,
+        )
+        database.insert_account(account)
+        database.insert_account_embedding(code, local_embeddings.embed([name])[0])
+
+    with TestClient(app) as client:
+        app.state.landingai = AsyncLandingAIClient(
+            http=httpx.AsyncClient(transport=httpx.MockTransport(_fake_landingai_any)), api_key="k",
+        )
+        response = client.post(
+            "/classify-invoice?per_line=true",
+            files={"file": ("inv.pdf", b"%PDF-fake", "application/pdf")},
+        )
+        classification_id = response.json()["classification_id"]
+    # Leaving the client runs the lifespan shutdown, which drains the buffer
+
+    stored = get_classification(classification_id)
+    assert (stored["vendor"], stored["filename"], stored["total_amount"]) == ("Bell", "inv.pdf", 113.0)
+    assert [(line["line_no"], line["description"]) for line in stored["lines"]] == [(0, "Internet")]
+    assert stored["suggestions"][0]["line_no"] == 0
+    assert stored["suggestions"][0]["code"] == "5400"
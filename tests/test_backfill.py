@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+from models import Account
+from database import insert_account, get_embedding_fingerprints
+from backfill import backfill_account_embeddings
+from embeddings import HashingEmbeddingProvider
+
+
+def _fake_embeddings(model, input):
+    """Pretend OpenAI: one 2-dim vector per input text, tagged with its index."""
+    return SimpleNamespace(data=[
+        SimpleNamespace(index=i, embedding=[float(len(text)), 1.0]) for i, text in enumerate(input)
+    ])
+
+
+def _account(code: str, description: str) -> Account:
+    return Account(
+        code=code,
+        account_name=f"Account {code}",
+        financial_stat="P&L",
+        group_name="Expenses",
+        normally="Debit",
+        description=description,
+    )
+
+
+def test_backfill_only_embeds_changed_accounts(openai_embeddings, test_db):
+    mock_openai = openai_embeddings
+    mock_openai.embeddings.create.side_effect = _fake_embeddings
+    for code in ("5000", "5100", "5200"):
+        insert_account(_account(code, "Office supplies"))
+
+    # 1. First run embeds everything, two per request
+    report = backfill_account_embeddings(batch_size=2, max_concurrency=2)
+    assert (report.embedded, report.unchanged, report.requests) == (3, 0, 2)
+    assert set(get_embedding_fingerprints()) == {"5000", "5100", "5200"}
+
+    # 2. Nothing changed -> no API calls at all
+    mock_openai.embeddings.create.reset_mock()
+    report = backfill_account_embeddings(batch_size=2)
+    assert (report.embedded, report.unchanged) == (0, 3)
+    mock_openai.embeddings.create.assert_not_called()
+
+    # 3. One description edited -> only that account is re-embedded
+    insert_account(_account("5100", "Software subscriptions"))
+    report = backfill_account_embeddings(batch_size=2)
+    assert report.embedded == 1
+    assert mock_openai.embeddings.create.call_args.kwargs["input"][0].endswith("Software subscriptions")
+
+    # 4. Switching provider/model re-embeds everything
+    report = backfill_account_embeddings(batch_size=10, provider=HashingEmbeddingProvider(dim=8))
+    assert (report.embedded, report.requests) == (3, 1)
+    assert {model for _, model in get_embedding_fingerprints().values()} == {"local-hashing-8"}
@@ -27,4 +27,88 @@ def test_insert_and_retrieve_account(test_db):
     
     assert retrieved is not None
     assert retrieved.account_name == "Test Account"
-    assert retrieved.code == "9999"
\ No newline at end of file
+    assert retrieved.code == "9999"
+
+def test_migrate_legacy_json_embeddings(tmp_path, monkeypatch):
+    """An old DB with JSON vectors is converted to float32 BLOBs in place."""
+    import json
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.orm import sessionmaker
+    import database
+
+    # 1. Build a DB with the old schema
+    legacy_engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with legacy_engine.begin() as conn:
+        conn.execute(text("CREATE TABLE account_embeddings (code VARCHAR NOT NULL PRIMARY KEY, embedding JSON NOT NULL)"))
+        conn.execute(
+            text("INSERT INTO account_embeddings VALUES (:code, :emb)"),
+            [{"code": "1000", "emb": json.dumps([0.5, -0.25, 1.0])}],
+        )
+    monkeypatch.setattr(database, "engine", legacy_engine)
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=legacy_engine))
+    monkeypatch.setattr(database, "ReadSessionLocal", sessionmaker(bind=legacy_engine))
+    database.reset_caches()
+
+    # 2. Migrate (twice - the second call must be a no-op)
+    database.init_db()
+    assert database.migrate_legacy_embeddings() == 0
+
+    # 3. The vector comes back intact from the binary column
+    [(code, vector)] = database.load_all_account_embeddings()
+    assert code == "1000"
+    assert vector.tolist() == [0.5, -0.25, 1.0]
+    database.reset_caches()
+
+
+def test_import_coa_from_csv_bulk_upsert(test_db, tmp_path):
+    """The chunked import writes every row, updates on re-import, and can prune."""
+    from setup import import_coa_from_csv
+    from database import get_all_accounts
+
+    header = "Account Name,Code,Financial Statement,Group,Normally,Description\n"
+    rows = "".join(f"Account {i},{1000 + i},P&L,Expenses,Debit,Row {i}\n" for i in range(7))
+    csv_path = tmp_path / "coa.csv"
+    csv_path.write_text(header + rows, encoding="utf-8")
+
+    # 7 rows in chunks of 3 -> 3 transactions
+    assert import_coa_from_csv(str(csv_path), chunk_size=3) == 7
+    assert len(get_all_accounts()) == 7
+
+    # Re-import with an edited description and one row dropped
+    rows = rows.replace("Row 0", "Edited").rsplit("Account 6", 1)[0]
+    csv_path.write_text(header + rows, encoding="utf-8")
+    assert import_coa_from_csv(str(csv_path), chunk_size=3, prune=True) == 6
+
+    assert get_account_by_code("1000").description == "Edited"
+    assert get_account_by_code("1006") is None
+
+
+def test_old_suggestion_rows_keep_their_score_and_lose_non_cosine_similarity(tmp_path, monkeypatch):
+    """invoice_suggestions from before 'score' existed is rebuilt on first use."""
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.orm import sessionmaker
+    import classification_log
+    import database
+
+    # 1. The old layout: the ranking score of every source in a NOT NULL 'similarity'
+    old_engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with old_engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE invoice_suggestions (id INTEGER PRIMARY KEY, invoice_id VARCHAR, line_no INTEGER, "
+            "rank INTEGER NOT NULL, code VARCHAR NOT NULL, account_name VARCHAR NOT NULL, "
+            "similarity FLOAT NOT NULL, normalized_similarity FLOAT NOT NULL, source VARCHAR NOT NULL)"
+        ))
+        conn.execute(text("CREATE INDEX ix_invoice_suggestions_invoice_id ON invoice_suggestions (invoice_id)"))
+        conn.execute(text(
+            "INSERT INTO invoice_suggestions (invoice_id, rank, code, account_name, similarity, normalized_similarity, source) "
+            "VALUES ('inv', 0, '5360', 'Postage', 1.0, 1.0, 'lexical'), ('inv', 1, '5200', 'Payroll', 0.7, 0.7, 'vector')"
+        ))
+    monkeypatch.setattr(database, "ReadSessionLocal", sessionmaker(bind=old_engine))
+
+    # 2. First read upgrades the table in place
+    with database.ReadSessionLocal() as session:
+        classification_log._ensure_tables(session)
+    with old_engine.connect() as conn:
+        rows = conn.execute(text("SELECT code, score, similarity FROM invoice_suggestions ORDER BY rank")).all()
+    assert [tuple(row) for row in rows] == [("5360", 1.0, None), ("5200", 0.7, 0.7)]
+    classification_log._ready_binds.discard(id(old_engine))
@@ -0,0 +1,57 @@
+import asyncio
+import os
+import time
+import httpx
+from document_cache import DocumentCache, extract_key
+from client_landingai import AsyncLandingAIClient
+
+
+def test_repeat_upload_is_served_from_cache(tmp_path):
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        if request.url.path.endswith("/parse"):
+            return httpx.Response(200, json={"markdown": "# Invoice"})
+        return httpx.Response(200, json={"extraction": {"vendor": "Bell"}})
+
+    client = AsyncLandingAIClient(
+        http=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        api_key="k",
+        cache=DocumentCache(str(tmp_path), max_bytes=1024 * 1024),
+    )
+
+    async def run(use_cache=True):
+        markdown = await client.ade_parse(b"%PDF same bytes", use_cache=use_cache)
+        return await client.ade_extract(markdown, use_cache=use_cache)
+
+    assert asyncio.run(run()) == {"extraction": {"vendor": "Bell"}}
+    assert asyncio.run(run()) == {"extraction": {"vendor": "Bell"}}
+    assert len(calls) == 2  # second run never reached the API
+
+    # Bypass flag always calls upstream
+    asyncio.run(run(use_cache=False))
+    assert len(calls) == 4
+
+    # A schema change is a different extract key
+    schema = dict(client.invoice_schema, required=["vendor"])
+    assert extract_key("# Invoice", schema, "extract-latest") != client._extract_key("# Invoice")
+
+
+def test_size_eviction_drops_least_recently_used(tmp_path):
+    cache = DocumentCache(str(tmp_path), max_bytes=2500)
+    payload = "x" * 1000  # ~1 KB per entry once JSON-encoded
+
+    cache.put("parse", "aa01", payload)
+    cache.put("parse", "bb02", payload)
+    # Make aa01 the oldest, then touch it so bb02 becomes least recently used
+    old = time.time() - 100
+    os.utime(cache._path("parse", "aa01"), (old, old))
+    os.utime(cache._path("parse", "bb02"), (old + 1, old + 1))
+    assert cache.get("parse", "aa01") == payload
+
+    cache.put("parse", "cc03", payload)  # over budget -> evict
+
+    assert cache.get("parse", "bb02") is None
+    assert cache.get("parse", "aa01") == payload
+    assert cache.get("parse", "cc03") == payload
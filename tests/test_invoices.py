@@ -0,0 +1,48 @@
+from unittest.mock import patch
+from models import Account, Invoice, InvoiceLine
+from database import insert_account, insert_account_embedding
+from invoices import classify_invoice_lines
+
+
+ACCOUNTS = {
+    "5100": ("Office Supplies", [1.0, 0.0, 0.0]),
+    "5200": ("Software", [0.0, 1.0, 0.0]),
+    "5300": ("Meals", [0.0, 0.0, 1.0]),
+}
+
+# Fake embeddings keyed on a word in each text; the header points nowhere in particular
+VECTORS = {"paper": [1.0, 0.1, 0.0], "licence": [0.1, 1.0, 0.0], "lunch": [0.0, 0.1, 1.0], "Invoice": [0.3, 0.3, 0.3]}
+
+
+def _fake_embed_texts(texts):
+    return [next(v for word, v in VECTORS.items() if word in text) for text in texts]
+
+
+@patch("invoices.embed_texts", side_effect=_fake_embed_texts)
+def test_classify_invoice_lines_per_line_and_weighted(mock_embed, test_db):
+    for code, (name, vec) in ACCOUNTS.items():
+        insert_account(Account(
+            code=code, account_name=name, financial_stat="P&L",
+            group_name="Expenses", normally="Debit", description=name,
+        ))
+        insert_account_embedding(code, vec)
+
+    invoice = Invoice(
+        vendor="Staples", invoice_date="2024-03-01", total_amount=600.0, currency="CAD", tax=0.0,
+        lines=[
+            InvoiceLine(description="Copy paper", amount=100.0),
+            InvoiceLine(description="Accounting licence", amount=450.0),
+            InvoiceLine(description="Team lunch", amount=50.0),
+        ],
+    )
+    result = classify_invoice_lines(invoice, k=2)
+
+    # One batched embedding call: 3 lines + header
+    mock_embed.assert_called_once()
+    assert len(mock_embed.call_args.args[0]) == 4
+
+    assert [line.suggestions[0].code for line in result.lines] == ["5100", "5200", "5300"]
+    assert all(len(line.suggestions) == 2 for line in result.lines)
+
+    # Allocations are ordered by amount
+    assert [(a.code, a.amount) for a in result.allocations[:3]] == [("5200", 450.0), ("5100", 100.0), ("5300", 50.0)]
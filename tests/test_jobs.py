@@ -0,0 +1,156 @@
+import asyncio
+import io
+import os
+import time
+
+import httpx
+
+import database
+import jobs
+from client_landingai import AsyncLandingAIClient
+from config import settings
+from job_worker import JobWorker
+from models import Account
+
+
+def _fake_landingai(request: httpx.Request) -> httpx.Response:
+    if request.url.path.endswith("/parse"):
+        return httpx.Response(200, json={"markdown": "# Invoice"})
+    return httpx.Response(200, json={"extraction": {
+        "vendor": "Bell", "invoice_date": "2024-01-31", "total_amount": 113.0,
+        "currency": "CAD", "tax": 13.0, "lines": [{"description": "Internet", "amount": 100.0}],
+    }})
+
+
+def test_submit_then_long_poll_for_the_worker_result(monkeypatch, tmp_path, test_db, local_embeddings):
+    from api import app
+    from classification_log import get_classification
+
+    monkeypatch.setattr(settings, "JOBS_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "JOB_POLL_INTERVAL", 0.02)
+    database.insert_account(Account(
+        code="5400", account_name="Internet", financial_stat="Income Statement",
+        group_name="Expenses", normally="Debit", description="Internet",
+    ))
+    database.insert_account_embedding("5400", local_embeddings.embed(["Internet"])[0])
+
+    worker = JobWorker(
+        "test-worker",
+        AsyncLandingAIClient(http=httpx.AsyncClient(transport=httpx.MockTransport(_fake_landingai)), api_key="k"),
+        concurrency=1,
+    )
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            # 1. Submit returns at once with an id; the upload waits in JOBS_DIR
+            response = await client.post(
+                "/jobs", params={"per_line": "true"},
+                files={"file": ("inv.pdf", b"%PDF-fake", "application/pdf")},
+            )
+            assert response.status_code == 202
+            job_id = response.json()["job_id"]
+            assert (await client.get(f"/jobs/{job_id}")).json()["status"] == "queued"
+            assert os.listdir(tmp_path) == [f"{job_id}.upload"]
+
+            # 2. A long-poll started before the worker runs returns once it is done
+            poll = asyncio.create_task(client.get(f"/jobs/{job_id}", params={"wait": 5}))
+            await asyncio.sleep(0.05)
+            assert not poll.done()
+            start = time.perf_counter()
+            assert await worker.run_once()
+            response = await asyncio.wait_for(poll, 5)
+            assert time.perf_counter() - start < 1
+
+            assert (await client.get("/jobs/unknown")).status_code == 404
+            assert (await client.get(f"/jobs/{job_id}", params={"wait": 10_000})).status_code == 400
+            return response.json()
+
+    job = asyncio.run(scenario())
+
+    assert job["status"] == "done" and job["attempts"] == 1
+    assert job["result"]["invoice"]["vendor"] == "Bell"
+    assert job["result"]["line_classification"]["lines"][0]["suggestions"][0]["code"] == "5400"
+    assert "document_path" not in job
+    assert get_classification(job["result"]["classification_id"])["filename"] == "inv.pdf"
+    assert os.listdir(tmp_path) == []  # the upload is deleted with the job done
+
+
+def test_expired_lease_is_reclaimed_until_attempts_run_out(monkeypatch, tmp_path, test_db):
+    monkeypatch.setattr(settings, "JOBS_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "JOB_MAX_ATTEMPTS", 2)
+    job = jobs.create_job(io.BytesIO(b"%PDF-fake"), "inv.pdf")
+
+    # 1. Worker A claims the job and "crashes" (never renews or finishes)
+    claimed = jobs.claim_job("A", visibility_timeout=0.05)
+    assert (claimed.id, claimed.attempts) == (job.id, 1)
+    assert jobs.claim_job("B", visibility_timeout=0.05) is None  # invisible while the lease holds
+
+    # 2. Once the lease is out, B gets it; A can no longer renew or finish it
+    time.sleep(0.06)
+    reclaimed = jobs.claim_job("B", visibility_timeout=0.05)
+    assert (reclaimed.id, reclaimed.attempts) == (job.id, 2)
+    assert not jobs.renew_lease(job.id, "A")
+    assert not jobs.finish_job(claimed, "A", result={"stale": True})
+
+    # 3. B dies too: out of attempts, the job is failed instead of handed out again
+    time.sleep(0.06)
+    assert jobs.claim_job("C") is None
+    failed = jobs.get_job(job.id)
+    assert failed.status == "failed" and failed.error.startswith("Abandoned")
+    assert failed.result is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_upstream_outages_requeue_the_job_instead_of_failing_it(monkeypatch, tmp_path, test_db, local_embeddings):
+    monkeypatch.setattr(settings, "JOBS_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "JOB_RETRY_DELAY", 0.01)
+    monkeypatch.setattr(settings, "UPSTREAM_MAX_RETRIES", 0)
+    monkeypatch.setattr(settings, "UPSTREAM_BREAKER_FAILURES", 1)
+    monkeypatch.setattr(settings, "UPSTREAM_BREAKER_RESET", 0.3)
+    monkeypatch.setattr(settings, "RESULTS_PERSIST_ENABLED", False)
+    database.insert_account(Account(
+        code="5400", account_name="Internet", financial_stat="Income Statement",
+        group_name="Expenses", normally="Debit", description="Internet",
+    ))
+    database.insert_account_embedding("5400", local_embeddings.embed(["Internet"])[0])
+
+    down = [True]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if down[0]:
+            return httpx.Response(503, json={"error": "down"})
+        return _fake_landingai(request)
+
+    client = AsyncLandingAIClient(http=httpx.AsyncClient(transport=httpx.MockTransport(handler)), api_key="k")
+    sent = []
+    parse = client.ade_parse
+    monkeypatch.setattr(client, "ade_parse", lambda document, **kwargs: sent.append(document) or parse(document, **kwargs))
+    worker = JobWorker("test-worker", client, concurrency=1)
+    job = jobs.create_job(io.BytesIO(b"%PDF-fake"), "inv.pdf")
+
+    # 1. A 503 after the retries: back on the queue, upload kept, attempt not counted
+    assert asyncio.run(worker.run_once())
+    waiting = jobs.get_job(job.id)
+    assert (waiting.status, waiting.attempts, waiting.requeues) == ("queued", 0, 1)
+    assert "503" in waiting.error
+    assert os.listdir(tmp_path) == [f"{job.id}.upload"]
+    assert not isinstance(sent[0], bytes)  # streamed from the spooled file
+
+    # 2. The circuit is open now: requeued again, for as long as the breaker stays open
+    time.sleep(0.02)
+    assert asyncio.run(worker.run_once())
+    waiting = jobs.get_job(job.id)
+    assert (waiting.status, waiting.requeues) == ("queued", 2)
+    assert "CircuitOpenError" in waiting.error
+    assert waiting.lease_expires_at - time.time() > 0.2
+    assert jobs.claim_job("other") is None  # invisible until then
+
+    # 3. Landing AI is back: the same job completes
+    down[0] = False
+    time.sleep(waiting.lease_expires_at - time.time() + 0.05)
+    assert asyncio.run(worker.run_once())
+    done = jobs.get_job(job.id)
+    assert (done.status, done.attempts, done.error) == ("done", 1, None)
+    assert done.result["invoice"]["vendor"] == "Bell"
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,86 @@
+from unittest.mock import patch
+
+import database
+from lexical_index import LexicalIndex, tokenize, is_decisive, fuse_scores
+from models import Account
+
+
+def _add(code, name, description, vec):
+    database.insert_account(Account(
+        code=code, account_name=name, financial_stat="Income Statement",
+        group_name="Expenses", normally="Debit", description=description,
+    ))
+    database.insert_account_embedding(code, vec)
+
+
+def test_bm25_ranks_rare_terms_and_tracks_updates():
+    assert tokenize("Interac e-Transfers, GST/HST") == ["interac", "transfer", "gst", "hst"]
+
+    index = LexicalIndex()
+    index.load([
+        ("5360", "Postage & carriage. Canada Post postage, courier services"),
+        ("5200", "Payroll. Employee wages and salaries"),
+        ("5220", "Payroll expenses. Payroll processing charges and agency fees"),
+    ])
+    assert index.search("Canada Post postage", k=3)[0][0] == "5360"
+    assert [code for code, _ in index.search("payroll processing", k=3)][:1] == ["5220"]
+    assert index.search("nothing in common", k=3) == []
+
+    # Replacing an account's text moves its postings
+    index.upsert("5360", "Shipping. Freight")
+    assert index.search("postage", k=3) == []
+    assert index.search("freight", k=3)[0][0] == "5360"
+
+
+def test_decisive_and_fusion_rules():
+    assert is_decisive([("a", 9.0), ("b", 3.0)], min_score=4.0, margin=0.5)
+    assert not is_decisive([("a", 9.0), ("b", 6.0)], min_score=4.0, margin=0.5)   # runner-up too close
+    assert not is_decisive([("a", 3.0)], min_score=4.0, margin=0.5)               # too weak
+
+    # 'b' only has a keyword hit; its cosine is looked up and the keyword bonus lifts it over 'a'
+    fused = fuse_scores(
+        vector_hits=[("a", 0.50), ("c", 0.40)],
+        lexical_hits=[("b", 6.0)],
+        cosine_for=lambda codes: [0.45 for _ in codes],
+        weight=0.1,
+        k=2,
+    )
+    assert [code for code, _ in fused] == ["b", "a"]
+    assert abs(fused[0][1] - 0.55) < 1e-9
+
+
+@patch("query.embed_text")
+def test_suggest_accounts_skips_embedding_on_a_clear_keyword_match(mock_embed, test_db, monkeypatch):
+    from query import suggest_accounts, retrieve_top_k_accounts
+    from config import settings
+
+    # BM25 scores are small on a 4-account chart - lower the bar accordingly
+    monkeypatch.setattr(settings, "LEXICAL_FAST_PATH_MIN_SCORE", 1.0)
+
+    _add("5360", "Postage & carriage", "Canada Post postage, courier and delivery charges", [1.0, 0.0, 0.0])
+    _add("5200", "Payroll", "Employee wages and salaries", [0.0, 1.0, 0.0])
+    _add("5230", "Payroll benefits", "Employee health insurance", [0.0, 0.9, 0.1])
+    _add("5280", "Rent", "Monthly lease payments for the office", [0.0, 0.0, 1.0])
+    mock_embed.return_value = [0.0, 1.0, 0.0]
+
+    # 1. Decisive keyword hit: no embedding call at all
+    suggestions = suggest_accounts("Canada Post postage", k=2)
+    assert suggestions[0].code == "5360"
+    assert suggestions[0].source == "lexical"
+    assert (suggestions[0].score, suggestions[0].similarity) == (1.0, None)  # ranked by bm25, nothing embedded
+    mock_embed.assert_not_called()
+
+    # 2. Ambiguous keyword hit ("employee" is in two accounts): embed and fuse
+    results = retrieve_top_k_accounts("employee payroll", k=2)
+    assert mock_embed.call_count == 1
+    assert [r["code"] for r in results] == ["5200", "5230"]
+    assert results[0]["source"] == "hybrid"
+    assert abs(results[0]["similarity"] - 1.0) < 1e-6  # still the plain cosine...
+    assert results[0]["score"] > results[0]["similarity"]  # ...the keyword bonus only goes into the score
+
+    # 3. No keyword hit at all: plain vector search
+    assert suggest_accounts("zzz", k=1)[0].source == "vector"
+
+    # New accounts are searchable by keyword without a reload
+    _add("5400", "Telephone", "Mobile phone plans", [0.5, 0.5, 0.0])
+    assert suggest_accounts("mobile phone plans", k=1)[0].code == "5400"
@@ -0,0 +1,75 @@
+import httpx
+from fastapi.testclient import TestClient
+
+import database
+import metrics
+from metrics import Registry
+from models import Account
+
+
+def test_prometheus_text_format():
+    registry = Registry()
+    requests = registry.counter("test_requests_total", "Requests.", ["status"])
+    latency = registry.histogram("test_latency_seconds", "Latency.", ["op"], buckets=(0.1, 1.0))
+
+    requests.inc(status=200)
+    requests.inc(2, status='we"ird')
+    for value in (0.05, 0.5, 0.5, 3.0):
+        latency.observe(value, op="parse")
+
+    text = registry.render()
+    assert "# TYPE test_requests_total counter" in text
+    assert 'test_requests_total{status="200"} 1' in text
+    assert 'test_requests_total{status="we\\"ird"} 2' in text
+    # Buckets are cumulative and end with +Inf == count
+    assert 'test_latency_seconds_bucket{op="parse",le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{op="parse",le="1"} 3' in text
+    assert 'test_latency_seconds_bucket{op="parse",le="+Inf"} 4' in text
+    assert 'test_latency_seconds_count{op="parse"} 4' in text
+    assert 'test_latency_seconds_sum{op="parse"} 4.05' in text
+
+
+def test_metrics_endpoint_covers_the_request_path(test_db, local_embeddings):
+    from api import app
+    from agent_graph import get_graph, GraphState
+    from client_landingai import AsyncLandingAIClient
+
+    for code, name in [("5400", "Internet"), ("5280", "Rent")]:
+        database.insert_account(Account(
+            code=code, account_name=name, financial_stat="Income Statement",
+            group_name="Expenses", normally="Debit", description=name,
+        ))
+        database.insert_account_embedding(code, local_embeddings.embed([name])[0])
+
+    ops = metrics.OPERATION_SECONDS
+    before = {op: ops.count(operation=op) for op in ("ade_parse", "embed_text", "find_top_k_account_codes")}
+    parse_200 = metrics.UPSTREAM_RESPONSES.value(service="landingai", endpoint="parse", status=200)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/parse"):
+            return httpx.Response(200, json={"markdown": "# Invoice"})
+        return httpx.Response(503, json={"error": "busy"})
+
+    # extract fails upstream -> the request 500s, but the 503 is still counted
+    with TestClient(app, raise_server_exceptions=False) as client:
+        app.state.landingai = AsyncLandingAIClient(
+            http=httpx.AsyncClient(transport=httpx.MockTransport(handler)), api_key="k",
+        )
+        client.post("/classify-invoice", files={"file": ("inv.pdf", b"%PDF-fake", "application/pdf")})
+        get_graph().invoke(GraphState(description="zzz monthly internet"))
+
+        response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+
+    assert ops.count(operation="ade_parse") == before["ade_parse"] + 1
+    assert ops.count(operation="embed_text") > before["embed_text"]
+    assert ops.count(operation="find_top_k_account_codes") > before["find_top_k_account_codes"]
+    assert metrics.UPSTREAM_RESPONSES.value(service="landingai", endpoint="parse", status=200) == parse_200 + 1
+    assert 'bookkeeper_upstream_responses_total{service="landingai",endpoint="extract",status="503"}' in text
+    assert 'bookkeeper_graph_node_seconds_count{node="retriever"}' in text
+    assert 'bookkeeper_operation_seconds_count{operation="load_all_account_embeddings"}' in text
+    assert 'bookkeeper_db_query_seconds_count{statement="SELECT"}' in text
+    assert 'bookkeeper_cache_hit_ratio{cache="embedding"}' in text
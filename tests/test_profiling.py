@@ -0,0 +1,71 @@
+import asyncio
+import threading
+import time
+
+import httpx
+
+from config import settings
+from profiling import SamplingSession
+
+
+def _spin_for_profiler(stop: threading.Event):
+    while not stop.is_set():
+        sum(i * i for i in range(1000))
+
+
+def test_sampling_sees_worker_threads():
+    stop = threading.Event()
+    worker = threading.Thread(target=_spin_for_profiler, args=(stop,))
+    worker.start()
+
+    session = SamplingSession(interval=0.001)
+    session.start()
+    time.sleep(0.1)
+    session.stop()
+    stop.set()
+    worker.join()
+
+    report = session.report()
+    assert session.samples > 10
+    assert "_spin_for_profiler (test_profiling.py:" in report
+    # collapsed format: root;...;leaf <count>
+    stack, count = report.splitlines()[0].rsplit(" ", 1)
+    assert int(count) > 0 and ";" in stack
+
+
+def test_profile_endpoint_is_admin_only_and_stops_after_n_requests(monkeypatch):
+    from api import app
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            # 1. No token configured: the endpoint does not exist
+            monkeypatch.setattr(settings, "ADMIN_TOKEN", None)
+            assert (await client.post("/admin/profile")).status_code == 404
+
+            monkeypatch.setattr(settings, "ADMIN_TOKEN", "s3cret")
+            assert (await client.post("/admin/profile", headers={"X-Admin-Token": "nope"})).status_code == 403
+
+            # 2. Profile the next 3 requests (the time limit is far away)
+            headers = {"X-Admin-Token": "s3cret"}
+            start = time.perf_counter()
+            profiling = asyncio.create_task(client.post(
+                "/admin/profile", params={"mode": "deterministic", "requests": 3, "seconds": 30, "limit": 500}, headers=headers,
+            ))
+            await asyncio.sleep(0.05)
+
+            # Only one session at a time
+            busy = await client.post("/admin/profile", params={"seconds": 1}, headers=headers)
+            assert busy.status_code == 409
+
+            for _ in range(3):
+                assert (await client.get("/health")).status_code == 200
+            response = await asyncio.wait_for(profiling, 5)
+
+        assert time.perf_counter() - start < 5
+        assert response.status_code == 200
+        assert response.text.startswith("# 3 requests profiled")
+        assert "function calls" in response.text
+        assert "routing.py" in response.text  # the request handling on the event loop
+
+    asyncio.run(scenario())
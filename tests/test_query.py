@@ -1,11 +1,12 @@
 from unittest.mock import patch
 from src.query import embed_text
 from types import SimpleNamespace
+from embedding_cache import embedding_cache
 
-@patch("src.query.client")
-def test_embed_text_mocked(mock_openai):
+def test_embed_text_mocked(openai_embeddings, test_db):
+    mock_openai = openai_embeddings
     test = "Sample text for embedding"
-    item = SimpleNamespace(embedding=[0.1, 0.2, 0.3, 0.4])
+    item = SimpleNamespace(index=0, embedding=[0.1, 0.2, 0.3, 0.4])
     response = SimpleNamespace(data=[item])
     
     mock_openai.embeddings.create.return_value = response
@@ -16,5 +17,88 @@ def test_embed_text_mocked(mock_openai):
 
     mock_openai.embeddings.create.assert_called_once_with(
         model="text-embedding-3-small",
-        input=test
-    )   
\ No newline at end of file
+        input=[test]
+    )
+
+
+def test_embed_text_uses_cache(openai_embeddings, test_db):
+    """The second call (even with different spacing/case) must not hit OpenAI."""
+    mock_openai = openai_embeddings
+    item = SimpleNamespace(index=0, embedding=[0.5, 0.25])
+    mock_openai.embeddings.create.return_value = SimpleNamespace(data=[item])
+
+    first = embed_text("Bell Canada  monthly invoice")
+    second = embed_text("bell canada monthly invoice ")
+    assert first == second == [0.5, 0.25]
+    assert mock_openai.embeddings.create.call_count == 1
+
+    # The SQLite tier still answers after the in-process tier is dropped
+    embedding_cache.clear_memory()
+    assert embed_text("Bell Canada monthly invoice") == [0.5, 0.25]
+    assert mock_openai.embeddings.create.call_count == 1
+
+    stats = embedding_cache.stats()
+    assert (stats["memory_hits"], stats["disk_hits"], stats["misses"]) == (1, 1, 1)
+
+
+@patch("query.embed_text")
+def test_suggest_accounts_resolves_hits_from_catalog(mock_embed, test_db):
+    """After the first search, hits are resolved in memory - and see later writes."""
+    import database
+    from query import suggest_accounts
+    from models import Account
+
+    for code, name, vec in [("5000", "Meals", [1.0, 0.0]), ("6000", "Software", [0.6, 0.8])]:
+        database.insert_account(Account(
+            code=code, account_name=name, financial_stat="P&L",
+            group_name="Expenses", normally="Debit", description=name,
+        ))
+        database.insert_account_embedding(code, vec)
+    mock_embed.return_value = [1.0, 0.0]
+
+    suggestions = suggest_accounts("client lunch", k=2)
+    assert [s.code for s in suggestions] == ["5000", "6000"]
+    assert suggestions[0].normalized_similarity == 1.0
+    assert abs(suggestions[1].similarity - 0.6) < 1e-6
+
+    # A rename is visible without reloading the catalog
+    assert database.tenant_indexes.peek("default").catalog.is_loaded
+    database.insert_account(Account(
+        code="5000", account_name="Meals & Entertainment", financial_stat="P&L",
+        group_name="Expenses", normally="Debit", description="Meals",
+    ))
+    assert suggest_accounts("client lunch", k=1)[0].account_name == "Meals & Entertainment"
+
+    # Cold-path batch lookup
+    found = database.get_accounts_by_codes(["6000", "5000", "nope"])
+    assert set(found) == {"5000", "6000"}
+
+
+def test_local_provider_runs_real_search_offline(local_embeddings, test_db):
+    """The hashing embedder is deterministic and good enough to rank by shared words."""
+    import database
+    from query import get_account_text, embed_texts, suggest_accounts
+    from models import Account
+
+    accounts = [
+        Account(code="5200", account_name="Postage", financial_stat="P&L", group_name="Expenses",
+                normally="Debit", description="Stamps, courier and postage costs"),
+        Account(code="5300", account_name="Payroll", financial_stat="P&L", group_name="Expenses",
+                normally="Debit", description="Wages and payroll remittances"),
+    ]
+    for acc in accounts:
+        database.insert_account(acc)
+    vectors = embed_texts([get_account_text(acc) for acc in accounts])
+    for acc, vec in zip(accounts, vectors):
+        database.insert_account_embedding(acc.code, vec)
+
+    assert embed_text("Canada Post postage") == embed_text("Canada Post postage")
+    assert len(vectors[0]) == 256
+    assert suggest_accounts("Canada Post postage for parcels", k=2)[0].code == "5200"
+    assert suggest_accounts("biweekly payroll run", k=2)[0].code == "5300"
+
+    # No tokens at all: a zero vector, which matches nothing (and must not divide by zero)
+    from query import grade_confidence
+    suggestions = suggest_accounts("!!! ???", k=2)
+    assert [(s.score, s.normalized_similarity) for s in suggestions] == [(0.0, 0.0)] * 2
+    assert grade_confidence(suggestions) == "low"
@@ -0,0 +1,156 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+import database
+from embedding_cache import EmbeddingCache, embedding_cache
+from models import Account
+from query import suggest_accounts
+from orm_models import Base, AccountModel
+
+
+def _account(code: str) -> Account:
+    return Account(
+        code=code, account_name=f"Account {code}", financial_stat="Income Statement",
+        group_name="Expenses", normally="Debit", description="stress",
+    )
+
+
+@pytest.fixture
+def file_db(tmp_path, monkeypatch):
+    """A real on-disk DB with the production engine pair (WAL writer + read pool)."""
+    writer, reader = database.create_sqlite_engines(f"sqlite:///{tmp_path / 'stress.db'}", read_pool_size=4)
+    monkeypatch.setattr(database, "engine", writer)
+    monkeypatch.setattr(database, "read_engine", reader)
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(autocommit=False, autoflush=False, bind=writer))
+    monkeypatch.setattr(database, "ReadSessionLocal", sessionmaker(autocommit=False, autoflush=False, bind=reader))
+    database.reset_caches()
+    Base.metadata.create_all(bind=writer)
+
+    yield writer
+
+    database.reset_caches()
+    writer.dispose()
+    reader.dispose()
+
+
+def test_readers_are_not_blocked_by_an_open_write(file_db, openai_embeddings):
+    with file_db.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+    for i in range(50):
+        database.insert_account(_account(str(1000 + i)))
+        database.insert_account_embedding(str(1000 + i), [1.0, float(i), 0.0])
+
+    # Query embeddings cached on disk only, so lookups below go to SQLite
+    openai_embeddings.embeddings.create.side_effect = lambda model, input: SimpleNamespace(
+        data=[SimpleNamespace(index=i, embedding=[1.0, 0.0, 0.0]) for i in range(len(input))]
+    )
+    assert suggest_accounts("monthly internet")
+    embedding_cache.clear_memory()
+
+    # 1. Take the writer connection and keep a write transaction open
+    held = database.SessionLocal()
+    held.add(AccountModel(tenant_id="default", **_account("9999").model_dump()))
+    held.flush()  # BEGIN + INSERT: SQLite's write lock is now held
+
+    # 2. A second writer has to queue behind it (serialized, not "database is locked")
+    queued_write = threading.Thread(target=database.insert_account, args=(_account("8888"),))
+    queued_write.start()
+
+    # 3. Readers keep going meanwhile, and only see committed rows
+    def read(i: int) -> float:
+        start = time.perf_counter()
+        assert database.get_account_by_code(str(1000 + i % 50)) is not None
+        assert database.get_account_by_code("9999") is None
+        assert len(database.get_all_accounts()) == 50
+        if i % 2:
+            assert embedding_cache.get("text-embedding-3-small", "Monthly  Internet") is not None
+        else:
+            assert len(suggest_accounts("monthly internet")) == 5
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        latencies = list(pool.map(read, range(200)))
+    assert max(latencies) < 1.0
+    assert queued_write.is_alive()
+    assert openai_embeddings.embeddings.create.call_count == 1  # every query embedding came from the cache
+    assert embedding_cache.stats()["disk_hits"] >= 1
+
+    # 4. Commit: the queued writer gets the connection and finishes
+    held.commit()
+    held.close()
+    queued_write.join(5)
+    assert not queued_write.is_alive()
+    assert {"8888", "9999"} <= {a.code for a in database.get_all_accounts()}
+
+
+def test_concurrent_writers_and_readers(file_db):
+    errors = []
+    stop = threading.Event()
+
+    def write(worker: int):
+        try:
+            for i in range(25):
+                code = f"{worker}{i:03d}"
+                database.insert_account(_account(code))
+                database.insert_account_embedding(code, [float(worker), float(i), 1.0])
+        except Exception as exc:
+            errors.append(exc)
+
+    def read():
+        try:
+            while not stop.is_set():
+                database.get_all_accounts()
+                database.load_all_account_embeddings()
+        except Exception as exc:
+            errors.append(exc)
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for thread in readers:
+        thread.start()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(write, range(1, 9)))
+    stop.set()
+    for thread in readers:
+        thread.join(5)
+
+    assert errors == []
+    assert len(database.get_all_accounts()) == 200
+    assert len(database.load_all_account_embeddings()) == 200
+
+    database.clear_database()
+    assert database.get_all_accounts() == []
+
+
+def test_put_during_a_running_flush_is_flushed_too(file_db, monkeypatch):
+    cache = EmbeddingCache()
+    writer_sessions = database.SessionLocal
+    first_flush_started, release_first_flush = threading.Event(), threading.Event()
+
+    def blocking_session():
+        if not first_flush_started.is_set():
+            first_flush_started.set()
+            release_first_flush.wait(5)
+        return writer_sessions()
+
+    monkeypatch.setattr(database, "SessionLocal", blocking_session)
+
+    # 1. The first put starts a flush that has taken its row and is waiting for the writer
+    cache.put("m", "first", [1.0, 0.0])
+    assert first_flush_started.wait(5)
+
+    # 2. A put now only queues its row; nothing else will put after it
+    cache.put("m", "second", [0.0, 1.0])
+    release_first_flush.set()
+
+    deadline = time.time() + 5
+    while time.time() < deadline and (cache._flushing or cache._pending_rows):
+        time.sleep(0.01)
+    assert not cache._pending_rows
+    cache.clear_memory()
+    assert cache.get("m", "first") == [1.0, 0.0]
+    assert cache.get("m", "second") == [0.0, 1.0]
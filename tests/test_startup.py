@@ -0,0 +1,49 @@
+import os
+import subprocess
+import sys
+
+from config import Settings
+
+SRC_DIR = os.path.join(os.path.dirname(__file__), "..", "src")
+ENV_FILE = os.path.join(SRC_DIR, "..", ".env")
+
+
+def test_importing_entry_points_has_no_heavy_or_side_effects():
+    """api/main must not pull in langgraph or requests (nor python-dotenv without a .env), nor run anything."""
+    heavy = ("langgraph", "requests") if os.path.isfile(ENV_FILE) else ("langgraph", "requests", "dotenv")
+    code = (
+        "import os, sys; before = dict(os.environ); import api, main, db_setup; "
+        f"print(sorted(m for m in {heavy!r} if m in sys.modules), dict(os.environ) == before)"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=SRC_DIR, check=True, capture_output=True, text=True,
+        env={**os.environ, "PYTHONPATH": SRC_DIR},
+    )
+    assert out.stdout.strip().splitlines()[-1] == "[] True"
+
+
+def test_settings_fall_back_to_env_file(tmp_path, monkeypatch):
+    env_file = tmp_path / ".env"
+    env_file.write_text("LANDING_AI_API_KEY=from-file\nGRAPH_MAX_CONCURRENCY=3\n")
+    monkeypatch.delenv("LANDING_AI_API_KEY", raising=False)
+    monkeypatch.setenv("GRAPH_MAX_CONCURRENCY", "5")  # the real environment wins
+
+    settings = Settings(env_file=str(env_file))
+    assert settings.LANDING_AI_API_KEY == "from-file"
+    assert settings.GRAPH_MAX_CONCURRENCY == 5
+    assert "LANDING_AI_API_KEY" not in os.environ  # read, not exported
+
+
+def test_export_env_hands_other_keys_to_libraries(tmp_path, monkeypatch):
+    env_file = tmp_path / ".env"
+    env_file.write_text("LANDING_AI_API_KEY=from-file\nLANGSMITH_API_KEY=ls-key\nOPENAI_BASE_URL=http://file\n")
+    monkeypatch.delenv("LANDING_AI_API_KEY", raising=False)
+    monkeypatch.delenv("LANGSMITH_API_KEY", raising=False)
+    monkeypatch.setenv("OPENAI_BASE_URL", "http://env")
+
+    settings = Settings(env_file=str(env_file))
+    assert settings.export_env() == ["LANGSMITH_API_KEY"]
+    assert os.environ["LANGSMITH_API_KEY"] == "ls-key"
+    assert os.environ["OPENAI_BASE_URL"] == "http://env"  # the real environment still wins
+    assert "LANDING_AI_API_KEY" not in os.environ  # the app's own keys stay in Settings
+    monkeypatch.delenv("LANGSMITH_API_KEY")
@@ -0,0 +1,116 @@
+import pytest
+import database
+from models import Account
+from query import find_top_k_account_codes
+from tenants import TenantIndexManager, validate_tenant_id
+
+
+def _add(code, name, vec, tenant_id):
+    database.insert_account(Account(
+        code=code, account_name=name, financial_stat="P&L",
+        group_name="Expenses", normally="Debit", description=name,
+    ), tenant_id=tenant_id)
+    database.insert_account_embedding(code, vec, tenant_id=tenant_id)
+
+
+def test_tenants_are_isolated(test_db):
+    """The same code can mean different accounts in two charts, and searches never cross over."""
+    _add("5000", "Meals", [1.0, 0.0], "acme")
+    _add("5000", "Rent", [0.0, 1.0], "globex")
+    _add("6000", "Software", [0.0, 1.0], "acme")
+
+    assert database.get_account_by_code("5000", tenant_id="acme").account_name == "Meals"
+    assert database.get_account_by_code("5000", tenant_id="globex").account_name == "Rent"
+    assert database.get_account_by_code("5000") is None  # default tenant is empty
+
+    assert [c for c, _ in find_top_k_account_codes([1.0, 0.0], k=5, tenant_id="acme")] == ["5000", "6000"]
+    assert [c for c, _ in find_top_k_account_codes([1.0, 0.0], k=5, tenant_id="globex")] == ["5000"]
+
+    # Clearing one tenant leaves the other alone
+    database.clear_database("acme")
+    assert database.get_all_accounts("acme") == []
+    assert [a.account_name for a in database.get_all_accounts("globex")] == ["Rent"]
+
+
+def test_indexes_load_lazily_and_cold_tenants_are_evicted(test_db, monkeypatch):
+    _add("1000", "Cash", [1.0, 0.0, 0.0], "a")
+    _add("2000", "Bank", [0.0, 1.0, 0.0], "b")
+    assert database.tenant_indexes.tenants() == []  # nothing loaded by writes
+
+    index_a = database.get_account_index("a")
+    assert database.tenant_indexes.tenants() == ["a"]
+
+    # Budget just big enough for one tenant: loading b evicts a
+    monkeypatch.setattr(database.tenant_indexes, "max_bytes", index_a.nbytes)
+    database.get_account_index("b")
+    assert database.tenant_indexes.tenants() == ["b"]
+    assert database.tenant_indexes.stats()["evictions"] == 1
+
+    # A write to an evicted tenant is not lost: it reloads from the DB on the next search
+    database.insert_account_embedding("1001", [0.0, 0.0, 1.0], tenant_id="a")
+    assert find_top_k_account_codes([0.0, 0.0, 1.0], k=1, tenant_id="a")[0][0] == "1001"
+    assert database.tenant_indexes.tenants() == ["a"]
+
+
+def test_least_recently_used_tenant_goes_first():
+    manager = TenantIndexManager(max_bytes=1)
+    for tenant_id in ("a", "b", "c"):
+        manager.get(tenant_id).catalog.load([(tenant_id, "x", "x", "x", "x", "x")])
+    manager.get("a")  # touch a: b is now the coldest
+
+    assert manager.enforce_budget(keep="c") == ["b", "a"]
+    assert manager.tenants() == ["c"]
+
+    with pytest.raises(ValueError):
+        validate_tenant_id("../etc")
+
+
+def test_empty_tenants_are_capped_by_count():
+    """Tenants without accounts weigh ~0 bytes, so only the entry cap keeps them in check."""
+    manager = TenantIndexManager(max_bytes=1024 * 1024, max_tenants=3)
+    for i in range(100):
+        manager.get(f"probe-{i}")
+    assert manager.tenants() == ["probe-97", "probe-98", "probe-99"]
+    assert manager.stats()["evictions"] == 97
+
+
+def test_migrate_single_tenant_db(tmp_path, monkeypatch):
+    """Tables keyed by code alone are rebuilt with (tenant_id, code) and keep their rows."""
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.orm import sessionmaker
+    from vector_index import encode_embedding
+
+    old_engine = create_engine(f"sqlite:///{tmp_path / 'single.db'}")
+    with old_engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE accounts (account_name VARCHAR, code VARCHAR NOT NULL PRIMARY KEY, "
+            "financial_stat VARCHAR, group_name VARCHAR, normally VARCHAR, description VARCHAR)"
+        ))
+        conn.execute(text("INSERT INTO accounts VALUES ('Cash', '1000', 'BS', 'Assets', 'Debit', 'Cash')"))
+        conn.execute(text(
+            "CREATE TABLE account_embeddings (code VARCHAR NOT NULL PRIMARY KEY, "
+            "embedding BLOB, dim INTEGER, model VARCHAR)"
+        ))
+        conn.execute(
+            text("INSERT INTO account_embeddings VALUES ('1000', :blob, 2, 'm')"),
+            {"blob": encode_embedding([0.5, 0.5])},
+        )
+    monkeypatch.setattr(database, "engine", old_engine)
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=old_engine))
+    monkeypatch.setattr(database, "ReadSessionLocal", sessionmaker(bind=old_engine))
+    database.reset_caches()
+
+    database.init_db()
+    assert database.migrate_to_tenant_keys() == 0
+
+    assert database.get_account_by_code("1000").account_name == "Cash"
+    [(code, vector)] = database.load_all_account_embeddings()
+    assert (code, vector.tolist()) == ("1000", [0.5, 0.5])
+
+    database.insert_account(Account(
+        code="1000", account_name="Petty Cash", financial_stat="BS",
+        group_name="Assets", normally="Debit", description="Float",
+    ), tenant_id="acme")
+    assert database.get_account_by_code("1000").account_name == "Cash"
+    assert database.get_account_by_code("1000", tenant_id="acme").account_name == "Petty Cash"
+    database.reset_caches()
@@ -0,0 +1,122 @@
+import asyncio
+import io
+import tempfile
+import tracemalloc
+import zipfile
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from client_landingai import AsyncLandingAIClient
+from config import settings
+from document_cache import parse_key
+from pipeline import expand_upload
+
+
+def test_oversized_uploads_are_rejected_before_upstream(monkeypatch, test_db):
+    from api import app
+
+    calls = []
+    monkeypatch.setattr(settings, "MAX_UPLOAD_MB", 1)
+    limit = 1024 * 1024
+
+    with TestClient(app) as client:
+        app.state.landingai = AsyncLandingAIClient(
+            http=httpx.AsyncClient(transport=httpx.MockTransport(lambda r: calls.append(r) or httpx.Response(500))),
+            api_key="k",
+        )
+        # The middleware reads the limit when the app is built, so set it on the stack directly
+        middleware = app.middleware_stack
+        while not hasattr(middleware, "max_bytes"):
+            middleware = middleware.app
+        monkeypatch.setattr(middleware, "max_bytes", limit)
+
+        # 1. Declared size over the limit: refused up front
+        big = b"%PDF-" + b"x" * limit
+        response = client.post("/classify-invoice", files={"file": ("big.pdf", big, "application/pdf")})
+        assert response.status_code == 413
+        assert "1 MB" in response.json()["detail"]
+
+        # 2. Chunked upload (no Content-Length): refused once the limit is passed
+        def chunks():
+            yield b"--b\r\nContent-Disposition: form-data; name=\"file\"; filename=\"big.pdf\"\r\n\r\n"
+            for _ in range(4):
+                yield b"x" * (512 * 1024)
+            yield b"\r\n--b--\r\n"
+
+        response = client.post(
+            "/classify-invoice", content=chunks(),
+            headers={"Content-Type": "multipart/form-data; boundary=b"},
+        )
+        assert response.status_code == 413
+
+    assert calls == []
+
+
+def test_parse_streams_file_uploads_in_chunks():
+    size = 8 * 1024 * 1024
+    received = []
+
+    class StreamingTransport(httpx.AsyncBaseTransport):
+        """Consumes the request body chunk by chunk, like a real socket would."""
+
+        async def handle_async_request(self, request):
+            async for chunk in request.stream:
+                received.append(len(chunk))
+            return httpx.Response(200, json={"markdown": "# Invoice"})
+
+    with tempfile.TemporaryFile() as document:
+        for _ in range(size // (1024 * 1024)):
+            document.write(b"x" * (1024 * 1024))
+        document.seek(0)
+
+        # Hashing a file object matches hashing its bytes and leaves the position alone
+        assert parse_key(document) == parse_key(b"x" * size)
+        assert document.tell() == 0
+
+        async def scenario():
+            client = AsyncLandingAIClient(http=httpx.AsyncClient(transport=StreamingTransport()), api_key="k")
+            tracemalloc.start()
+            try:
+                markdown = await client.ade_parse(document, filename="scan.pdf")
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            return markdown, peak
+
+        markdown, peak = asyncio.run(scenario())
+
+    assert markdown == "# Invoice"
+    assert peak < size / 4  # never the whole document in memory
+    assert sum(received) > size and max(received) < size / 4  # the whole file went out, in chunks
+
+
+def _zip(**members: int) -> bytes:
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, size in members.items():
+            zf.writestr(f"{name}.pdf", b"\0" * size)
+    return archive.getvalue()
+
+
+def test_zip_members_are_capped_by_their_decompressed_size():
+    mb = 1024 * 1024
+
+    # 1. A 64 MB member (a few KB compressed) is refused from its header, before it is inflated
+    bomb = _zip(bomb=64 * mb)
+    assert len(bomb) < mb
+    tracemalloc.start()
+    try:
+        with pytest.raises(ValueError, match="bomb.pdf in batch.zip is larger than 8 MB"):
+            expand_upload("batch.zip", bomb, max_member_bytes=8 * mb, max_total_bytes=100 * mb)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert peak < mb
+
+    # 2. Members under the per-file limit still count against the total for the zip
+    many = _zip(a=3 * mb, b=3 * mb, c=3 * mb)
+    with pytest.raises(ValueError, match="batch.zip decompresses to more than 8 MB"):
+        expand_upload("batch.zip", many, max_member_bytes=4 * mb, max_total_bytes=8 * mb)
+    assert [len(d.content) for d in expand_upload("batch.zip", many, max_member_bytes=4 * mb, max_total_bytes=9 * mb)] == [3 * mb] * 3
@@ -0,0 +1,157 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import embeddings
+import metrics
+from client_landingai import AsyncLandingAIClient
+from config import settings
+from upstream import CircuitOpenError, TokenBucket, get_upstream
+
+
+def test_retries_honour_retry_after_then_the_circuit_opens(monkeypatch, test_db):
+    from api import app
+
+    monkeypatch.setattr(settings, "UPSTREAM_MAX_RETRIES", 2)
+    monkeypatch.setattr(settings, "UPSTREAM_BREAKER_FAILURES", 2)
+    monkeypatch.setattr(settings, "UPSTREAM_BREAKER_RESET", 0.2)
+
+    # 1. 429 (Retry-After) and 503 are retried; the third attempt succeeds
+    replies = [
+        httpx.Response(429, headers={"Retry-After": "0.1"}, json={"error": "slow down"}),
+        httpx.Response(503, json={"error": "busy"}),
+        httpx.Response(200, json={"vendor": "Bell"}),
+    ]
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return replies.pop(0) if replies else httpx.Response(503, json={"error": "down"})
+
+    client = AsyncLandingAIClient(http=httpx.AsyncClient(transport=httpx.MockTransport(handler)), api_key="k")
+    retried = metrics.UPSTREAM_RETRIES.value(service="landingai", endpoint="extract", reason=429)
+
+    start = time.perf_counter()
+    assert asyncio.run(client.ade_extract("# Invoice")) == {"vendor": "Bell"}
+    assert time.perf_counter() - start >= 0.1
+    assert len(calls) == 3
+    assert metrics.UPSTREAM_RETRIES.value(service="landingai", endpoint="extract", reason=429) == retried + 1
+
+    # 2. Two calls that exhaust their retries open the circuit...
+    for _ in range(2):
+        with pytest.raises(httpx.HTTPStatusError):
+            asyncio.run(client.ade_extract("# Invoice"))
+    sent = len(calls)
+
+    # ...and the next calls fail fast, without reaching Landing AI (the API answers 503)
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(client.ade_extract("# Invoice"))
+    with TestClient(app) as api:
+        app.state.landingai = client
+        response = api.post("/classify-invoice", files={"file": ("inv.pdf", b"%PDF-fake", "application/pdf")})
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+    assert len(calls) == sent
+
+    # 3. After the reset timeout one probe goes out; its success closes the circuit
+    time.sleep(0.2)
+    replies.append(httpx.Response(200, json={"vendor": "Bell"}))
+    assert asyncio.run(client.ade_extract("# Invoice")) == {"vendor": "Bell"}
+    assert get_upstream("landingai", "extract").breaker.state == "closed"
+
+
+def test_token_bucket_paces_and_identical_embeddings_share_one_request(openai_embeddings):
+    # 1. 100/s with no burst: the caller after the first waits 10 ms, the next 20 ms
+    bucket = TokenBucket(rate=100, capacity=1)
+    waits = [bucket.reserve() for _ in range(3)]
+    assert waits[0] == 0
+    assert waits[1] == pytest.approx(0.01, abs=0.003)
+    assert waits[2] == pytest.approx(0.02, abs=0.003)
+
+    bucket.pause(0.5)
+    assert bucket.reserve() >= 0.45  # a server-requested pause holds everyone
+
+    # 2. Eight threads embedding the same text while the first request is in flight
+    def slow_create(model, input):
+        time.sleep(0.1)
+        return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=[1.0, 0.0]) for i in range(len(input))])
+
+    openai_embeddings.embeddings.create.side_effect = slow_create
+    provider = embeddings.get_embedding_provider()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(provider.embed(["monthly internet"]))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [[[1.0, 0.0]]] * 8
+    assert openai_embeddings.embeddings.create.call_count == 1
+
+
+def test_cancelled_probe_lets_the_next_call_probe():
+    from upstream import CircuitBreaker, Upstream
+
+    breaker = CircuitBreaker("svc", failure_threshold=1, reset_timeout=0.01)
+    upstream = Upstream("svc", "op", breaker, max_retries=0)
+    breaker.record_failure()
+    time.sleep(0.02)
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def ok():
+        return "ok"
+
+    async def scenario():
+        # The probe is cancelled (client gone / wait_for timeout) before it has an outcome
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(upstream.acall(hang), 0.05)
+        assert breaker.state == "half_open"
+        return await upstream.acall(ok)
+
+    assert asyncio.run(scenario()) == "ok"
+    assert breaker.state == "closed"
+
+
+def test_only_a_real_answer_counts_as_success():
+    from upstream import CircuitBreaker, Upstream
+
+    def raising(exc):
+        def func():
+            raise exc
+        return func
+
+    def status_error(status):
+        response = httpx.Response(status, request=httpx.Request("POST", "http://svc"))
+        return httpx.HTTPStatusError("error", request=response.request, response=response)
+
+    breaker = CircuitBreaker("svc", failure_threshold=3, reset_timeout=0.01)
+    upstream = Upstream("svc", "op", breaker, max_retries=0)
+    breaker.record_failure()
+
+    # 1. A bug on our side, or rate limiting, keeps the failure streak; a 4xx answer ends it
+    with pytest.raises(TypeError):
+        upstream.call(raising(TypeError("bad argument")))
+    with pytest.raises(httpx.HTTPStatusError):
+        upstream.call(raising(status_error(429)))
+    assert breaker.failures == 1
+    with pytest.raises(httpx.HTTPStatusError):
+        upstream.call(raising(status_error(400)))
+    assert breaker.failures == 0
+
+    # 2. Neither closes a half-open circuit, but both free the probe for the next call
+    for _ in range(3):
+        breaker.record_failure()
+    time.sleep(0.02)
+    for exc in (TypeError("bad argument"), status_error(429)):
+        with pytest.raises(type(exc)):
+            upstream.call(raising(exc))
+        assert breaker.state == "half_open"
+    assert upstream.call(lambda: "ok") == "ok"
+    assert breaker.state == "closed"
@@ -0,0 +1,64 @@
+from database import insert_account_embedding, clear_database, get_account_index
+from query import find_top_k_account_codes, cosine_similarity
+
+
+def test_top_k_matches_pure_python_cosine(test_db):
+    """The index must rank exactly like the old cosine_similarity loop."""
+    vectors = {
+        "1000": [1.0, 0.0, 0.0],
+        "2000": [0.7, 0.7, 0.0],
+        "3000": [0.0, 1.0, 0.0],
+        "4000": [0.0, 0.0, 2.0],
+    }
+    for code, vec in vectors.items():
+        insert_account_embedding(code, vec)
+
+    query = [0.9, 0.3, 0.1]
+    results = find_top_k_account_codes(query, k=3)
+
+    expected = sorted(
+        ((code, cosine_similarity(query, vec)) for code, vec in vectors.items()),
+        key=lambda x: x[1],
+        reverse=True,
+    )[:3]
+    assert [code for code, _ in results] == [code for code, _ in expected]
+    for (_, got), (_, want) in zip(results, expected):
+        assert abs(got - want) < 1e-6
+
+
+def test_index_is_updated_incrementally(test_db):
+    """Writes after the first search must show up without a reload."""
+    insert_account_embedding("1000", [1.0, 0.0])
+    index = get_account_index()
+    assert len(index) == 1
+
+    # New row is appended to the loaded index
+    insert_account_embedding("2000", [0.0, 1.0])
+    assert get_account_index() is index
+    assert find_top_k_account_codes([0.0, 1.0], k=1)[0][0] == "2000"
+
+    # Existing row is overwritten in place
+    insert_account_embedding("1000", [0.0, 1.0])
+    assert len(index) == 2
+    assert find_top_k_account_codes([1.0, 0.0], k=2)[0][1] < 0.01
+
+    # Clearing the DB invalidates the index
+    clear_database()
+    assert find_top_k_account_codes([1.0, 0.0], k=5) == []
+
+
+def test_top_k_batch_matches_single_queries():
+    """The matrix-matrix path must agree with one top_k call per query."""
+    import numpy as np
+    from vector_index import VectorIndex
+
+    rng = np.random.default_rng(0)
+    index = VectorIndex()
+    index.load((str(i), rng.normal(size=16)) for i in range(50))
+    queries = rng.normal(size=(8, 16))
+
+    batch = index.top_k_batch(queries, k=5)
+    for query, hits in zip(queries, batch):
+        single = index.top_k(query, k=5)
+        assert [code for code, _ in hits] == [code for code, _ in single]
+        assert np.allclose([s for _, s in hits], [s for _, s in single], atol=1e-5)
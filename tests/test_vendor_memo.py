@@ -0,0 +1,92 @@
+import asyncio
+import threading
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+import database
+from agent_graph import get_graph, GraphState
+from models import Account, AccountSuggestion
+from vendor_memo import vendor_memo, normalize_vendor
+
+
+def _add_account(code, name):
+    database.insert_account(Account(
+        code=code, account_name=name, financial_stat="Income Statement",
+        group_name="Expenses", normally="Debit", description=name,
+    ))
+
+
+def test_normalize_vendor():
+    assert normalize_vendor("Bell Canada Inc.") == normalize_vendor("BELL  CANADA") == "bell canada"
+    assert normalize_vendor("Co") == "co"  # a lone suffix word is still a name
+
+
+@patch("agent_graph.suggest_accounts")
+def test_confirmed_vendor_skips_the_retriever(mock_suggest, test_db):
+    _add_account("5400", "Telephone")
+    vendor_memo.confirm("Bell Canada Inc.", "5400")
+
+    state = get_graph().invoke(GraphState(description="Invoice from Bell", vendor="BELL CANADA"))
+    mock_suggest.assert_not_called()
+    assert state["suggestions"][0].code == "5400"
+    assert state["suggestions"][0].source == "memo"
+    assert state["final_answer"].startswith("Telephone with code 5400")
+    assert set(state["timings"]) == {"vendor_memo", "finalize"}
+
+    # Unknown vendor -> normal retrieval path
+    mock_suggest.return_value = [
+        AccountSuggestion(code="5400", account_name="Telephone", score=0.8, normalized_similarity=1.0, similarity=0.8),
+    ]
+    get_graph().invoke(GraphState(description="Invoice from Rogers", vendor="Rogers"))
+    mock_suggest.assert_called_once()
+
+
+def test_async_graph_looks_up_the_memo_off_the_event_loop(test_db, monkeypatch):
+    _add_account("5400", "Telephone")
+    vendor_memo.confirm("Bell Canada Inc.", "5400")
+    lookup, threads = vendor_memo.lookup, []
+    monkeypatch.setattr(vendor_memo, "lookup", lambda *args: threads.append(threading.current_thread()) or lookup(*args))
+
+    async def scenario():
+        state = await get_graph().ainvoke(GraphState(description="Invoice from Bell", vendor="Bell Canada"))
+        return state, threading.current_thread()
+
+    state, loop_thread = asyncio.run(scenario())
+    assert state["suggestions"][0].source == "memo"
+    assert threads and loop_thread not in threads
+
+
+def test_hits_and_confirmations_are_persisted(test_db):
+    _add_account("5400", "Telephone")
+    _add_account("5410", "Internet")
+    vendor_memo.confirm("Bell", "5400")
+    vendor_memo.confirm("Bell", "5400")
+    for _ in range(3):
+        assert vendor_memo.lookup("Bell").code == "5400"
+    assert vendor_memo.lookup("Bell", tenant_id="other") is None  # memos are per tenant
+    assert vendor_memo.flush() == 1
+
+    # A fresh process sees the same counts
+    vendor_memo.invalidate()
+    entry = vendor_memo.lookup("bell")
+    assert (entry.code, entry.confirmations, entry.hits) == ("5400", 2, 4)
+
+    # Confirming a different account replaces the mapping
+    entry = vendor_memo.confirm("Bell", "5410")
+    assert (entry.code, entry.confirmations) == ("5410", 1)
+
+
+def test_confirm_endpoint(test_db):
+    from api import app
+
+    _add_account("5280", "Rent")
+    with TestClient(app) as client:
+        response = client.post("/vendor-memo/confirm", json={"vendor": "Landlord Ltd", "code": "5280"})
+        assert response.status_code == 200
+        assert response.json()["confirmations"] == 1
+
+        response = client.post("/vendor-memo/confirm", json={"vendor": "Landlord Ltd", "code": "9999"})
+        assert response.status_code == 404
+
+    assert vendor_memo.lookup("landlord").code == "5280"
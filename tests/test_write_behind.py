@@ -0,0 +1,57 @@
+import asyncio
+import threading
+
+from write_behind import WriteBehindBuffer
+
+
+def test_batches_on_size_and_time_and_drains_on_stop():
+    batches = []
+
+    async def scenario():
+        buffer = WriteBehindBuffer(batches.append, max_queue=100, batch_size=3, flush_interval=0.05)
+        await buffer.start()
+
+        # 1. Size threshold: 7 items -> 3 + 3, the 7th waits for the timer
+        for i in range(7):
+            await buffer.put(i)
+        await buffer.flush()
+        assert batches == [[0, 1, 2], [3, 4, 5], [6]]
+
+        # 2. stop() writes what is still queued, even before the timer fires
+        buffer.flush_interval = 60
+        await buffer.put(7)
+        await buffer.put(8)
+        await buffer.stop()
+        assert batches[-1] == [7, 8]
+        assert buffer.stats()["written"] == 9 and not buffer.is_running
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_makes_producers_wait():
+    release = threading.Event()
+    written = []
+
+    def slow_write(batch):
+        release.wait(5)
+        written.extend(batch)
+
+    async def scenario():
+        buffer = WriteBehindBuffer(slow_write, max_queue=2, batch_size=1, flush_interval=0)
+        await buffer.start()
+        await buffer.put("a")          # taken by the (blocked) writer
+        await asyncio.sleep(0.01)
+        await buffer.put("b")
+        await buffer.put("c")          # queue is now full
+
+        blocked = asyncio.create_task(buffer.put("d"))
+        await asyncio.sleep(0.05)
+        assert not blocked.done()      # backpressure: waits for room
+
+        release.set()
+        await asyncio.wait_for(blocked, 5)
+        await buffer.stop()
+        assert written == ["a", "b", "c", "d"]
+
+    asyncio.run(scenario())
+